@@ -15,6 +15,17 @@ class Config:
     SECRET_KEY = environ.get('SECRET_KEY')
     TESTING = environ.get('TESTING')
     REPOSITORY = environ.get('REPOSITORY')
+    THREADED = environ.get('THREADED', 'False').lower().strip() == "true"
+
+    # Data import configuration
+    IMPORT_BATCH_SIZE = int(environ.get('IMPORT_BATCH_SIZE', 1000))
+    IMPORT_WORKERS = int(environ.get('IMPORT_WORKERS', 1))
+    IMPORT_MANIFEST = environ.get('IMPORT_MANIFEST', 'import-manifest.json')
+    MEMORY_SNAPSHOT = environ.get('MEMORY_SNAPSHOT', '')
+    MEMORY_LOG = environ.get('MEMORY_LOG', '')
+    MEMORY_LOG_COMPACTION_SIZE = int(environ.get('MEMORY_LOG_COMPACTION_SIZE', 1048576))
+    LAZY_POPULATE = environ.get('LAZY_POPULATE', 'False').lower().strip() == "true"
+    PRELOAD = environ.get('PRELOAD', 'False').lower().strip() == "true"
 
     # Database configuration
     SQLALCHEMY_DATABASE_URI = environ.get('SQLALCHEMY_DATABASE_URI')
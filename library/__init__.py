@@ -1,5 +1,6 @@
 """Initialize Flask app."""
 
+import threading
 from pathlib import Path
 from flask import Flask, render_template
 from sqlalchemy import create_engine
@@ -8,8 +9,13 @@ from sqlalchemy.pool import NullPool
 
 from library.adapters import jsondatareader as repo
 from library.adapters.jsondatareader import BooksJSONReader
+from library.adapters.write_ahead_log import WriteAheadLog
+from library.adapters.columnar_repository import ColumnarRepository
 from library.adapters import database_repository, repository_populate
+from library.adapters.preload import collect_in_workers_only, collect_if_not_forked, prepare_for_fork
 from library.adapters.orm import metadata, map_model_to_tables
+from library.adapters.database_migration import migrate_schema
+from library.adapters.manifest import ImportManifest
 
 def create_app(test_config=None):
     app = Flask(__name__)
@@ -23,16 +29,20 @@ def create_app(test_config=None):
         app.config.from_mapping(test_config)
         data_path = app.config['TEST_DATA_PATH']
 
+    status = repository_populate.PopulationStatus()
+    repository_populate.population_status = status
+
     # # Initialise repo
         # Here the "magic" of our repository pattern happens. We can easily switch between in memory data and
     # persistent database data storage for our application.
 
     if app.config['REPOSITORY'] == 'memory':
-        # Create the MemoryRepository implementation for a memory-based repository.
-        repo.book_dataset = BooksJSONReader() # Initialise repo
-        # fill the content of the repository from the provided csv files (has to be done every time we start app!)
-        database_mode = False
-        repository_populate.populate(data_path, repo.book_dataset, database_mode)
+        def load():
+            load_memory_repository(app, data_path, status)
+
+    elif app.config['REPOSITORY'] == 'columnar':
+        def load():
+            load_columnar_repository(app, data_path, status)
 
     elif app.config['REPOSITORY'] == 'database':
         # Configure database.
@@ -52,29 +62,101 @@ def create_app(test_config=None):
         # Create the SQLAlchemy DatabaseRepository instance for an sqlite3-based repository.
         repo.book_dataset = database_repository.SqlAlchemyRepository(session_factory)
 
-        if app.config['TESTING'] == True or len(database_engine.table_names()) == 0:
-            print("REPOPULATING DATABASE...")
-            # For testing, or first-time use of the web application, reinitialise the database.
-            clear_mappers()
-            metadata.create_all(database_engine)  # Conditionally create database tables.
-            for table in reversed(metadata.sorted_tables):  # Remove any data from the tables.
-                database_engine.execute(table.delete())
+        def load():
+            load_database_repository(app, data_path, database_engine, status)
 
-            print("CLEARED DATABASE")
+    else:
+        raise ValueError(f"unknown REPOSITORY {app.config['REPOSITORY']!r}")
 
-            # Generate mappings that map domain model classes to the database tables.
-            map_model_to_tables()
+    if app.config['PRELOAD'] and app.config['REPOSITORY'] == 'memory' and app.config['MEMORY_LOG']:
+        # The workers would all write to the log opened by the master, each numbering the changes it makes.
+        raise ValueError("MEMORY_LOG cannot be used with PRELOAD, as the log is written by a single process")
 
-            database_mode = True
-            repository_populate.populate(data_path, repo.book_dataset, database_mode)
-            print("REPOPULATING DATABASE... FINISHED")
+    if app.config['PRELOAD']:
+        # Build the repository once in the master process of a pre-forking server, such as gunicorn --preload, for
+        # its workers to share rather than each building a copy of their own. The master does not collect garbage
+        # from here on; the workers do, and so does the master if it serves the requests itself.
+        collect_in_workers_only()
+        load()
+        status.finish()
+        prepare_for_fork(repo.book_dataset)
+        app.before_first_request(collect_if_not_forked)
+    elif app.config['LAZY_POPULATE']:
+        # Serve requests straight away; the books blueprint answers 503 until the repository is ready.
+        threading.Thread(target=status.run, args=(load,), name="populate", daemon=True).start()
+    else:
+        load()
+        status.finish()
 
-        else:
-            # Solely generate mappings that map domain model classes to the database tables.
-            map_model_to_tables()
-    
     with app.app_context():
         from .books_blueprint import books
         app.register_blueprint(books.books_blueprint)
 
     return app
+
+
+def load_memory_repository(app, data_path, status):
+    snapshot_path = app.config['MEMORY_SNAPSHOT']
+    dataset = None
+    if snapshot_path:
+        # Start from the snapshot of a previous run if none of the data files changed since it was written.
+        status.start_stage("snapshot")
+        dataset = BooksJSONReader.load_snapshot(snapshot_path, data_path, repository_populate.DATA_FILES)
+    if dataset is None:
+        # Create the MemoryRepository implementation for a memory-based repository.
+        dataset = BooksJSONReader() # Initialise repo
+        # fill the content of the repository from the provided csv files (has to be done every time we start app!)
+        database_mode = False
+        repository_populate.populate(data_path, dataset, database_mode,
+                                     app.config['IMPORT_BATCH_SIZE'], app.config['IMPORT_WORKERS'], status=status)
+        if snapshot_path:
+            dataset.dump_snapshot(snapshot_path, data_path)
+    log_path = app.config['MEMORY_LOG']
+    if log_path:
+        # Replay the registrations, reviews and reading list changes made since the snapshot or the data files.
+        status.start_stage("log")
+        dataset.attach_log(WriteAheadLog(log_path), snapshot_path, data_path, app.config['MEMORY_LOG_COMPACTION_SIZE'])
+    repo.book_dataset = dataset
+
+
+def load_columnar_repository(app, data_path, status):
+    # The columnar repository keeps the books in arrays for read-heavy listing; it is not snapshotted.
+    dataset = ColumnarRepository()
+    repository_populate.populate(data_path, dataset, False,
+                                 app.config['IMPORT_BATCH_SIZE'], app.config['IMPORT_WORKERS'], status=status)
+    repo.book_dataset = dataset
+
+
+def load_database_repository(app, data_path, database_engine, status):
+    manifest_path = app.config['IMPORT_MANIFEST']
+    # A database written by an earlier version of the schema is brought up to date, keeping the users and reviews.
+    if migrate_schema(database_engine) and ImportManifest.load(manifest_path) is None:
+        # The database predates import manifests, and was used as it was whatever the data files held.
+        ImportManifest.build(data_path, repository_populate.DATA_FILES).save(manifest_path)
+    repopulate = app.config['TESTING'] == True or len(database_engine.table_names()) == 0
+    if not repopulate:
+        # Solely generate mappings that map domain model classes to the database tables.
+        map_model_to_tables()
+        # Apply the changes made to the data files since the last population. Changes that cannot be applied
+        # record by record, or a missing manifest, require the database to be repopulated.
+        status.start_stage("changes")
+        repopulate = not repository_populate.populate_changes(data_path, repo.book_dataset, manifest_path)
+
+    if repopulate:
+        print("REPOPULATING DATABASE...")
+        # For testing, or first-time use of the web application, reinitialise the database.
+        clear_mappers()
+        metadata.create_all(database_engine)  # Conditionally create database tables.
+        for table in reversed(metadata.sorted_tables):  # Remove any data from the tables.
+            database_engine.execute(table.delete())
+
+        print("CLEARED DATABASE")
+
+        # Generate mappings that map domain model classes to the database tables.
+        map_model_to_tables()
+
+        database_mode = True
+        repository_populate.populate(data_path, repo.book_dataset, database_mode,
+                                     app.config['IMPORT_BATCH_SIZE'], app.config['IMPORT_WORKERS'],
+                                     manifest_path, status)
+        print("REPOPULATING DATABASE... FINISHED")
@@ -0,0 +1,134 @@
+import math
+import threading
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+
+# Books added since an order was last read are inserted one by one up to this many; more are merged by a sort.
+MAX_INSERTIONS = 64
+
+# Subsets of the books smaller than this fraction of the order are sorted, larger ones are picked out of the order.
+SORT_SUBSET_FRACTION = 1 / 16
+
+
+def title_key(book):
+    return book.title or "", book.book_id
+
+
+def publisher_key(book):
+    return "" if book.publisher is None else book.publisher.name, book.book_id
+
+
+def first_author_key(book):
+    # Books without authors come last.
+    if len(book.authors) == 0:
+        return 1, "", book.book_id
+    return 0, book.first_author_name, book.book_id
+
+
+def date_key(book):
+    return math.inf if book.release_year is None else book.release_year, book.book_id
+
+
+class BookOrder:
+    """ Books kept sorted by a key, for serving pages of a view without sorting on every request.
+
+    The books property returns a list that is never changed afterwards: changes build a new list, so a reader is
+    never disturbed by books added while it works through a page. Books added are sorted in when the order is read.
+    """
+
+    def __init__(self, key):
+        self.__key = key
+        # The keys and the books are replaced together, so a reader always sees a matching pair.
+        self.__entries = ([], [])
+        self.__pending = []
+        self.__stale = False
+        # Serialises sorting in the books added, which readers of the order may start at the same time.
+        self.__lock = threading.Lock()
+
+    @property
+    def books(self) -> list:
+        return self.entries()[1]
+
+    @property
+    def keys(self) -> list:
+        """ The keys of the books, in the same order and, like the books, never changed afterwards. """
+        return self.entries()[0]
+
+    @property
+    def key(self):
+        return self.__key
+
+    def entries(self) -> tuple:
+        """ Returns the keys and the books of the order as a pair of lists that are never changed afterwards. """
+        if self.__stale or self.__pending:
+            with self.__lock:
+                if self.__stale:
+                    books = self.__entries[1] + [book for _, book in self.__pending]
+                    self.__set_entries(sorted(((self.__key(book), book) for book in books), key=itemgetter(0)))
+                    self.__pending = []
+                    self.__stale = False
+                if self.__pending:
+                    self.__merge_pending()
+        return self.__entries
+
+    def __len__(self):
+        return len(self.__entries[1]) + len(self.__pending)
+
+    def between(self, low: tuple, high: tuple) -> list:
+        """ Returns the books whose key is at least low and below high, in the order.
+
+        low and high are compared with the start of the keys, so (1990,) and (2000,) select the books of the 1990s
+        from an order by date_key.
+        """
+        keys, books = self.entries()
+        return books[bisect_left(keys, low):bisect_left(keys, high)]
+
+    def select(self, books) -> list:
+        """ Returns books, a subset of the books in the order, in the order. """
+        if len(books) < SORT_SUBSET_FRACTION * len(self):
+            return sorted(books, key=self.__key)
+        selected = {id(book) for book in books}
+        return [book for book in self.books if id(book) in selected]
+
+    def add(self, book):
+        self.__pending.append((self.__key(book), book))
+
+    def remove(self, book):
+        keys, books = self.entries()
+        self.__set_entries([(key, other) for key, other in zip(keys, books) if other is not book])
+
+    def resort(self):
+        """ Sorts all books again when the order is next read, after changes that may have moved books. """
+        self.__stale = True
+
+    def __merge_pending(self):
+        # The new entries replace the old ones before the pending books are cleared, so a reader that finds nothing
+        # pending always gets entries holding every book.
+        pending = self.__pending
+        if len(pending) <= MAX_INSERTIONS:
+            keys, books = (list(entries) for entries in self.__entries)
+            for key, book in sorted(pending, key=itemgetter(0)):
+                position = bisect_right(keys, key)
+                keys.insert(position, key)
+                books.insert(position, book)
+            self.__entries = keys, books
+        else:
+            # The existing books are already sorted, so the sort merges them with the new books in linear time.
+            entries = list(zip(*self.__entries))
+            entries.extend(pending)
+            entries.sort(key=itemgetter(0))
+            self.__set_entries(entries)
+        self.__pending = []
+
+    def __set_entries(self, entries):
+        self.__entries = [key for key, _ in entries], [book for _, book in entries]
+
+    def __getstate__(self):
+        # Locks cannot be pickled.
+        state = self.__dict__.copy()
+        del state['_BookOrder__lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
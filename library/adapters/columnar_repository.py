@@ -0,0 +1,512 @@
+import math
+import threading
+import weakref
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import partial
+from itertools import accumulate, compress
+from typing import List
+
+from library.adapters.read_write_lock import ReadWriteLock
+from library.adapters.repository import AbstractRepository, BookPage, page_bounds, keyed_page, parse_year_range
+from library.adapters.search_cache import SearchCache
+from library.domain.model import Publisher, Author, Book, Review, User, DEFAULT_PRICE, DEFAULT_STOCK
+
+# Stored in the integer columns in place of a missing value.
+MISSING = -1
+
+# Stored in place of an unknown release year, so that an order sorted by the year column puts those books last.
+UNKNOWN_YEAR = 2 ** 31 - 1
+
+# Separates the titles joined into one string for searching; titles never contain it.
+TITLE_SEPARATOR = "\0"
+
+
+class NameTable:
+    """ Publisher or author names stored once each, which the book columns refer to by their code in the table.
+
+    Code 0 stands for no name at all, so that every book has a code.
+    """
+
+    def __init__(self):
+        self.__keys = [None]
+        self.__names = [""]
+        self.__codes = {}
+
+    def code(self, key, name: str) -> int:
+        """ Returns the code of key, adding it if it is new. Like the authors shared by the books of an import, all the
+        books referring to key take its latest name.
+        """
+        code = self.__codes.get(key)
+        if code is None:
+            code = self.__codes[key] = len(self.__names)
+            self.__keys.append(key)
+            self.__names.append(name)
+        elif self.__names[code] != name:
+            self.__names[code] = name
+        return code
+
+    def key(self, code: int):
+        return self.__keys[code]
+
+    def name(self, code: int) -> str:
+        return self.__names[code]
+
+    def __len__(self):
+        return len(self.__names)
+
+    def matching(self, text: str) -> set:
+        """ Returns the codes of the names containing text, which is lower case. """
+        return {code for code, name in enumerate(self.__names) if code and text in name.lower()}
+
+    def ranks(self, nameless_rank: int) -> array:
+        """ Returns the rank of every code when sorted by name, equal names sharing a rank, with code 0 given
+        nameless_rank.
+        """
+        ranks = array('q', [0]) * len(self.__names)
+        rank, previous = -1, None
+        for code in sorted(range(1, len(self.__names)), key=self.__names.__getitem__):
+            if self.__names[code] != previous:
+                rank, previous = rank + 1, self.__names[code]
+            ranks[code] = rank
+        ranks[0] = nameless_rank
+        return ranks
+
+
+class OrderKeys:
+    """ The sort keys of the rows of an order, computed when read, for bisecting an order without a list of keys. """
+
+    def __init__(self, rows, key):
+        self.__rows = rows
+        self.__key = key
+
+    def __len__(self):
+        return len(self.__rows)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self.__key(row) for row in self.__rows[position]]
+        return self.__key(self.__rows[position])
+
+
+class ColumnarInventory:
+    """ The prices and stock counts of the books in the inventory, read from the columns of the repository. """
+
+    def __init__(self, repository):
+        self.__repository = repository
+
+    def find_book(self, book_id: int):
+        return self.__repository.inventory_book(book_id)
+
+    def find_price(self, book_id: int):
+        book = self.find_book(book_id)
+        return None if book is None else book.price
+
+    def find_stock_count(self, book_id: int):
+        book = self.find_book(book_id)
+        return None if book is None else book.stock
+
+    def search_book_by_title(self, book_title: str):
+        return next((book for book in self.__repository.dataset_of_books
+                     if book.title == book_title and self.find_book(book.book_id) is book), None)
+
+
+class ColumnarRepository(AbstractRepository):
+    """ A memory repository for read-heavy listing, which keeps the books in typed arrays, one per attribute, instead
+    of one Book object per book.
+
+    Orders are sorted with the C sort over the columns rather than by calling a key function on each Book, year
+    searches bisect the year column of the date order, and Book objects are only built for the books that are
+    returned, such as the twelve books of a page. A book is built once for as long as anything refers to it, so the
+    Book objects handed out for a book are one and the same.
+    """
+
+    def __init__(self):
+        # Request threads read in parallel while changes are made one at a time.
+        self.__lock = ReadWriteLock()
+        # Serialises the work readers may start at the same time: sorting the orders and building Book objects.
+        self.__build_lock = threading.Lock()
+
+        # One entry per row of the columns. Removing a book clears its row in __live instead of moving the others.
+        self.__book_ids = array('q')
+        self.__titles = []
+        self.__descriptions = []
+        self.__urls = []
+        self.__release_years = array('l')
+        self.__ebooks = array('b')
+        self.__num_pages = array('l')
+        self.__average_ratings = array('d')
+        self.__ratings_counts = array('q')
+        self.__prices = array('q')
+        self.__stocks = array('q')
+        self.__in_inventory = bytearray()
+        self.__live = bytearray()
+        self.__publisher_codes = array('q')
+        # The author codes of the books, one after the other; a row's authors start at __author_starts and number
+        # __author_counts. Position 0 holds code 0, where the start of the rows without authors points.
+        self.__author_codes = array('q', [0])
+        self.__author_starts = array('q')
+        self.__author_counts = array('q')
+        self.__reviews = {}
+
+        self.__publishers = NameTable()
+        self.__authors = NameTable()
+        # The rows of each author code, including rows the author has since been removed from, for author searches.
+        self.__rows_by_author = [array('q')]
+        # Primary key index of the rows; like the memory repository, a lookup returns the first book added with an id.
+        self.__rows_by_id = {}
+        # The Book objects built and still referred to, keyed by row.
+        self.__books = weakref.WeakValueDictionary()
+        # The rows of each view in its order, sorted again when read after a change.
+        self.__orders = None
+
+        self.__search_cache = SearchCache()
+        self.__books_inventory = ColumnarInventory(self)
+        self.__users = {}
+
+    def add_user(self, user):
+        with self.__lock.writing():
+            self.__users.setdefault(user.user_name, user)
+
+    def get_user(self, user_name):
+        with self.__lock.reading():
+            return self.__users.get(user_name)
+
+    @property
+    def users(self):
+        with self.__lock.reading():
+            return list(self.__users.values())
+
+    def add_review(self, user_name: str, book: Book, review: Review):
+        with self.__lock.writing():
+            user: User = self.get_user(user_name)
+            if isinstance(user, User):
+                user.add_review(review)
+            book.add_review(review)
+            row = self.__row_of(book)
+            if row is not None and review not in self.__reviews.setdefault(row, []):
+                self.__reviews[row].append(review)
+            self.__search_cache.bump()
+
+    def add_to_reading_list(self, user_name: str, book: Book):
+        with self.__lock.writing():
+            user: User = self.get_user(user_name)
+            if isinstance(user, User):
+                user.add_to_reading_list(book)
+
+    def remove_from_reading_list(self, user_name: str, book: Book):
+        with self.__lock.writing():
+            user: User = self.get_user(user_name)
+            if isinstance(user, User):
+                user.remove_from_reading_list(book)
+
+    @property
+    def dataset_of_books(self) -> List[Book]:
+        with self.__lock.reading():
+            return [self.__book(row) for row in compress(range(len(self.__live)), self.__live)]
+
+    @property
+    def books_inventory(self) -> ColumnarInventory:
+        return self.__books_inventory
+
+    @property
+    def search_cache(self) -> SearchCache:
+        return self.__search_cache
+
+    def add_book(self, book: Book):
+        with self.__lock.writing():
+            row = len(self.__book_ids)
+            self.__book_ids.append(book.book_id)
+            self.__titles.append(None)
+            self.__descriptions.append(None)
+            self.__urls.append(None)
+            for column in (self.__release_years, self.__ebooks, self.__num_pages, self.__average_ratings,
+                           self.__ratings_counts, self.__publisher_codes, self.__author_starts, self.__author_counts):
+                column.append(0)
+            self.__prices.append(DEFAULT_PRICE)
+            self.__stocks.append(DEFAULT_STOCK)
+            self.__in_inventory.append(0)
+            self.__live.append(1)
+            self.__store(row, book)
+            self.__rows_by_id.setdefault(book.book_id, row)
+            self.__books[row] = book
+            self.__changed()
+
+    def update_book(self, book: Book):
+        with self.__lock.writing():
+            row = self.__row_of(book)
+            if row is not None:
+                self.__store(row, book)
+                self.__changed()
+
+    def remove_book(self, book: Book):
+        with self.__lock.writing():
+            row = self.__row_of(book)
+            if row is None:
+                return
+            self.remove_from_inventory(book)
+            self.__live[row] = 0
+            self.__books.pop(row, None)
+            self.__reviews.pop(row, None)
+            if self.__rows_by_id.get(book.book_id) == row:
+                del self.__rows_by_id[book.book_id]
+                duplicate = next((other for other in compress(range(len(self.__live)), self.__live)
+                                  if self.__book_ids[other] == book.book_id), None)
+                if duplicate is not None:
+                    self.__rows_by_id[book.book_id] = duplicate
+            self.__changed()
+            for user in self.__users.values():
+                user.remove_from_reading_list(book)
+                for review in book.reviews:
+                    if review in user.reviews:
+                        user.reviews.remove(review)
+
+    def add_to_inventory(self, book: Book, price: int, stock: int):
+        with self.__lock.writing():
+            row = self.__row_of(book)
+            if row is not None:
+                self.__prices[row] = price
+                self.__stocks[row] = stock
+                self.__in_inventory[row] = 1
+            book.price = price
+            book.stock = stock
+            self.__search_cache.bump()
+
+    def remove_from_inventory(self, book: Book):
+        with self.__lock.writing():
+            row = self.__row_of(book)
+            if row is not None:
+                self.__prices[row] = DEFAULT_PRICE
+                self.__stocks[row] = DEFAULT_STOCK
+                self.__in_inventory[row] = 0
+            book.price = DEFAULT_PRICE
+            book.stock = DEFAULT_STOCK
+            self.__search_cache.bump()
+
+    def inventory_book(self, book_id: int):
+        """ Returns the book with book_id if it is in the inventory, or None. """
+        with self.__lock.reading():
+            row = self.__rows_by_id.get(book_id)
+            if row is None or not self.__in_inventory[row]:
+                return None
+            return self.__book(row)
+
+    def get_number_of_books(self) -> int:
+        with self.__lock.reading():
+            return self.__live.count(1)
+
+    def get_book_by_id(self, book_id) -> Book:
+        with self.__lock.reading():
+            row = self.__rows_by_id.get(book_id)
+            return None if row is None else self.__book(row)
+
+    def get_books_by_ids(self, id_list) -> List[Book]:
+        with self.__lock.reading():
+            rows = (self.__rows_by_id.get(book_id) for book_id in dict.fromkeys(id_list))
+            return [self.__book(row) for row in rows if row is not None]
+
+    def get_title(self, book: Book) -> str:
+        return book.title
+
+    def get_publisher(self, book: Book) -> str:
+        return book.publisher
+
+    def get_first_author(self, book: Book) -> str:
+        return book.authors[0].full_name
+
+    def get_date(self, book: Book) -> int:
+        if book.release_year == None:
+            return math.inf
+        return book.release_year
+
+    def get_page(self, page, text: str = None, after: tuple = None, before: tuple = None,
+                 last: bool = False) -> BookPage:
+        with self.__lock.reading():
+            if text is None or text.strip() == "":
+                rows = self.__order(page)
+                keys = OrderKeys(rows, partial(self.__key, page))
+                start, end = page_bounds(keys, after, before, last)
+                return keyed_page(keys, [self.__book(row) for row in rows[start:end]], start, end)
+
+            # The cache holds the sort keys of the books found, which end with the book id.
+            keys = self.__search_cache.get(page, text)
+            if keys is None:
+                generation = self.__search_cache.generation
+                keys = [self.__key(page, row) for row in self.__search(page, text.lower().strip())]
+                self.__search_cache.put(page, text, keys, generation)
+            start, end = page_bounds(keys, after, before, last)
+            return keyed_page(keys, [self.__book(self.__rows_by_id[key[-1]]) for key in keys[start:end]], start, end,
+                              len(keys))
+
+    def search_books(self, page, text: str) -> List[Book]:
+        """ Returns the books with a term searched by page containing text, in the order of the page. """
+        with self.__lock.reading():
+            return [self.__book(row) for row in self.__search(page, text.lower())]
+
+    def __search(self, page, text: str) -> List[int]:
+        # Returns the rows of all the books found by the search for text in page, in the order of the page.
+        rows = self.__order(page)
+        if page == "home":
+            return self.__search_titles(text)
+        if page == "publishers":
+            codes = self.__publishers.matching(text)
+            ranks = self.__sorted_orders()["publisher_ranks"]
+            rank_keys = OrderKeys(rows, lambda row: ranks[self.__publisher_codes[row]])
+            # The rows of a publisher are next to each other in the order.
+            found = []
+            for rank in sorted({ranks[code] for code in codes}):
+                found.extend(rows[bisect_left(rank_keys, rank):bisect_right(rank_keys, rank)])
+            return found
+        if page == "authors":
+            codes = self.__authors.matching(text)
+            found = {row for code in codes for row in self.__rows_by_author[code]
+                     if self.__live[row] and code in self.__authors_of(row)}
+            return sorted(found, key=partial(self.__key, page))
+
+        years = OrderKeys(rows, self.__release_years.__getitem__)
+        year_range = parse_year_range(text)
+        if year_range is None:
+            found = []
+            for year in sorted(set(self.__release_years)):
+                if text in str(None if year == UNKNOWN_YEAR else year):
+                    found.extend(rows[bisect_left(years, year):bisect_right(years, year)])
+            return found
+        # Books of an unknown year are sorted last, so no range includes them.
+        low, high = year_range
+        return list(rows[bisect_left(years, 0 if low is None else low):
+                         bisect_left(years, UNKNOWN_YEAR if high is None else high + 1)])
+
+    def __search_titles(self, text: str) -> List[int]:
+        rows = self.__order("home")
+        titles, offsets = self.__sorted_orders()["titles"]
+        found = []
+        index = titles.find(text)
+        while index != -1:
+            position = bisect_right(offsets, index) - 1
+            found.append(rows[position])
+            # Go on from the next title, so that a title is found once however often it contains text.
+            index = titles.find(text, offsets[position + 1])
+        return found
+
+    def __order(self, page) -> array:
+        return self.__sorted_orders()[page]
+
+    def __sorted_orders(self) -> dict:
+        orders = self.__orders
+        if orders is None:
+            with self.__build_lock:
+                if self.__orders is None:
+                    self.__orders = self.__sort()
+                orders = self.__orders
+        return orders
+
+    def __sort(self) -> dict:
+        # Every order sorts the rows by book id first; the sorts are stable, so books with equal keys stay in id
+        # order. The keys are read from the columns by C functions rather than computed per book in Python.
+        by_id = sorted(compress(range(len(self.__live)), self.__live), key=self.__book_ids.__getitem__)
+        publisher_ranks = self.__publishers.ranks(-1)
+        row_publisher_ranks = array('q', map(publisher_ranks.__getitem__, self.__publisher_codes))
+        # Books without authors come last.
+        author_ranks = self.__authors.ranks(len(self.__authors))
+        first_authors = map(self.__author_codes.__getitem__, self.__author_starts)
+        row_author_ranks = array('q', map(author_ranks.__getitem__, first_authors))
+
+        home = array('q', sorted(by_id, key=self.__titles.__getitem__))
+        lower_titles = [title.lower() for title in map(self.__titles.__getitem__, home)]
+        offsets = array('q', accumulate(map(len, lower_titles), lambda offset, length: offset + length + 1,
+                                        initial=0))
+        return {"home": home,
+                "books_by_date": array('q', sorted(by_id, key=self.__release_years.__getitem__)),
+                "publishers": array('q', sorted(by_id, key=row_publisher_ranks.__getitem__)),
+                "authors": array('q', sorted(by_id, key=row_author_ranks.__getitem__)),
+                "publisher_ranks": publisher_ranks,
+                "titles": (TITLE_SEPARATOR.join(lower_titles), offsets)}
+
+    def __key(self, page, row) -> tuple:
+        # The sort key of a row in page, in the form of the keys of the memory repository's orders, so that cursors
+        # work the same with either repository.
+        book_id = self.__book_ids[row]
+        if page == "home":
+            return self.__titles[row], book_id
+        if page == "books_by_date":
+            year = self.__release_years[row]
+            return math.inf if year == UNKNOWN_YEAR else year, book_id
+        if page == "publishers":
+            return self.__publishers.name(self.__publisher_codes[row]), book_id
+        if self.__author_counts[row] == 0:
+            return 1, "", book_id
+        return 0, self.__authors.name(self.__author_codes[self.__author_starts[row]]), book_id
+
+    def __authors_of(self, row) -> array:
+        start = self.__author_starts[row]
+        return self.__author_codes[start:start + self.__author_counts[row]]
+
+    def __row_of(self, book: Book):
+        row = self.__rows_by_id.get(book.book_id)
+        if row is None or self.__books.get(row) is book:
+            return row
+        # A later book sharing the id of another has its own row.
+        return next((other for other, built in list(self.__books.items()) if built is book), row)
+
+    def __changed(self):
+        self.__orders = None
+        self.__search_cache.bump()
+
+    def __store(self, row, book: Book):
+        # Writes the attributes of book to its row of the columns.
+        self.__titles[row] = book.title
+        self.__descriptions[row] = book.description
+        self.__urls[row] = book.url
+        self.__release_years[row] = UNKNOWN_YEAR if book.release_year is None else book.release_year
+        self.__ebooks[row] = MISSING if book.ebook is None else book.ebook
+        self.__num_pages[row] = MISSING if book.num_pages is None else book.num_pages
+        self.__average_ratings[row] = math.nan if book.average_rating is None else book.average_rating
+        self.__ratings_counts[row] = MISSING if book.ratings_count is None else book.ratings_count
+        publisher = book.publisher
+        self.__publisher_codes[row] = 0 if publisher is None else self.__publishers.code(publisher.name, publisher.name)
+
+        codes = array('q', (self.__authors.code(author.unique_id, author.full_name) for author in book.authors))
+        if codes != self.__authors_of(row):
+            self.__author_starts[row] = len(self.__author_codes) if codes else 0
+            self.__author_counts[row] = len(codes)
+            self.__author_codes.extend(codes)
+            for code in codes:
+                if code == len(self.__rows_by_author):
+                    self.__rows_by_author.append(array('q'))
+                self.__rows_by_author[code].append(row)
+
+    def __book(self, row) -> Book:
+        book = self.__books.get(row)
+        if book is not None:
+            return book
+        with self.__build_lock:
+            book = self.__books.get(row)
+            if book is None:
+                book = self.__books[row] = self.__build(row)
+        return book
+
+    def __build(self, row) -> Book:
+        # Builds the Book object of a row from the columns.
+        book = Book(self.__book_ids[row], self.__titles[row])
+        book.description = self.__descriptions[row]
+        book.url = self.__urls[row]
+        if self.__release_years[row] != UNKNOWN_YEAR:
+            book.release_year = self.__release_years[row]
+        if self.__ebooks[row] != MISSING:
+            book.ebook = bool(self.__ebooks[row])
+        if self.__num_pages[row] != MISSING:
+            book.num_pages = self.__num_pages[row]
+        if not math.isnan(self.__average_ratings[row]):
+            book.average_rating = self.__average_ratings[row]
+        if self.__ratings_counts[row] != MISSING:
+            book.ratings_count = self.__ratings_counts[row]
+        book.price = self.__prices[row]
+        book.stock = self.__stocks[row]
+        publisher_code = self.__publisher_codes[row]
+        if publisher_code:
+            book.publisher = Publisher(self.__publishers.name(publisher_code))
+        for code in self.__authors_of(row):
+            book.add_author(Author(self.__authors.key(code), self.__authors.name(code)))
+        for review in self.__reviews.get(row, ()):
+            book.add_review(review)
+        return book
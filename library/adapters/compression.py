@@ -0,0 +1,54 @@
+import bz2
+import gzip
+import io
+import lzma
+from pathlib import Path
+
+# Leading bytes of a file compressed by each supported codec, and the function opening it.
+CODECS = {
+    '.gz': (b'\x1f\x8b', gzip.open),
+    '.bz2': (b'BZh', bz2.open),
+    '.xz': (b'\xfd7zXZ\x00', lzma.open),
+}
+
+# Size of the blocks decompressed at a time; large blocks keep the per-call overhead of the codecs low.
+READ_BUFFER_SIZE = 1 << 20
+
+
+def detect_codec(filename):
+    """ Returns the suffix of the codec filename is compressed with, or None if it is not compressed.
+
+    The magic bytes at the start of the file decide; the extension is only used for files too short to have any.
+    """
+    with open(filename, 'rb') as data_file:
+        start = data_file.read(max(len(magic) for magic, _ in CODECS.values()))
+    for suffix, (magic, _) in CODECS.items():
+        if start.startswith(magic):
+            return suffix
+    suffix = Path(filename).suffix.lower()
+    if suffix in CODECS and start == b'':
+        return suffix
+    return None
+
+
+def open_data_file(filename, encoding: str = 'UTF-8'):
+    """ Opens a data file for reading as text, decompressing it on the fly if it is compressed. """
+    suffix = detect_codec(filename)
+    if suffix is None:
+        return open(filename, encoding=encoding)
+    compressed_file = CODECS[suffix][1](filename, 'rb')
+    return io.TextIOWrapper(io.BufferedReader(compressed_file, READ_BUFFER_SIZE), encoding=encoding)
+
+
+def resolve_data_file(data_path: Path, filename: str) -> Path:
+    """ Returns the path of filename in data_path, or of a compressed copy such as filename.gz if only that exists.
+
+    The uncompressed path is returned if neither exists, so opening it raises the usual FileNotFoundError.
+    """
+    path = Path(data_path) / filename
+    if not path.exists():
+        for suffix in CODECS:
+            compressed_path = path.with_name(path.name + suffix)
+            if compressed_path.exists():
+                return compressed_path
+    return path
@@ -1,16 +1,22 @@
 import json
 import csv
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import date, datetime
 
 from werkzeug.security import generate_password_hash
 
 # from library.adapters.jsondatareader import BooksJSONReader
-from library.domain.model import BooksInventory, Publisher, Author, Book, Review, User
+from library.adapters.compression import open_data_file, resolve_data_file
+from library.domain.model import BooksInventory, Publisher, Author, Book, Review, User, InternPool
+
+# Number of records handed to the loaders at a time; bounds the memory used while streaming the data files.
+BATCH_SIZE = 1000
 
 
 def read_csv_file(filename: str):
-    with open(filename, encoding='utf-8-sig') as infile:
+    with open_data_file(filename, encoding='utf-8-sig') as infile:
         reader = csv.reader(infile)
 
         # Read first line of the the CSV file.
@@ -23,29 +29,60 @@ def read_csv_file(filename: str):
             yield row
 
 
-def read_json_file(filename):
-    lines = []
-    with open(filename, encoding='UTF-8') as jsonfile:
+def iter_json_file(filename):
+    # Parse one JSON document per line, lazily, so the whole file is never held in memory.
+    with open_data_file(filename) as jsonfile:
         for line in jsonfile:
-            lines.append(json.loads(line))
-    return lines
+            if line.strip() != "":
+                yield json.loads(line)
+
+
+def batches(items, batch_size: int = BATCH_SIZE):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def read_json_batches(filename, batch_size: int = BATCH_SIZE):
+    return batches(iter_json_file(filename), batch_size)
 
 
-def load_users(repo, data_path: Path, filename: str):
-    users_json = read_json_file(data_path / filename)
+def read_json_file(filename):
+    return list(iter_json_file(filename))
+
+
+def load_users(repo, data_path: Path, filename: str, batch_size: int = BATCH_SIZE):
+    for users_json in read_json_batches(resolve_data_file(data_path, filename), batch_size):
+        load_users_batch(repo, users_json)
+
+
+def load_users_batch(repo, users_json):
+    # Resolve the reading lists of the whole batch with a single lookup.
+    book_ids = [int(book_id) for user_item_json in users_json for book_id in user_item_json["reading_list"]]
+    books = {book.book_id: book for book in repo.get_books_by_ids(book_ids)}
     for user_item_json in users_json:
         reading_list = []
         for book_id in user_item_json["reading_list"]:
-            book = repo.get_book_by_id(int(book_id))
+            book = books.get(int(book_id))
             if book is not None:
                 reading_list.append(book)
         user: User = User(user_item_json["user_name"], user_item_json["password"], reading_list)
         repo.add_user(user)
 
 
-def load_reviews(repo, data_path: Path, filename: str):
-    for data_row in read_csv_file(data_path / filename):
-        print(data_row)
+def load_reviews(repo, data_path: Path, filename: str, batch_size: int = BATCH_SIZE):
+    for data_rows in batches(read_csv_file(resolve_data_file(data_path, filename)), batch_size):
+        load_reviews_batch(repo, data_rows)
+
+
+def load_reviews_batch(repo, data_rows):
+    books = {book.book_id: book for book in repo.get_books_by_ids([int(data_row[2]) for data_row in data_rows])}
+    for data_row in data_rows:
         id: int = int(data_row[0])
         user_name: str = data_row[1]
         book_id: int = int(data_row[2])
@@ -53,55 +90,200 @@ def load_reviews(repo, data_path: Path, filename: str):
         review_text: str = data_row[4]
         timestamp: str = data_row[5]
 
-        book: Book = repo.get_book_by_id(book_id)
+        book: Book = books.get(book_id)
 
         review: Review = Review(book.title, review_text, rating, user_name, review_id=id, timestamp=timestamp)
         repo.add_review(user_name, book, review)
 
 
-def load_authors_and_books(repo, data_path: Path, books_filename, authors_filename):
-    authors_json = read_json_file(data_path / authors_filename)
-    books_json = read_json_file(data_path / books_filename)
+def build_author_index(authors_json) -> dict:
+    # Map each author id to its name once, so every author reference of every book resolves in constant time.
+    # Later entries win, matching the behaviour of the previous linear scan over the authors file.
+    author_index = {}
+    for author_json in authors_json:
+        author_index[int(author_json['author_id'])] = author_json['name']
+    return author_index
+
+
+def load_authors_and_books(repo, data_path: Path, books_filename, authors_filename, batch_size: int = BATCH_SIZE):
+    author_index = build_author_index(iter_json_file(resolve_data_file(data_path, authors_filename)))
+    pool = InternPool()
+    for books_json in read_json_batches(resolve_data_file(data_path, books_filename), batch_size):
+        load_books_batch(repo, books_json, author_index, pool)
 
+
+def load_books_batch(repo, books_json, author_index: dict, pool: InternPool = None):
     for book_json in books_json:
-        book_instance = Book(int(book_json['book_id']), book_json['title'])
-        book_instance.publisher = Publisher(book_json['publisher'])
-        if book_json['publication_year'] != "":
-            book_instance.release_year = int(book_json['publication_year'])
-        if book_json['is_ebook'].lower() == 'false':
-            book_instance.ebook = False
-        else:
-            if book_json['is_ebook'].lower() == 'true':
-                book_instance.ebook = True
-        book_instance.description = book_json['description']
-        if book_json['num_pages'] != "":
-            book_instance.num_pages = int(book_json['num_pages'])
-        book_instance.ratings_count = int(book_json["ratings_count"])
-        book_instance.average_rating = float(book_json["average_rating"])
-        book_instance.url = book_json["url"]
-
-        # extract the author ids:
-        list_of_authors_ids = book_json['authors']
-        for author_id in list_of_authors_ids:
-
-            numerical_id = int(author_id['author_id'])
-            # We assume book authors are available in the authors file,
-            # otherwise more complex handling is required.
-            author_name = None
-            for author_json in authors_json:
-                if int(author_json['author_id']) == numerical_id:
-                    author_name = author_json['name']
-            book_instance.add_author(Author(numerical_id, author_name))
-
-        repo.add_book(book_instance)
-
-
-def load_inventory(repo, data_path: Path, filename):
-    inventory_json = read_json_file(data_path / filename)
+        repo.add_book(build_book(parse_book_record(book_json, author_index), pool))
+
+
+def parse_book_record(book_json, author_index: dict) -> dict:
+    # Convert and validate the raw JSON fields of a book. The result only holds plain values, so that it can be
+    # produced in a worker process and sent back to the importing process.
+    record = {
+        'book_id': int(book_json['book_id']),
+        'title': book_json['title'],
+        'publisher': book_json['publisher'],
+        'release_year': None,
+        'ebook': None,
+        'description': book_json['description'],
+        'num_pages': None,
+        'ratings_count': int(book_json["ratings_count"]),
+        'average_rating': float(book_json["average_rating"]),
+        'url': book_json["url"],
+        'authors': []
+    }
+    if book_json['publication_year'] != "":
+        record['release_year'] = int(book_json['publication_year'])
+    if book_json['is_ebook'].lower() == 'false':
+        record['ebook'] = False
+    else:
+        if book_json['is_ebook'].lower() == 'true':
+            record['ebook'] = True
+    if book_json['num_pages'] != "":
+        record['num_pages'] = int(book_json['num_pages'])
+
+    # extract the author ids:
+    for author_id in book_json['authors']:
+        numerical_id = int(author_id['author_id'])
+        # We assume book authors are available in the authors file,
+        # otherwise more complex handling is required.
+        record['authors'].append((numerical_id, author_index.get(numerical_id)))
+    return record
+
+
+def build_book(record: dict, pool: InternPool = None) -> Book:
+    # With an intern pool, books of the same publisher or author share one Publisher or Author object.
+    if pool is None:
+        pool = InternPool()
+    book_instance = Book(record['book_id'], record['title'])
+    book_instance.publisher = pool.publisher(record['publisher'])
+    book_instance.release_year = record['release_year']
+    book_instance.ebook = record['ebook']
+    book_instance.description = record['description']
+    book_instance.num_pages = record['num_pages']
+    book_instance.ratings_count = record['ratings_count']
+    book_instance.average_rating = record['average_rating']
+    book_instance.url = record['url']
+    for numerical_id, author_name in record['authors']:
+        book_instance.add_author(pool.author(numerical_id, author_name))
+    return book_instance
+
+
+def update_book_from_record(book: Book, record: dict, pool: InternPool = None):
+    # Every field is set, those missing from the record to None, so that the book ends up as build_book makes it.
+    if pool is None:
+        pool = InternPool()
+    book.title = record['title']
+    book.publisher = pool.publisher(record['publisher'])
+    book.release_year = record['release_year']
+    book.ebook = record['ebook']
+    book.description = record['description']
+    book.num_pages = record['num_pages']
+    book.ratings_count = record['ratings_count']
+    book.average_rating = record['average_rating']
+    book.url = record['url']
+    for author in list(book.authors):
+        book.remove_author(author)
+    for numerical_id, author_name in record['authors']:
+        book.add_author(pool.author(numerical_id, author_name))
+
+
+def load_book_changes(repo, data_path: Path, authors_filename, changes):
+    # Apply the inserted, updated and deleted records of the books file, leaving every other book untouched.
+    if changes.records:
+        author_index = build_author_index(iter_json_file(resolve_data_file(data_path, authors_filename)))
+        pool = InternPool()
+        for book_json in changes.records.values():
+            record = parse_book_record(book_json, author_index)
+            book = repo.get_book_by_id(record['book_id'])
+            if book is None:
+                repo.add_book(build_book(record, pool))
+            else:
+                update_book_from_record(book, record, pool)
+                repo.update_book(book)
+    for key in changes.deleted:
+        book = repo.get_book_by_id(int(key))
+        if book is not None:
+            repo.remove_book(book)
+
+
+def read_line_batches(filename, batch_size: int = BATCH_SIZE):
+    # Group the raw lines of a JSON-lines file without parsing them, so parsing can be done by worker processes.
+    batch = []
+    with open_data_file(filename) as jsonfile:
+        for line in jsonfile:
+            if line.strip() != "":
+                batch.append(line)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
+
+# Author index of a parsing worker process, set once by the pool initializer instead of being sent with every chunk.
+_worker_author_index = None
+
+
+def _init_parse_worker(author_index: dict):
+    global _worker_author_index
+    _worker_author_index = author_index
+
+
+def _parse_books_chunk(lines) -> list:
+    return [parse_book_record(json.loads(line), _worker_author_index) for line in lines]
+
+
+def load_authors_and_books_parallel(repo, data_path: Path, books_filename, authors_filename, workers: int,
+                                    batch_size: int = BATCH_SIZE):
+    author_index = build_author_index(iter_json_file(resolve_data_file(data_path, authors_filename)))
+    pool = InternPool()
+    chunks = read_line_batches(resolve_data_file(data_path, books_filename), batch_size)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_parse_worker,
+                             initargs=(author_index,)) as executor:
+        # Keep a bounded window of chunks in flight and merge the results in submission order, so the repository
+        # receives the books in file order whatever the number of workers.
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_parse_books_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                add_parsed_books(repo, pending.popleft().result(), pool)
+        while pending:
+            add_parsed_books(repo, pending.popleft().result(), pool)
+
+
+def add_parsed_books(repo, records, pool: InternPool = None):
+    for record in records:
+        repo.add_book(build_book(record, pool))
+
+
+def load_inventory(repo, data_path: Path, filename, batch_size: int = BATCH_SIZE):
+    for inventory_json in read_json_batches(resolve_data_file(data_path, filename), batch_size):
+        load_inventory_batch(repo, inventory_json)
+
+
+def load_inventory_batch(repo, inventory_json):
+    inventory_json = list(inventory_json)
+    books = {book.book_id: book
+             for book in repo.get_books_by_ids([int(item["book_id"]) for item in inventory_json])}
     for inventory_item_json in inventory_json:
-        book: Book = repo.get_book_by_id(int(inventory_item_json["book_id"]))
+        book: Book = books.get(int(inventory_item_json["book_id"]))
+        if book is not None:
+            repo.add_to_inventory(book, inventory_item_json["price"], inventory_item_json["stock"])
+
+
+def load_inventory_changes(repo, data_path: Path, filename, changes, extra_keys=()):
+    # extra_keys names books whose inventory record has to be applied even if it did not change, e.g. books that
+    # have just been added to the repository.
+    load_inventory_batch(repo, changes.records.values())
+    extra_keys = set(extra_keys) - set(changes.records)
+    if extra_keys:
+        for inventory_item_json in iter_json_file(resolve_data_file(data_path, filename)):
+            if str(inventory_item_json["book_id"]) in extra_keys:
+                load_inventory_batch(repo, [inventory_item_json])
+    for key in changes.deleted:
+        book: Book = repo.get_book_by_id(int(key))
         if book is not None:
-            book_inventory: BooksInventory = repo.books_inventory
-            book_inventory.add_book(book, inventory_item_json["price"], inventory_item_json["stock"])
-            book.price = inventory_item_json["price"]
-            book.stock = inventory_item_json["stock"]
+            repo.remove_from_inventory(book)
@@ -0,0 +1,86 @@
+from sqlalchemy import inspect, select, func, literal_column
+from sqlalchemy.schema import CreateColumn
+
+from library.adapters.orm import metadata, books_table, authors_table, authors_books_table, publishers_table, \
+    search_trigrams_table
+from library.adapters.database_repository import trigram_rows, TITLE_TRIGRAMS, AUTHOR_TRIGRAMS, PUBLISHER_TRIGRAMS
+
+# Indexes of earlier versions of the schema that no query uses any more.
+OBSOLETE_INDEXES = ('ix_books_first_author',)
+
+
+def migrate_schema(engine) -> bool:
+    """ Brings the tables of a database written by an earlier version of the schema up to date.
+
+    Missing tables are created, missing columns are added and filled in from the rows already stored, and missing
+    indexes are created, and obsolete ones dropped. Unlike a repopulation, this keeps the users, reviews and reading lists, which the data files
+    cannot rebuild. Returns whether the schema was changed; a database without tables is left to be populated.
+    """
+    inspector = inspect(engine)
+    stored_tables = set(inspector.get_table_names())
+    if not stored_tables:
+        return False
+    stored_columns = {name: {column['name'] for column in inspector.get_columns(name)} for name in stored_tables}
+    # The inspector skips the indexes on expressions, so the index names are read from the SQLite catalog.
+    stored_indexes = {name for name, in engine.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    new_tables = [table for table in metadata.sorted_tables if table.name not in stored_tables]
+    new_columns = [column for table in metadata.sorted_tables if table.name in stored_tables
+                   for column in table.columns if column.name not in stored_columns[table.name]]
+    new_indexes = [index for table in metadata.sorted_tables if table.name in stored_tables
+                   for index in table.indexes if index.name not in stored_indexes]
+    obsolete_indexes = [name for name in OBSOLETE_INDEXES if name in stored_indexes]
+    if not (new_tables or new_columns or new_indexes or obsolete_indexes):
+        return False
+
+    with engine.begin() as connection:
+        metadata.create_all(connection, tables=new_tables)
+        for column in new_columns:
+            # SQLite adds a column to the rows already stored with its default, which the updates below replace.
+            column_definition = CreateColumn(column).compile(dialect=connection.dialect)
+            connection.exec_driver_sql(f'ALTER TABLE {column.table.name} ADD COLUMN {column_definition}')
+        if books_table.c.publisher_id in new_columns:
+            share_publishers_and_authors(connection)
+        if books_table.c.first_author_name in new_columns:
+            fill_in_first_author_names(connection)
+        if search_trigrams_table in new_tables:
+            index_search_terms(connection)
+        for index in new_indexes:
+            index.create(connection)
+        for name in obsolete_indexes:
+            connection.exec_driver_sql(f'DROP INDEX {name}')
+    return True
+
+
+def share_publishers_and_authors(connection):
+    # Publishers used to be stored once per book, in a row referring to the book through publishers.book_id, and
+    # authors once per book they wrote. Point each book at the first row of its publisher's name, then keep only the
+    # first row of each publisher and author. publishers.book_id is no longer part of the schema, so the update
+    # names it in SQL.
+    connection.exec_driver_sql(
+        'UPDATE books SET publisher_id = (SELECT min(shared.id) FROM publishers AS own '
+        'JOIN publishers AS shared ON shared.name = own.name WHERE own.book_id = books.book_id)')
+    connection.execute(publishers_table.delete().where(publishers_table.c.id.not_in(
+        select(books_table.c.publisher_id).where(books_table.c.publisher_id.is_not(None)))))
+    connection.execute(authors_table.delete().where(authors_table.c.id.not_in(
+        select(func.min(authors_table.c.id)).group_by(authors_table.c.unique_id))))
+
+
+def fill_in_first_author_names(connection):
+    first = select(authors_table.c.full_name).select_from(
+        authors_books_table.join(authors_table, authors_books_table.c.author_id == authors_table.c.unique_id)).where(
+        authors_books_table.c.book_id == books_table.c.book_id).order_by(authors_books_table.c.id).limit(1)
+    connection.execute(books_table.update().values(
+        first_author_name=func.coalesce(first.scalar_subquery(), literal_column("''"))))
+
+
+def index_search_terms(connection):
+    rows = []
+    for book_id, title in connection.execute(select(books_table.c.book_id, books_table.c.title)):
+        rows.extend(trigram_rows(TITLE_TRIGRAMS, title, book_id))
+    for unique_id, full_name in connection.execute(
+            select(authors_table.c.unique_id, func.min(authors_table.c.full_name)).group_by(authors_table.c.unique_id)):
+        rows.extend(trigram_rows(AUTHOR_TRIGRAMS, full_name, unique_id))
+    for publisher_id, name in connection.execute(select(publishers_table.c.id, publishers_table.c.name)):
+        rows.extend(trigram_rows(PUBLISHER_TRIGRAMS, name, publisher_id))
+    if rows:
+        connection.execute(search_trigrams_table.insert(), rows)
@@ -1,16 +1,46 @@
 from datetime import date
-from typing import List
+from typing import List, Optional
 import math
 
-from sqlalchemy import desc, asc
+from sqlalchemy import desc, asc, select, func, bindparam, tuple_, and_
 from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
 
-from sqlalchemy.orm import scoped_session
+from sqlalchemy.orm import scoped_session, selectinload, joinedload
 from flask import _app_ctx_stack
 
 # from library.domain.model import User, Article, Comment, Tag
-from library.domain.model import BooksInventory, Publisher, Author, Book, Review, User
-from library.adapters.repository import AbstractRepository, BOOKS_PER_PAGE
+from library.domain.model import BooksInventory, Publisher, Author, Book, Review, User, DEFAULT_PRICE, \
+    DEFAULT_STOCK
+from library.adapters.repository import AbstractRepository, BOOKS_PER_PAGE, parse_year_range, BookPage
+from library.adapters.orm import books_table, authors_table, authors_books_table, publishers_table, reviews_table, \
+    users_table, reading_list_user_table, search_trigrams_table, release_order, author_order
+from library.adapters.trigram_index import trigrams, TRIGRAM_LENGTH
+from library.adapters.search_cache import SearchCache
+
+
+# Upper bound on the number of ids bound in one IN clause.
+MAX_IDS_PER_QUERY = 500
+
+# Kinds of terms in the search_trigrams table.
+TITLE_TRIGRAMS = 'title'
+AUTHOR_TRIGRAMS = 'author'
+PUBLISHER_TRIGRAMS = 'publisher'
+
+
+def trigram_rows(kind: str, term: str, target_id: int) -> List[dict]:
+    return [{'kind': kind, 'trigram': trigram, 'target_id': target_id} for trigram in trigrams(term)]
+
+
+def trigram_filters(kind: str, column, text: str) -> list:
+    """ Returns filters narrowing column down to the ids of the terms of kind that have every trigram of text.
+
+    The filters only narrow the candidates down; the matches still have to be verified against the terms.
+    """
+    if len(text) < TRIGRAM_LENGTH:
+        return []
+    table = search_trigrams_table
+    return [column.in_(select(table.c.target_id).where(table.c.kind == kind, table.c.trigram == trigram))
+            for trigram in sorted(trigrams(text))]
 
 
 class SessionContextManager:
@@ -45,17 +75,62 @@ class SessionContextManager:
             self.__session.close()
 
 
+def listed_book_loading() -> tuple:
+    """ Returns the loader options that read the authors and publishers of all the books of a query up front, as a
+    listing of the books shows them, rather than with a query per book when each is first shown.
+    """
+    return selectinload(Book._Book__authors), joinedload(Book._Book__publisher)
+
+
+def book_loading() -> tuple:
+    """ Returns the loader options that read everything the page of a book shows with the book. """
+    return (*listed_book_loading(), selectinload(Book._Book__reviews))
+
+
+def user_loading() -> tuple:
+    """ Returns the loader options that read the reviews and reading list of a user, and the authors and publishers
+    of the books in the reading list, with the user.
+    """
+    reading_list = selectinload(User._User__reading_list)
+    return (selectinload(User._User__reviews), reading_list.selectinload(Book._Book__authors),
+            reading_list.joinedload(Book._Book__publisher))
+
+
+# The columns each view is sorted by, ending with the book id so that the sort keys are unique. get_page passes the
+# sort key of a book as the cursor of the pages before and after it.
+KEY_COLUMNS = {
+    "home": lambda: [books_table.c.title, books_table.c.book_id],
+    "publishers": lambda: [publishers_table.c.name, books_table.c.book_id],
+    "authors": lambda: [author_order, books_table.c.book_id],
+    "books_by_date": lambda: [release_order, books_table.c.book_id],
+}
+
+
+def sorted_after(columns: list, key: tuple):
+    # The bound on the first column alone lets SQLite seek in an index on an expression, which it does not do for
+    # the comparison of the whole row.
+    return and_(columns[0] >= key[0], tuple_(*columns) > tuple_(*key))
+
+
+def sorted_before(columns: list, key: tuple):
+    return and_(columns[0] <= key[0], tuple_(*columns) < tuple_(*key))
+
+
 class SqlAlchemyRepository(AbstractRepository):
 
     def __init__(self, session_factory):
         self._session_cm = SessionContextManager(session_factory)
-        self.__indexes = {"home": 0, "books_by_date": 0, "authors": 0, "publishers": 0}
         self.__books_inventory = BooksInventory()
+        self.__search_cache = SearchCache()
 
     @property
     def books_inventory(self) -> BooksInventory:
         return self.__books_inventory
 
+    @property
+    def search_cache(self) -> SearchCache:
+        return self.__search_cache
+
     def close_session(self):
         self._session_cm.close_current_session()
 
@@ -70,29 +145,37 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_user(self, user_name: str) -> User:
         user = None
         try:
-            user = self._session_cm.session.query(User).filter(User._User__user_name == user_name).one()
+            user = self._session_cm.session.query(User).options(*user_loading()).filter(
+                User._User__user_name == user_name).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
 
         return user
 
-    @property
-    def indexes(self):
-        return self.__indexes
-
     def dataset_of_books(self) -> List[Book]:
-        return self._session_cm.session.query(Book).all()
+        return self._session_cm.session.query(Book).options(*listed_book_loading()).all()
 
     def get_book_by_id(self, book_id) -> Book:
         book = None
         try:
-            book = self._session_cm.session.query(Book).filter(Book._Book__book_id == book_id).one()
+            book = self._session_cm.session.query(Book).options(*book_loading()).filter(
+                Book._Book__book_id == book_id).one()
         except NoResultFound:
             pass # Ignore any exception and return None.
 
         return book
 
+    def get_books_by_ids(self, id_list) -> List[Book]:
+        ids = list(set(id_list))
+        books = []
+        # Query in chunks to stay below the limit SQLite puts on the number of parameters of a statement.
+        for start in range(0, len(ids), MAX_IDS_PER_QUERY):
+            chunk = ids[start:start + MAX_IDS_PER_QUERY]
+            books.extend(self._session_cm.session.query(Book).options(*listed_book_loading()).filter(
+                Book._Book__book_id.in_(chunk)).all())
+        return books
+
     def get_title(self, book: Book) -> str:
         return book.title
 
@@ -113,64 +196,197 @@ class SqlAlchemyRepository(AbstractRepository):
             return math.inf
         return book.release_year
 
-    def get_page_by_index(self, page, text: str = None):
+    def get_page(self, page, text: str = None, after: tuple = None, before: tuple = None,
+                 last: bool = False) -> BookPage:
         if text is None or text.strip() == "":
-            if page == "home":
-                # Query to get all books, sort by first title
-                books = self._session_cm.session.query(Book).order_by(Book._Book__title).all()
-            elif page == "publishers": 
-                # Query to get all books, sort by publisher
-                books = self._session_cm.session.query(Book).join(Publisher).order_by(Publisher._Publisher__name).all()
-            elif page == "authors": 
-                # Query to get all books, sort by first author
-                books = self._session_cm.session.query(Book).select_from(Author).order_by(Author._Author__full_name).all()
-                books.sort(key=self.get_first_author)
-            else: 
-                # Query to get all books, sort by date
-                books = self._session_cm.session.query(Book).order_by(Book._Book__release_year).all()
+            return self.__keyset_page(page, after, before, last)
+
+        # A search is a filter on the query of the view, so its pages are read like those of the whole view.
+        filters = self.__search_filters(page, text.lower().strip())
+        if filters is None:
+            return BookPage([], total=0)
+        book_page = self.__keyset_page(page, after, before, last, filters)
+        book_page.total = self.__count(page, text, filters, book_page, after is not None or before is not None)
+        return book_page
+
+    def __query(self, page):
+        query = self._session_cm.session.query(Book)
+        if page == "publishers":
+            query = query.join(Publisher)
+        return query
+
+    def __count(self, page, text: str, filters: list, book_page: BookPage, from_cursor: bool) -> int:
+        # The cache holds the number of books found, as the only element of a tuple.
+        cached = self.__search_cache.get(page, text)
+        if cached is not None:
+            return cached[0]
+        generation = self.__search_cache.generation
+        alone = book_page.previous_cursor is None and book_page.next_cursor is None
+        if alone and from_cursor and book_page.books:
+            # The page holds every book found. A cursor may be stale or made up, so a count relative to it is not
+            # cached for the pages read without one.
+            return len(book_page.books)
+        if alone and not from_cursor:
+            # The first page holds every book found, so there is nothing left to count.
+            total = len(book_page.books)
+        else:
+            total = self.__query(page).filter(*filters).count()
+        self.__search_cache.put(page, text, (total,), generation)
+        return total
+
+    def __keyset_page(self, page, after: tuple, before: tuple, last: bool, filters: list = ()) -> BookPage:
+        # Seeks to the cursor on the sort key instead of skipping the pages before it, so every page costs the same.
+        columns = KEY_COLUMNS[page]()
+        query = self.__query(page).filter(*filters)
+        # Cursors of another view are ignored, as page_bounds does.
+        after = after if after is not None and len(after) == len(columns) else None
+        before = before if before is not None and len(before) == len(columns) else None
+        descending = after is None and (before is not None or last)
+        rows = query.add_columns(*columns).options(*listed_book_loading())
+        if after is not None:
+            rows = rows.filter(sorted_after(columns, after))
+        elif before is not None:
+            rows = rows.filter(sorted_before(columns, before))
+        # One row more than a page tells whether there are books beyond the page.
+        rows = rows.order_by(*(map(desc, columns) if descending else columns)).limit(BOOKS_PER_PAGE + 1).all()
+        more = len(rows) > BOOKS_PER_PAGE
+        rows = rows[:BOOKS_PER_PAGE]
+        if descending:
+            rows.reverse()
+        if not rows:
+            return BookPage([])
+        first, final = tuple(rows[0][1:]), tuple(rows[-1][1:])
+        if descending:
+            has_previous = more
+            has_next = before is not None and self.__has_books(query.filter(sorted_after(columns, final)))
         else:
-            text = text.lower().strip()
-            self.indexes[page] = 0
-            if page == "home":
-                # Query to get all books with text in title, sort by title
-                books = self._session_cm.session.query(Book).filter(Book._Book__title.contains(text)).order_by(Book._Book__title).all()
-            elif page == "publishers":
-                # Query to get all books with text in publisher, sort by publisher.name.lower
-                books = self._session_cm.session.query(Book).join(Publisher).order_by(Publisher._Publisher__name).filter(Publisher._Publisher__name.contains(text)).all()
-            elif page == "authors":
-                # Query to get all books with text in any author's name, sort by first author
-                books = self._session_cm.session.query(Book).select_from(Author).order_by(Author._Author__full_name).filter(Author._Author__full_name.contains(text)).all()
-                books.sort(key=self.get_first_author)
-                books = [b for b in books if text in ", ".join([a.full_name for a in b.authors]).lower()]
-            else:
-                try:
-                    text = int(text)
-                except:
-                    return []
-                # Query to get all books with text in date, sort by first date
-                books = self._session_cm.session.query(Book).filter(text == Book._Book__release_year).order_by(Book._Book__release_year).all()
-
-        return books[self.__indexes[page]: self.__indexes[page] + BOOKS_PER_PAGE]
-
-    def get_highest_index(self) -> int:
-        return (math.ceil(self.get_number_of_books() / BOOKS_PER_PAGE) - 1) * BOOKS_PER_PAGE
-
-    def first(self, page):
-        self.__indexes[page] = 0
-
-    def last(self, page):
-        self.__indexes[page] = self.get_highest_index()
-
-    def previous(self, page):
-        self.__indexes[page] = max(0, self.__indexes[page] - BOOKS_PER_PAGE)
-
-    def next(self, page):
-        self.__indexes[page] = min(self.__indexes[page] + 12, self.get_highest_index())
+            has_previous = after is not None and self.__has_books(query.filter(sorted_before(columns, first)))
+            has_next = more
+        return BookPage([row[0] for row in rows], first if has_previous else None, final if has_next else None)
+
+    def __has_books(self, query) -> bool:
+        return self._session_cm.session.query(query.exists()).scalar()
+
+    def __search_filters(self, page, text: str) -> Optional[list]:
+        """ Returns the filters selecting the books found by the search for text in page, or None if the text cannot
+        find any books.
+        """
+        if page == "home":
+            return [*trigram_filters(TITLE_TRIGRAMS, books_table.c.book_id, text), books_table.c.title.contains(text)]
+        if page == "publishers":
+            return [*trigram_filters(PUBLISHER_TRIGRAMS, publishers_table.c.id, text),
+                    publishers_table.c.name.contains(text)]
+        if page == "authors":
+            # Books with any author whose name contains text.
+            authors = select(authors_books_table.c.book_id).join(
+                authors_table, authors_books_table.c.author_id == authors_table.c.unique_id).where(
+                *trigram_filters(AUTHOR_TRIGRAMS, authors_table.c.unique_id, text),
+                authors_table.c.full_name.contains(text))
+            return [books_table.c.book_id.in_(authors)]
+
+        year_range = parse_year_range(text)
+        if year_range is not None:
+            # Books of an unknown year are in no range.
+            low, high = year_range
+            filters = [books_table.c.release_year.isnot(None)]
+            if low is not None:
+                filters.append(books_table.c.release_year >= low)
+            if high is not None:
+                filters.append(books_table.c.release_year <= high)
+            return filters
+        try:
+            year = int(text)
+        except ValueError:
+            return None
+        return [books_table.c.release_year == year]
 
     def add_book(self, book: Book):
         with self._session_cm as scm:
+            self.__share_stored_publisher_and_authors(scm.session, book)
             scm.session.add(book)
+            scm.session.flush()
+            self.__index_search_terms(scm.session, book)
+            scm.commit()
+        self.__search_cache.bump()
+
+    def __index_search_terms(self, session, book: Book):
+        # Index the title of the book, and the names of its publisher and authors unless they are indexed already.
+        rows = trigram_rows(TITLE_TRIGRAMS, book.title, book.book_id)
+        if book.publisher is not None and not self.__is_indexed(session, PUBLISHER_TRIGRAMS, book.publisher.id):
+            rows.extend(trigram_rows(PUBLISHER_TRIGRAMS, book.publisher.name, book.publisher.id))
+        for author in book.authors:
+            if not self.__is_indexed(session, AUTHOR_TRIGRAMS, author.unique_id):
+                rows.extend(trigram_rows(AUTHOR_TRIGRAMS, author.full_name, author.unique_id))
+        if rows:
+            session.execute(search_trigrams_table.insert(), rows)
+
+    def __is_indexed(self, session, kind: str, target_id: int) -> bool:
+        table = search_trigrams_table
+        return session.execute(
+            select(table.c.id).where(table.c.kind == kind, table.c.target_id == target_id).limit(1)).first() is not None
+
+    def __remove_title_trigrams(self, session, book_id: int):
+        table = search_trigrams_table
+        session.execute(table.delete().where(table.c.kind == TITLE_TRIGRAMS, table.c.target_id == book_id))
+
+    def __share_stored_publisher_and_authors(self, session, book: Book):
+        # Point the book at the publisher and author rows that are already stored instead of inserting duplicates.
+        with session.no_autoflush:
+            if book.publisher is not None:
+                stored = session.query(Publisher).filter(
+                    Publisher._Publisher__name == book.publisher.name).first()
+                if stored is not None:
+                    book.publisher = stored
+            authors = []
+            for author in book.authors:
+                stored = session.query(Author).filter(Author._Author__unique_id == author.unique_id).first()
+                authors.append(author if stored is None else stored)
+            for author in list(book.authors):
+                book.remove_author(author)
+            for author in authors:
+                book.add_author(author)
+
+    def update_book(self, book: Book):
+        with self._session_cm as scm:
+            self.__share_stored_publisher_and_authors(scm.session, book)
+            scm.session.flush()
+            self.__remove_title_trigrams(scm.session, book.book_id)
+            self.__index_search_terms(scm.session, book)
             scm.commit()
+        self.__search_cache.bump()
+
+    def remove_book(self, book: Book):
+        book_id = book.book_id
+        if self.__books_inventory.find_book(book_id) is not None:
+            self.__books_inventory.remove_book(book_id)
+        with self._session_cm as scm:
+            # Delete the rows referring to the book before the book itself.
+            for table in (reading_list_user_table, reviews_table, authors_books_table, books_table):
+                scm.session.execute(table.delete().where(table.c.book_id == book_id))
+            self.__remove_title_trigrams(scm.session, book_id)
+            scm.commit()
+            scm.session.expire_all()
+        self.__search_cache.bump()
+
+    def add_to_inventory(self, book: Book, price: int, stock: int):
+        self.__books_inventory.add_book(book, price, stock)
+        with self._session_cm as scm:
+            book.price = price
+            book.stock = stock
+            scm.commit()
+        self.__search_cache.bump()
+
+    def remove_from_inventory(self, book: Book):
+        if self.__books_inventory.find_book(book.book_id) is not None:
+            self.__books_inventory.remove_book(book.book_id)
+        with self._session_cm as scm:
+            book.price = DEFAULT_PRICE
+            book.stock = DEFAULT_STOCK
+            scm.commit()
+        self.__search_cache.bump()
+
+    def bulk_populator(self, batch_size: int):
+        return BulkPopulator(self._session_cm.session, self.__books_inventory, batch_size, self.__search_cache)
 
     def get_number_of_books(self):
         number_of_books = self._session_cm.session.query(Book).count()
@@ -185,3 +401,143 @@ class SqlAlchemyRepository(AbstractRepository):
         with self._session_cm as scm:
             scm.session.add(review)
             scm.commit()
+        self.__search_cache.bump()
+
+    def add_to_reading_list(self, user_name: str, book: Book):
+        with self._session_cm as scm:
+            user: User = self.get_user(user_name)
+            if isinstance(user, User):
+                user.add_to_reading_list(book)
+                scm.commit()
+
+    def remove_from_reading_list(self, user_name: str, book: Book):
+        with self._session_cm as scm:
+            user: User = self.get_user(user_name)
+            if isinstance(user, User):
+                user.remove_from_reading_list(book)
+                scm.commit()
+
+
+class BulkPopulator:
+    """ Writes imported data straight into the tables, batch_size rows per executemany and transaction.
+
+    It offers the subset of the repository interface used by the data importer, so the loaders in
+    csv_data_importer can fill the database without creating a session object and a transaction per row.
+    """
+
+    def __init__(self, session, books_inventory: BooksInventory, batch_size: int, search_cache: SearchCache = None):
+        self.__session = session
+        self.__books_inventory = books_inventory
+        self.__search_cache = search_cache
+        self.__batch_size = batch_size
+        # Only the titles of the imported books are kept, for the reviews and for resolving book ids.
+        self.__book_titles = {}
+        self.__user_ids = {}
+        self.__next_user_id = (session.execute(select(func.max(users_table.c.id))).scalar() or 0) + 1
+        # Publishers and authors are written once, however many books refer to them.
+        self.__publisher_ids = {}
+        self.__next_publisher_id = (session.execute(select(func.max(publishers_table.c.id))).scalar() or 0) + 1
+        self.__stored_author_ids = set()
+        self.__book_rows = []
+        self.__publisher_rows = []
+        self.__author_rows = []
+        self.__authors_books_rows = []
+        self.__trigram_rows = []
+        self.__inventory_rows = []
+        self.__user_rows = []
+        self.__reading_list_rows = []
+        self.__review_rows = []
+
+    @property
+    def books_inventory(self) -> BooksInventory:
+        return self.__books_inventory
+
+    def add_book(self, book: Book):
+        self.__book_titles[book.book_id] = book.title
+        self.__book_rows.append({
+            'book_id': book.book_id, 'title': book.title, 'description': book.description,
+            'publisher_id': self.__publisher_id(book.publisher),
+            'release_year': book.release_year, 'ebook': book.ebook, 'num_pages': book.num_pages,
+            'average_rating': book.average_rating, 'ratings_count': book.ratings_count,
+            'price': book.price, 'stock': book.stock, 'url': book.url, 'first_author_name': book.first_author_name
+        })
+        self.__trigram_rows.extend(trigram_rows(TITLE_TRIGRAMS, book.title, book.book_id))
+        for author in book.authors:
+            if author.unique_id not in self.__stored_author_ids:
+                self.__stored_author_ids.add(author.unique_id)
+                self.__author_rows.append({'unique_id': author.unique_id, 'full_name': author.full_name})
+                self.__trigram_rows.extend(trigram_rows(AUTHOR_TRIGRAMS, author.full_name, author.unique_id))
+            self.__authors_books_rows.append({'book_id': book.book_id, 'author_id': author.unique_id})
+        self.__flush_if_full(self.__book_rows)
+
+    def __publisher_id(self, publisher: Publisher):
+        if publisher is None:
+            return None
+        publisher_id = self.__publisher_ids.get(publisher.name)
+        if publisher_id is None:
+            publisher_id = self.__next_publisher_id
+            self.__next_publisher_id += 1
+            self.__publisher_ids[publisher.name] = publisher_id
+            self.__publisher_rows.append({'id': publisher_id, 'name': publisher.name})
+            self.__trigram_rows.extend(trigram_rows(PUBLISHER_TRIGRAMS, publisher.name, publisher_id))
+        return publisher_id
+
+    def get_book_by_id(self, book_id) -> Book:
+        title = self.__book_titles.get(book_id)
+        if title is None:
+            return None
+        return Book(book_id, title)
+
+    def get_books_by_ids(self, id_list) -> List[Book]:
+        return [Book(book_id, self.__book_titles[book_id]) for book_id in set(id_list) if book_id in self.__book_titles]
+
+    def add_to_inventory(self, book: Book, price: int, stock: int):
+        self.__books_inventory.add_book(book, price, stock)
+        self.__inventory_rows.append({'target_id': book.book_id, 'price': price, 'stock': stock})
+        self.__flush_if_full(self.__inventory_rows)
+
+    def add_user(self, user: User):
+        user_id = self.__next_user_id
+        self.__next_user_id += 1
+        self.__user_ids[user.user_name] = user_id
+        self.__user_rows.append({'id': user_id, 'user_name': user.user_name, 'password': user.password})
+        for book in user.reading_list:
+            self.__reading_list_rows.append({'book_id': book.book_id, 'user_id': user_id})
+        self.__flush_if_full(self.__user_rows)
+
+    def add_review(self, user_name: str, book: Book, review: Review):
+        self.__review_rows.append({
+            'book_title': review.book_title, 'user_name': user_name, 'user_id': self.__user_ids.get(user_name),
+            'book_id': book.book_id, 'rating': review.rating, 'review_text': review.review_text,
+            'timestamp': review.timestamp
+        })
+        self.__flush_if_full(self.__review_rows)
+
+    def __flush_if_full(self, rows):
+        if len(rows) >= self.__batch_size:
+            self.flush()
+
+    def flush(self):
+        # Tables are written in foreign key order, so every buffered row only refers to rows written before it.
+        writes = [
+            (publishers_table.insert(), self.__publisher_rows),
+            (books_table.insert(), self.__book_rows),
+            (authors_table.insert(), self.__author_rows),
+            (authors_books_table.insert(), self.__authors_books_rows),
+            (search_trigrams_table.insert(), self.__trigram_rows),
+            (books_table.update().where(books_table.c.book_id == bindparam('target_id')), self.__inventory_rows),
+            (users_table.insert(), self.__user_rows),
+            (reading_list_user_table.insert(), self.__reading_list_rows),
+            (reviews_table.insert(), self.__review_rows),
+        ]
+        try:
+            for statement, rows in writes:
+                if rows:
+                    self.__session.execute(statement, rows)
+                    rows.clear()
+            self.__session.commit()
+        except:
+            self.__session.rollback()
+            raise
+        if self.__search_cache is not None:
+            self.__search_cache.bump()
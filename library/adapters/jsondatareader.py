@@ -1,44 +1,241 @@
 from library.books_blueprint.books import book
 from typing import List
+import gc
 import math
+import os
+import pickle
+import threading
+from datetime import datetime
 from pathlib import Path
 
-from library.domain.model import BooksInventory, Publisher, Author, Book, Review, User
-from library.adapters.repository import AbstractRepository, RepositoryException, BOOKS_PER_PAGE
+from library.domain.model import BooksInventory, Publisher, Author, Book, Review, User, DEFAULT_PRICE, \
+    DEFAULT_STOCK
+from library.adapters.repository import AbstractRepository, RepositoryException, parse_year_range, BookPage, \
+    page_bounds, keyed_page
+from library.adapters.compression import resolve_data_file
+from library.adapters.book_order import BookOrder, title_key, publisher_key, first_author_key, date_key
+from library.adapters.trigram_index import TrigramIndex
+from library.adapters.search_cache import SearchCache
+from library.adapters.read_write_lock import ReadWriteLock
+from library.adapters.write_ahead_log import WriteAheadLog
 
 book_dataset = None
 
 
+def title_terms(book: Book) -> list:
+    return [book.title]
+
+
+def publisher_terms(book: Book) -> list:
+    return [] if book.publisher is None else [book.publisher.name]
+
+
+def author_terms(book: Book) -> list:
+    return [author.full_name for author in book.authors]
+
+
+# The terms searched by the search box of each view.
+SEARCH_TERMS = {"home": title_terms, "publishers": publisher_terms, "authors": author_terms}
+
+# The search indexes are built again once the entries that updated and removed books leave in them outnumber the
+# books this many times.
+STALE_SEARCH_ENTRIES_RATIO = 1
+
+# Snapshots start with SNAPSHOT_MAGIC followed by SNAPSHOT_VERSION. Bump the version whenever the attributes of
+# BooksJSONReader or of the domain model change, so that snapshots written by older code are ignored.
+SNAPSHOT_MAGIC = b'BOOKSNAP'
+SNAPSHOT_VERSION = 12
+
+# Format of the review timestamps written to the write-ahead log, which Review parses back.
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def fold_changes(changes: list) -> list:
+    """ Returns the logged changes that the later ones do not make redundant, in their order.
+
+    A user registers once. Of the changes to the reading list of a user for one book, those before the last removal
+    and the additions of a book already on the list do nothing. Every review is kept.
+    """
+    last_removal = {}
+    for index, change in enumerate(changes):
+        if change['change'] == 'remove_from_reading_list':
+            last_removal[change['user_name'], change['book_id']] = index
+    users = set()
+    added = set()
+    kept = []
+    for index, change in enumerate(changes):
+        kind = change['change']
+        if kind == 'user':
+            if change['user_name'] in users:
+                continue
+            users.add(change['user_name'])
+        elif kind in ('add_to_reading_list', 'remove_from_reading_list'):
+            key = change['user_name'], change['book_id']
+            if index < last_removal.get(key, -1):
+                continue
+            if kind == 'add_to_reading_list':
+                if key in added:
+                    continue
+                added.add(key)
+        kept.append(change)
+    return kept
+
+
 class BooksJSONReader(AbstractRepository):
     def __init__(self):
+        # Request threads read in parallel while changes are made one at a time.
+        self.__lock = ReadWriteLock()
         self.__dataset_of_books = []
+        # Primary key index of the books, kept in step with __dataset_of_books by add_book and remove_book.
+        self.__books_by_id = {}
+        # The books in the order of each view, kept up to date by add_book instead of sorting for every page.
+        self.__orders = {"home": BookOrder(title_key), "books_by_date": BookOrder(date_key),
+                         "authors": BookOrder(first_author_key), "publishers": BookOrder(publisher_key)}
+        # Trigram indexes of the terms searched by each view, kept up to date by add_book. Updated and removed books
+        # leave stale entries behind, which are counted until the indexes are built again.
+        self.__search_indexes = {page: TrigramIndex() for page in SEARCH_TERMS}
+        self.__stale_search_entries = 0
+        self.__search_cache = SearchCache()
         self.__books_inventory = BooksInventory()
-        self.__indexes = {"home": 0, "books_by_date": 0, "authors": 0, "publishers": 0}
-        self.__users = []
+        # Users keyed by user name, in the order they were added.
+        self.__users = {}
+        # Registrations, reviews and reading list changes are logged once a log is attached. Every logged change is
+        # numbered, and the repository, snapshots included, records the number of the last change it holds.
+        self.__log = None
+        self.__log_position = 0
+        self.__snapshot_path = None
+        self.__snapshot_data_path = None
+        self.__compaction_size = None
+        self.__compaction = threading.Lock()
+
+    def attach_log(self, log: WriteAheadLog, snapshot_path=None, data_path: Path = None, compaction_size: int = None):
+        """ Applies the changes in log that the repository does not hold yet, then logs the changes made to it.
+
+        The log is compacted whenever it grows to compaction_size bytes. With a snapshot path, a new snapshot is
+        written first, so that a restart from it only replays the changes made since; a repository populated anew,
+        because the data files changed, replays all of them.
+        """
+        with self.__lock.writing():
+            for change in log.changes():
+                if change['position'] > self.__log_position:
+                    self.__replay(change)
+                    self.__log_position = change['position']
+            self.__log = log
+            self.__snapshot_path = snapshot_path
+            self.__snapshot_data_path = data_path
+            self.__compaction_size = compaction_size
+        if self.__needs_compaction():
+            self.compact()
+
+    def compact(self):
+        """ Writes the repository to its snapshot, if it has one, and compacts the log. """
+        with self.__compaction:
+            self.__compact()
+
+    def __compact(self):
+        # Called with the compaction lock held, which keeps compactions from writing the snapshot at the same time.
+        # Reading keeps out the writers, which would log changes the snapshot misses.
+        with self.__lock.reading():
+            if self.__snapshot_path:
+                self.dump_snapshot(self.__snapshot_path, self.__snapshot_data_path)
+            self.__log.compact(fold_changes)
+
+    def __replay(self, change: dict):
+        kind = change['change']
+        if kind == 'user':
+            self.add_user(User(change['user_name'], change['password']))
+            return
+        book = self.get_book_by_id(change['book_id'])
+        if book is None:
+            return
+        if kind == 'review':
+            review = Review(change['book_title'], change['review_text'], change['rating'], change['user_name'],
+                            change['review_id'], change['timestamp'])
+            self.add_review(change['user_name'], book, review)
+        elif kind == 'add_to_reading_list':
+            self.add_to_reading_list(change['user_name'], book)
+        elif kind == 'remove_from_reading_list':
+            self.remove_from_reading_list(change['user_name'], book)
+
+    def __log_change(self, change: dict):
+        # Called with the lock held for writing, so that changes are logged in the order they are made. Returns the
+        # ticket to pass to __sync once the lock is released, or None if there is no log.
+        if self.__log is None:
+            return None
+        self.__log_position += 1
+        change['position'] = self.__log_position
+        return self.__log.write(change)
+
+    def __sync(self, ticket):
+        # Waits outside the lock for the change to reach the disk, so that writers arriving together share a sync.
+        if ticket is None:
+            return
+        self.__log.sync(ticket)
+        if self.__needs_compaction() and not self.__compaction.locked():
+            threading.Thread(target=self.__compact_in_background, name="compaction", daemon=True).start()
+
+    def __needs_compaction(self) -> bool:
+        return self.__compaction_size is not None and self.__log.size >= self.__compaction_size
+
+    def __compact_in_background(self):
+        # Writers arriving together may each start a compaction; those after the first find the log compacted.
+        with self.__compaction:
+            if self.__needs_compaction():
+                self.__compact()
 
     def add_user(self, user):
-        self.__users.append(user)
+        ticket = None
+        with self.__lock.writing():
+            # Like the scan it replaces, a lookup returns the first user added with a name.
+            if self.__users.setdefault(user.user_name, user) is user:
+                ticket = self.__log_change({'change': 'user', 'user_name': user.user_name, 'password': user.password})
+        self.__sync(ticket)
 
     def get_user(self, user_name):
-        return next((user for user in self.__users if user.user_name == user_name), None)
+        with self.__lock.reading():
+            return self.__users.get(user_name)
 
     def add_review(self, user_name: str, book: Book, review: Review):
-        user: User = self.get_user(user_name)
-        if isinstance(user, User):
-            user.add_review(review)
-        book.add_review(review)
+        with self.__lock.writing():
+            user: User = self.get_user(user_name)
+            if isinstance(user, User):
+                user.add_review(review)
+            book.add_review(review)
+            self.__search_cache.bump()
+            ticket = self.__log_change({'change': 'review', 'user_name': user_name, 'book_id': book.book_id,
+                                        'book_title': review.book_title, 'review_text': review.review_text,
+                                        'rating': review.rating, 'review_id': review.review_id,
+                                        'timestamp': review.timestamp.strftime(TIMESTAMP_FORMAT)})
+        self.__sync(ticket)
 
     @property
     def data_path(self):
         return self.__data_path
 
-    @property
-    def indexes(self):
-        return self.__indexes
+    def add_to_reading_list(self, user_name: str, book: Book):
+        ticket = None
+        with self.__lock.writing():
+            user: User = self.get_user(user_name)
+            if isinstance(user, User):
+                user.add_to_reading_list(book)
+                ticket = self.__log_change({'change': 'add_to_reading_list', 'user_name': user_name,
+                                            'book_id': book.book_id})
+        self.__sync(ticket)
+
+    def remove_from_reading_list(self, user_name: str, book: Book):
+        ticket = None
+        with self.__lock.writing():
+            user: User = self.get_user(user_name)
+            if isinstance(user, User):
+                user.remove_from_reading_list(book)
+                ticket = self.__log_change({'change': 'remove_from_reading_list', 'user_name': user_name,
+                                            'book_id': book.book_id})
+        self.__sync(ticket)
 
     @property
     def users(self):
-        return self.__users
+        with self.__lock.reading():
+            return list(self.__users.values())
 
     @property
     def dataset_of_books(self) -> List[Book]:
@@ -48,17 +245,99 @@ class BooksJSONReader(AbstractRepository):
     def books_inventory(self) -> BooksInventory:
         return self.__books_inventory
 
+    @property
+    def search_cache(self) -> SearchCache:
+        return self.__search_cache
+
+    @property
+    def search_indexes(self) -> dict:
+        return self.__search_indexes
+
     def add_book(self, book: Book):
-        self.__dataset_of_books.append(book)
+        with self.__lock.writing():
+            self.__dataset_of_books.append(book)
+            # Like the scan it replaces, a lookup returns the first book added with an id.
+            self.__books_by_id.setdefault(book.book_id, book)
+            for order in self.__orders.values():
+                order.add(book)
+            self.__index_search_terms(book)
+            self.__search_cache.bump()
+
+    def __index_search_terms(self, book: Book):
+        for page, terms in SEARCH_TERMS.items():
+            for term in terms(book):
+                self.__search_indexes[page].add(term, book)
+
+    def __count_stale_search_entries(self, book: Book):
+        # Called when the entries of book are about to become stale. Once they outnumber the books, the indexes are
+        # built again from the current terms, which costs about as much as the updates that made them stale.
+        self.__stale_search_entries += sum(len(terms(book)) for terms in SEARCH_TERMS.values())
+        if self.__stale_search_entries > STALE_SEARCH_ENTRIES_RATIO * len(self.__dataset_of_books):
+            self.__search_indexes = {page: TrigramIndex() for page in SEARCH_TERMS}
+            for other in self.__dataset_of_books:
+                self.__index_search_terms(other)
+            self.__stale_search_entries = 0
+
+    def update_book(self, book: Book):
+        with self.__lock.writing():
+            # Books are held by reference, so the changes are already visible, but they may move the book in the orders.
+            for order in self.__orders.values():
+                order.resort()
+            # Searches check the current terms of the books found, so the terms the book had before can stay indexed
+            # until the indexes are built again.
+            self.__index_search_terms(book)
+            self.__count_stale_search_entries(book)
+            self.__search_cache.bump()
+
+    def remove_book(self, book: Book):
+        with self.__lock.writing():
+            self.__dataset_of_books.remove(book)
+            for order in self.__orders.values():
+                order.remove(book)
+            for page, terms in SEARCH_TERMS.items():
+                for term in terms(book):
+                    self.__search_indexes[page].remove(term, book)
+            self.__count_stale_search_entries(book)
+            if self.__books_by_id.get(book.book_id) is book:
+                del self.__books_by_id[book.book_id]
+                duplicate = next((other for other in self.__dataset_of_books if other.book_id == book.book_id), None)
+                if duplicate is not None:
+                    self.__books_by_id[book.book_id] = duplicate
+            self.__search_cache.bump()
+            self.remove_from_inventory(book)
+            for user in self.__users.values():
+                user.remove_from_reading_list(book)
+                for review in book.reviews:
+                    if review in user.reviews:
+                        user.reviews.remove(review)
+
+    def add_to_inventory(self, book: Book, price: int, stock: int):
+        with self.__lock.writing():
+            self.__books_inventory.add_book(book, price, stock)
+            book.price = price
+            book.stock = stock
+            self.__search_cache.bump()
+
+    def remove_from_inventory(self, book: Book):
+        with self.__lock.writing():
+            if self.__books_inventory.find_book(book.book_id) is not None:
+                self.__books_inventory.remove_book(book.book_id)
+            book.price = DEFAULT_PRICE
+            book.stock = DEFAULT_STOCK
+            self.__search_cache.bump()
 
     def get_number_of_books(self) -> int:
-        return len(self.__dataset_of_books)
+        with self.__lock.reading():
+            return len(self.__dataset_of_books)
 
     def get_book_by_id(self, book_id) -> Book:
-        for book in self.__dataset_of_books:
-            if book.book_id == book_id:
-                return book
-        return None
+        with self.__lock.reading():
+            return self.__books_by_id.get(book_id)
+
+    def get_books_by_ids(self, id_list) -> List[Book]:
+        with self.__lock.reading():
+            books = (self.__books_by_id.get(book_id) for book_id in dict.fromkeys(id_list))
+            return [book for book in books if book is not None]
 
     def get_title(self, book: Book) -> str:
         return book.title
@@ -74,51 +353,93 @@ class BooksJSONReader(AbstractRepository):
             return math.inf
         return book.release_year
 
-    def get_page_by_index(self, page, text: str = None):
-        if text is None:
-            books = self.dataset_of_books
-        elif text.strip() == "":
-            text = None
-            books = self.dataset_of_books
-        else:
-            text = text.lower().strip()
-            self.__indexes[page] = 0
-
-        if page == "home":
-            if text is not None:
-                books = [b for b in self.dataset_of_books if text in b.title.lower()]
-            books.sort(key=self.get_title)
-        elif page == "publishers":
-            if text is not None:
-                books = [b for b in self.dataset_of_books if text in b.publisher.name.lower()]
-            books.sort(key=self.get_publisher)
-        elif page == "authors":
-            if text is not None:
-                books = []
-                for b in self.dataset_of_books:
-                    for a in b.authors:
-                        if text in a.full_name.lower():
-                            books.append(b)
-                            break
-            books.sort(key=self.get_first_author)
-        elif page == "books_by_date":
-            if text is not None:
-                books = [b for b in self.dataset_of_books if text in str(b.release_year)]
-            books.sort(key=self.get_date)
-        return books[self.__indexes[page]: self.__indexes[page] + BOOKS_PER_PAGE]
-
-    def get_highest_index(self) -> int:
-        return (math.ceil(len(self.dataset_of_books) / BOOKS_PER_PAGE) - 1) * BOOKS_PER_PAGE
-
-    def first(self, page):
-        self.__indexes[page] = 0
-
-    def last(self, page):
-        self.__indexes[page] = self.get_highest_index()
-
-    def previous(self, page):
-        self.__indexes[page] = max(0, self.__indexes[page] - BOOKS_PER_PAGE)
-
-    def next(self, page):
-        self.__indexes[page] = min(self.__indexes[page] + 12, self.get_highest_index())
+    def get_page(self, page, text: str = None, after: tuple = None, before: tuple = None,
+                 last: bool = False) -> BookPage:
+        with self.__lock.reading():
+            if text is None or text.strip() == "":
+                keys, books = self.__orders[page].entries()
+                start, end = page_bounds(keys, after, before, last)
+                return keyed_page(keys, books[start:end], start, end)
+
+            # The cache holds the sort keys of the books found, which end with the book id.
+            keys = self.__search_cache.get(page, text)
+            if keys is None:
+                generation = self.__search_cache.generation
+                key = self.__orders[page].key
+                keys = [key(book) for book in self.__search(page, text.lower().strip())]
+                self.__search_cache.put(page, text, keys, generation)
+            start, end = page_bounds(keys, after, before, last)
+            return keyed_page(keys, [self.__books_by_id[key[-1]] for key in keys[start:end]], start, end, len(keys))
+
+    def __search(self, page, text: str) -> List[Book]:
+        # Returns all the books found by the search for text in page, in the order of the page.
+        if page in SEARCH_TERMS:
+            return self.__orders[page].select(self.search_books(page, text))
+        year_range = parse_year_range(text)
+        if year_range is None:
+            return [b for b in self.__orders[page].books if text in str(b.release_year)]
+        # Books of an unknown year are sorted last with an infinite year, so no range includes them.
+        low, high = year_range
+        return self.__orders[page].between((-math.inf if low is None else low,),
+                                           (math.inf if high is None else high + 1,))
+
+    def search_books(self, page, text: str) -> List[Book]:
+        """ Returns the books with a term searched by page containing text, in no particular order. """
+        with self.__lock.reading():
+            text = text.lower()
+            terms = SEARCH_TERMS[page]
+            return [book for book in self.__search_indexes[page].search(text)
+                    if any(text in term.lower() for term in terms(book))]
+
+    def dump_snapshot(self, path, data_path: Path):
+        """ Writes the repository to a binary snapshot, recording the data path it was populated from. """
+        with self.__lock.reading():
+            temporary_path = f'{path}.tmp'
+            with open(temporary_path, 'wb') as snapshot_file:
+                snapshot_file.write(SNAPSHOT_MAGIC + SNAPSHOT_VERSION.to_bytes(2, 'big'))
+                pickle.dump((str(Path(data_path).resolve()), self), snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+                # The log may be emptied once the snapshot is written, so it has to be on disk first.
+                snapshot_file.flush()
+                os.fsync(snapshot_file.fileno())
+            # Replace the previous snapshot in one step, so a crash never leaves a truncated snapshot behind.
+            os.replace(temporary_path, path)
+
+    def __getstate__(self):
+        # The log and the compaction lock belong to the running process; a loaded snapshot is attached to a log anew.
+        state = self.__dict__.copy()
+        state['_BooksJSONReader__log'] = None
+        del state['_BooksJSONReader__compaction']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__compaction = threading.Lock()
+
+    @staticmethod
+    def load_snapshot(path, data_path: Path, data_files):
+        """ Returns the repository stored in the snapshot at path.
 
+        Returns None if there is no snapshot, it was written by another snapshot version, it was populated from
+        another data path, or any of the data files is newer than the snapshot.
+        """
+        try:
+            snapshot_time = os.path.getmtime(path)
+            if any(os.path.getmtime(resolve_data_file(data_path, filename)) >= snapshot_time for filename in data_files):
+                return None
+            with open(path, 'rb') as snapshot_file:
+                header = snapshot_file.read(len(SNAPSHOT_MAGIC) + 2)
+                if header != SNAPSHOT_MAGIC + SNAPSHOT_VERSION.to_bytes(2, 'big'):
+                    return None
+                # Unpickling creates many objects but no garbage, so cyclic collections during the load are wasted.
+                gc_was_enabled = gc.isenabled()
+                gc.disable()
+                try:
+                    snapshot_data_path, repository = pickle.load(snapshot_file)
+                finally:
+                    if gc_was_enabled:
+                        gc.enable()
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        if snapshot_data_path != str(Path(data_path).resolve()):
+            return None
+        return repository
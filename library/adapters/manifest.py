@@ -0,0 +1,113 @@
+import hashlib
+import json
+from pathlib import Path
+
+from library.adapters.compression import open_data_file, resolve_data_file
+
+MANIFEST_VERSION = 1
+
+# Size of the blocks read while hashing a data file.
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_hash(filename) -> str:
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as data_file:
+        for block in iter(lambda: data_file.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def record_hashes(filename, key_field: str, previous: dict = None):
+    """ Hashes every record of a JSON-lines file, keyed by the value of key_field in the record.
+
+    Returns the hashes and the parsed records whose hash is not among the previous hashes. Lines that did not change
+    since then are not parsed, their key is taken from the previous hashes.
+    """
+    known_keys = {} if previous is None else {hash_value: key for key, hash_value in previous.items()}
+    hashes = {}
+    new_records = {}
+    with open_data_file(filename) as jsonfile:
+        for line in jsonfile:
+            line = line.strip()
+            if line != "":
+                hash_value = hashlib.sha1(line.encode('UTF-8')).hexdigest()
+                key = known_keys.get(hash_value)
+                if key is None:
+                    record = json.loads(line)
+                    key = str(record[key_field])
+                    new_records[key] = record
+                hashes[key] = hash_value
+    return hashes, new_records
+
+
+class FileChanges:
+    """ The records inserted, updated and deleted in a data file since the manifest was written. """
+
+    def __init__(self, inserted, updated, deleted, records=None):
+        self.inserted = inserted
+        self.updated = updated
+        self.deleted = deleted
+        # key -> parsed record, for the inserted and updated keys
+        self.records = {} if records is None else records
+
+    def __repr__(self):
+        return f'<FileChanges inserted = {len(self.inserted)}, updated = {len(self.updated)}, ' \
+               f'deleted = {len(self.deleted)}>'
+
+
+class ImportManifest:
+    """ Records a content hash per data file, and per record for files listed with a key field, as of the last
+    population of a repository.
+    """
+
+    def __init__(self, files: dict = None):
+        # file name -> {'hash': file hash, 'records': {key: record hash} or None}
+        self.__files = {} if files is None else files
+
+    @property
+    def files(self) -> dict:
+        return self.__files
+
+    def file_hash(self, filename: str) -> str:
+        entry = self.__files.get(filename)
+        return None if entry is None else entry['hash']
+
+    def record_hashes(self, filename: str) -> dict:
+        entry = self.__files.get(filename)
+        return None if entry is None else entry['records']
+
+    def record(self, filename: str, hash_value: str, records: dict = None):
+        self.__files[filename] = {'hash': hash_value, 'records': records}
+
+    @classmethod
+    def build(cls, data_path: Path, data_files: dict):
+        """ Builds the manifest of the data files, given as a dict of file name to record key field (or None). """
+        manifest = cls()
+        for filename, key_field in data_files.items():
+            records = None if key_field is None else record_hashes(resolve_data_file(data_path, filename), key_field)[0]
+            manifest.record(filename, file_hash(resolve_data_file(data_path, filename)), records)
+        return manifest
+
+    @classmethod
+    def load(cls, path):
+        """ Returns the manifest stored at path, or None if there is none or it was written by another version. """
+        try:
+            with open(path, encoding='UTF-8') as manifest_file:
+                content = json.load(manifest_file)
+        except (OSError, ValueError):
+            return None
+        if content.get('version') != MANIFEST_VERSION:
+            return None
+        return cls(content['files'])
+
+    def save(self, path):
+        with open(path, 'w', encoding='UTF-8') as manifest_file:
+            manifest_file.write(json.dumps({'version': MANIFEST_VERSION, 'files': self.__files}))
+
+
+def diff_records(old: dict, new: dict, records: dict = None) -> FileChanges:
+    inserted = [key for key in new if key not in old]
+    updated = [key for key in new if key in old and old[key] != new[key]]
+    deleted = [key for key in old if key not in new]
+    return FileChanges(inserted, updated, deleted, records)
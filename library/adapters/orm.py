@@ -1,6 +1,6 @@
 from sqlalchemy import (
     Table, MetaData, Column, Integer, String, Date, DateTime,
-    ForeignKey, Boolean
+    ForeignKey, Boolean, Index, func, literal_column
 )
 from sqlalchemy.orm import mapper, relationship, synonym
 from sqlalchemy.sql.sqltypes import Float
@@ -30,15 +30,15 @@ authors_table = Table(
 authors_books_table = Table(
     'authors_books', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
-    Column('book_id', ForeignKey('books.book_id')),
+    Column('book_id', ForeignKey('books.book_id'), index=True),
     Column('author_id', ForeignKey('authors.unique_id'))
 )
 
+# Each publisher is stored once and shared by all of its books.
 publishers_table = Table(
     'publishers', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
-    Column('name', String(255), nullable=False),
-    Column('book_id', ForeignKey('books.book_id'))
+    Column('name', String(255), nullable=False, index=True)
 )
 
 reviews_table = Table(
@@ -60,10 +60,10 @@ reviews_table = Table(
 books_table = Table(
     'books', metadata,
     Column('book_id', Integer, primary_key=True),
-    Column('title', String(255), nullable=False),
+    Column('title', String(255), nullable=False, index=True),
     Column('description', String(1024)),
-    # Column('publisher_id', ForeignKey('publishers.id')),
-    Column('release_year', Integer),
+    Column('publisher_id', ForeignKey('publishers.id'), index=True),    # One publisher has many books.
+    Column('release_year', Integer, index=True),
     Column('ebook', Boolean),
     Column('num_pages', String(63)),
     Column('average_rating', Float),
@@ -71,8 +71,24 @@ books_table = Table(
     Column('price', Integer),
     Column('stock', Integer),
     Column('url', String(255)),
+    # The name of the first author, kept with the book so that the authors view is read in the order of an index.
+    Column('first_author_name', String(255), nullable=False, server_default=''),
 )
 
+# Books of an unknown year are ordered after all others, as if released in UNKNOWN_YEAR. The year is written into
+# the statements rather than bound, so that queries ordered by release_order match the index on it.
+UNKNOWN_YEAR = 9999
+release_order = func.coalesce(books_table.c.release_year, literal_column(str(UNKNOWN_YEAR)))
+Index('ix_books_release_order', release_order, books_table.c.book_id)
+
+# Books without authors, whose first_author_name is empty, are ordered after all others as in the memory repository:
+# as if their first author were named LAST_AUTHOR_NAME, the last character of Unicode. Like UNKNOWN_YEAR, the name is
+# written into the statements.
+LAST_AUTHOR_NAME = '\U0010ffff'
+author_order = func.coalesce(func.nullif(books_table.c.first_author_name, literal_column("''")),
+                             literal_column(f"'{LAST_AUTHOR_NAME}'"))
+Index('ix_books_author_order', author_order, books_table.c.book_id)
+
 reading_list_user_table = Table(
     'reading_list', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
@@ -80,6 +96,17 @@ reading_list_user_table = Table(
     Column('user_id', ForeignKey('users.id'))
 )
 
+# Trigram inverted index of the searched terms: book titles, author names and publisher names.
+# target_id is the book_id of a title, the unique_id of an author or the id of a publisher, depending on kind.
+search_trigrams_table = Table(
+    'search_trigrams', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('kind', String(15), nullable=False),
+    Column('trigram', String(3), nullable=False),
+    Column('target_id', Integer, nullable=False),
+    Index('ix_search_trigrams', 'kind', 'trigram', 'target_id')
+)
+
 def map_model_to_tables():
     # Mappers set up the relationship between the tables and instance variables in the domain model.
     # In a one-to-many relationship such as user and review, we only define the relationship in the mapper class which holds the singularity.
@@ -112,8 +139,9 @@ def map_model_to_tables():
         '_Book__title': books_table.c.title,
         '_Book__description': books_table.c.description,
         # '_Book__publisher': relationship(model.Publisher, backref='books', foreign_keys=books_table.c.book_id),
-        '_Book__publisher': relationship(model.Publisher, uselist=False),
-        '_Book__authors': relationship(model.Author, secondary=authors_books_table),
+        '_Book__publisher': relationship(model.Publisher),
+        '_Book__authors': relationship(model.Author, secondary=authors_books_table,
+                                       order_by=authors_books_table.c.id),
         '_Book__release_year': books_table.c.release_year,
         '_Book__ebook': books_table.c.ebook,
         '_Book__num_pages': books_table.c.num_pages,
@@ -122,6 +150,7 @@ def map_model_to_tables():
         '_Book__url': books_table.c.url,
         '_Book__price': books_table.c.price,
         '_Book__stock': books_table.c.stock,
+        '_Book__first_author_name': books_table.c.first_author_name,
         # '_Book__reviews': relationship(model.Review, backref='_Review_book'),    # There was no _Review__book instance variable in books so I made it _Review__book_title. Perhaps this will work.
         '_Book__reviews': relationship(model.Review, backref='_Review__book'),
     })
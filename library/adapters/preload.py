@@ -0,0 +1,67 @@
+import gc
+import os
+
+from library.adapters.repository import AbstractRepository, VIEWS
+
+# Fields of /proc/<pid>/smaps_rollup counting the memory mapped by a process alone.
+UNIQUE_MEMORY_FIELDS = ("Private_Clean:", "Private_Dirty:")
+
+# Whether processes forked from this one enable the garbage collector, which collect_in_workers_only arranges once.
+_enabled_after_fork = False
+
+# The process that disabled the garbage collector to build the repository.
+_building_pid = None
+
+
+def collect_in_workers_only():
+    """ Disables the cyclic garbage collector in the master process of a pre-forking server, and enables it again in
+    every process forked from it.
+
+    As the documentation of gc.freeze advises, the master does not collect while it builds the repository: collections
+    would free objects among the ones kept, leaving holes that later allocations of each worker fill, which copies the
+    pages around them.
+    """
+    global _enabled_after_fork, _building_pid
+    gc.disable()
+    _building_pid = os.getpid()
+    if not _enabled_after_fork:
+        os.register_at_fork(after_in_child=gc.enable)
+        _enabled_after_fork = True
+
+
+def collect_if_not_forked():
+    """ Enables the cyclic garbage collector again if the process that built the repository serves requests itself.
+
+    That is the case when no workers are forked, as under flask run or python wsgi.py; call it before the first
+    request. Workers forked from the master were enabled when they were forked.
+    """
+    if os.getpid() == _building_pid:
+        gc.enable()
+
+
+def prepare_for_fork(repository: AbstractRepository):
+    """ Readies a repository built by the master process of a pre-forking server to be shared by its workers; call it
+    right before the workers are forked.
+
+    Pages of memory stay shared between the master and a worker until either writes to them. The orders of the views
+    are sorted here once, rather than into a private copy in every worker, and every object is moved into the
+    permanent generation of the garbage collector: the collections of a worker then leave the headers of the objects
+    alone, instead of writing to every one of them and so copying the whole repository into the worker.
+    """
+    for view in VIEWS:
+        repository.get_page(view)
+    gc.freeze()
+
+
+def unique_memory(pid="self"):
+    """ Returns the number of bytes of memory mapped by process pid alone, its unique set size, or None where
+    /proc/<pid>/smaps_rollup cannot be read.
+
+    Memory shared with the master process of a pre-forking server is not counted, so the unique memory of a worker
+    is what it adds to the memory of the server.
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as smaps:
+            return sum(int(line.split()[1]) * 1024 for line in smaps if line.startswith(UNIQUE_MEMORY_FIELDS))
+    except OSError:
+        return None
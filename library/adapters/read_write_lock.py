@@ -0,0 +1,68 @@
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """ Lets any number of threads read at once, while a thread writing has the lock to itself.
+
+    Writers waiting for the lock go before new readers, so a steady stream of page requests cannot hold up a write
+    forever. A thread may take the lock again while it holds it, for reading or, if it is writing, for writing; a
+    thread reading cannot start writing, as two readers doing so would wait for each other.
+    """
+
+    def __init__(self):
+        self.__condition = threading.Condition(threading.Lock())
+        self.__readers = 0
+        self.__waiting_writers = 0
+        self.__writer = None
+        # Number of times the current thread holds the lock for reading.
+        self.__local = threading.local()
+
+    @contextmanager
+    def reading(self):
+        if self.__writer == threading.get_ident():
+            # The writing thread reads what it wrote.
+            yield
+            return
+        depth = getattr(self.__local, 'depth', 0)
+        with self.__condition:
+            if depth == 0:
+                while self.__writer is not None or self.__waiting_writers:
+                    self.__condition.wait()
+            self.__readers += 1
+        self.__local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self.__local.depth = depth
+            with self.__condition:
+                self.__readers -= 1
+                if self.__readers == 0:
+                    self.__condition.notify_all()
+
+    @contextmanager
+    def writing(self):
+        thread = threading.get_ident()
+        if self.__writer == thread:
+            yield
+            return
+        if getattr(self.__local, 'depth', 0):
+            raise RuntimeError("A thread reading cannot take the lock for writing")
+        with self.__condition:
+            self.__waiting_writers += 1
+            try:
+                while self.__writer is not None or self.__readers:
+                    self.__condition.wait()
+            finally:
+                self.__waiting_writers -= 1
+            self.__writer = thread
+        try:
+            yield
+        finally:
+            with self.__condition:
+                self.__writer = None
+                self.__condition.notify_all()
+
+    def __reduce__(self):
+        # A copied or unpickled lock starts out free, like a new one.
+        return ReadWriteLock, ()
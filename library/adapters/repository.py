@@ -1,5 +1,10 @@
 import abc
-from typing import List
+import base64
+import binascii
+import json
+import re
+from bisect import bisect_left, bisect_right
+from typing import List, Optional, Tuple
 from datetime import date
 
 from library.domain.model import BooksInventory, Publisher, Author, Book, Review, User
@@ -9,6 +14,104 @@ repo_instance = None
 
 BOOKS_PER_PAGE = 12
 
+# The views listing the books, each in its own order.
+VIEWS = ("home", "books_by_date", "authors", "publishers")
+
+# The integers a cursor may hold, those SQLite can store.
+CURSOR_INTEGERS = range(-2 ** 63, 2 ** 63)
+
+YEAR_RANGE = re.compile(r'^(\d{1,4})\s*(?:-|\.\.)\s*(\d{1,4})$')
+YEAR_BOUND = re.compile(r'^(>=|<=|>|<)\s*(\d{1,4})$')
+
+
+def parse_year_range(text: str) -> Optional[Tuple[Optional[int], Optional[int]]]:
+    """ Parses a books_by_date search for a range of years, such as "1990-1999", "1990..1999" or ">=2010".
+
+    Returns the first and last year of the range, either of which is None if the range is open on that side, or
+    None if text is not a range.
+    """
+    text = text.strip()
+    match = YEAR_RANGE.match(text)
+    if match:
+        return int(match.group(1)), int(match.group(2))
+    match = YEAR_BOUND.match(text)
+    if match:
+        operator, year = match.group(1), int(match.group(2))
+        return {'>=': (year, None), '>': (year + 1, None), '<=': (None, year), '<': (None, year - 1)}[operator]
+    return None
+
+
+def encode_cursor(key: tuple) -> str:
+    """ Encodes the sort key of a book for a page URL. """
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode('UTF-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Optional[tuple]:
+    """ Decodes a cursor made by encode_cursor, returning None if cursor is missing or malformed. """
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, binascii.Error, UnicodeError):
+        return None
+    if not isinstance(key, list) or not all(is_cursor_value(value) for value in key):
+        return None
+    return tuple(key)
+
+
+def is_cursor_value(value) -> bool:
+    # bool is a subclass of int, but no sort key holds one.
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return value in CURSOR_INTEGERS
+    return isinstance(value, (str, float))
+
+
+class BookPage:
+    """ A page of books in the order of a view, with the cursors leading to the pages before and after it.
+
+    previous_cursor is the sort key of the first book and next_cursor that of the last book; each is None if there
+    are no books before or after the page. total is the number of books found by a search, or None for the pages of
+    a whole view.
+    """
+
+    def __init__(self, books: List[Book], previous_cursor: tuple = None, next_cursor: tuple = None,
+                 total: int = None):
+        self.books = books
+        self.previous_cursor = previous_cursor
+        self.next_cursor = next_cursor
+        self.total = total
+
+
+def page_bounds(keys, after: tuple = None, before: tuple = None, last: bool = False,
+                size: int = BOOKS_PER_PAGE) -> Tuple[int, int]:
+    """ Returns the start and end positions in the sorted keys of the page after or before a cursor.
+
+    Without a cursor the page is the first one, or the last one if last is set.
+    """
+    try:
+        if after is not None:
+            start = bisect_right(keys, after)
+            return start, min(start + size, len(keys))
+        if before is not None:
+            end = bisect_left(keys, before)
+            return max(0, end - size), end
+    except TypeError:
+        # A cursor of another view, whose keys cannot be compared with these.
+        pass
+    if last:
+        return max(0, len(keys) - size), len(keys)
+    return 0, min(size, len(keys))
+
+
+def keyed_page(keys, books: List[Book], start: int, end: int, total: int = None) -> BookPage:
+    """ Returns the page of books between start and end, the books being those of the sorted keys in that range. """
+    return BookPage(books,
+                    tuple(keys[start]) if start > 0 and start < end else None,
+                    tuple(keys[end - 1]) if end < len(keys) and start < end else None,
+                    total)
+
 
 class RepositoryException(Exception):
 
@@ -81,35 +184,39 @@ class AbstractRepository(abc.ABC):
         raise NotImplementedError
 
     @abc.abstractmethod
-    def get_page_by_index(self, page, text: str = None):
-        """ Returns page of a book depending on the given index.
+    def get_page(self, page, text: str = None, after: tuple = None, before: tuple = None,
+                 last: bool = False) -> BookPage:
+        """ Returns a page of the books of a view, or of those found by searching it for text.
+
+        The page holds the books following the sort key after, or preceding the sort key before. Without either it
+        is the first page of the view, or the last one if last is set.
         """
         raise NotImplementedError
 
-    @abc.abstractmethod
-    def get_highest_index(self) -> int:
-        """ Returns the highest possible page index given the number of books.
-        """
+    def add_book(self, book: Book):
+        """ Adds an Book to the repository. """
         raise NotImplementedError
 
     @abc.abstractmethod
-    def first(self, page):
-        """ Returns first page of book. """
+    def update_book(self, book: Book):
+        """ Stores the changes made to a Book that is already in the repository. """
         raise NotImplementedError
 
     @abc.abstractmethod
-    def last(self, page):
-        """ Returns last page of book. """
+    def remove_book(self, book: Book):
+        """ Removes a Book from the repository, together with its inventory record, its reviews and its reading list
+        entries.
+        """
         raise NotImplementedError
 
     @abc.abstractmethod
-    def previous(self, page):
-        """ Returns previous page of book.
-        """
+    def add_to_inventory(self, book: Book, price: int, stock: int):
+        """ Records the price and stock of a Book in the repository's inventory. """
         raise NotImplementedError
-        
-    def add_book(self, book: Book):
-        """ Adds an Book to the repository. """
+
+    @abc.abstractmethod
+    def remove_from_inventory(self, book: Book):
+        """ Removes the inventory record of a Book, restoring its default price and stock. """
         raise NotImplementedError
 
     @abc.abstractmethod
@@ -120,6 +227,14 @@ class AbstractRepository(abc.ABC):
         """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_books_by_ids(self, id_list) -> List[Book]:
+        """ Returns the Books whose ids are in id_list, looking them all up at once.
+
+        Ids with no matching Book are skipped, so the returned list can be shorter than id_list.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_number_of_books(self) -> int:
         """ Returns the number of Books in the repository. """
@@ -137,6 +252,16 @@ class AbstractRepository(abc.ABC):
         if review.book is None or review not in review.book.reviews:
             raise RepositoryException('Review not correctly attached to an Book')
 
+    @abc.abstractmethod
+    def add_to_reading_list(self, user_name: str, book: Book):
+        """ Adds book to the reading list of the User named user_name, if there is such a User. """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def remove_from_reading_list(self, user_name: str, book: Book):
+        """ Removes book from the reading list of the User named user_name, if there is such a User. """
+        raise NotImplementedError
+
 
 
     # @abc.abstractmethod
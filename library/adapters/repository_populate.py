@@ -1,13 +1,157 @@
+import time
 from pathlib import Path
 
-from library.adapters.csv_data_importer import load_authors_and_books, load_inventory, load_reviews, load_users
+from library.adapters.csv_data_importer import load_authors_and_books, load_authors_and_books_parallel, \
+    load_inventory, load_reviews, load_users, load_book_changes, load_inventory_changes, BATCH_SIZE
+from library.adapters.compression import resolve_data_file
+from library.adapters.manifest import ImportManifest, file_hash, record_hashes, diff_records
 
-def populate(data_path: Path, repo, database_mode: bool):
+BOOKS_FILENAME = "comic_books_excerpt.json"
+AUTHORS_FILENAME = "book_authors_excerpt.json"
+INVENTORY_FILENAME = "book_inventory.json"
+USERS_FILENAME = "users.json"
+REVIEWS_FILENAME = "book_reviews.csv"
+
+# The data files tracked by the import manifest, with the field keying their records. Changes to the files with a
+# key field are applied record by record; any change to the other files requires a full population.
+DATA_FILES = {
+    BOOKS_FILENAME: 'book_id',
+    AUTHORS_FILENAME: None,
+    INVENTORY_FILENAME: 'book_id',
+    USERS_FILENAME: None,
+    REVIEWS_FILENAME: None
+}
+
+# Progress of the population of the application's repository, set by create_app.
+population_status = None
+
+
+class PopulationStatus:
+    """ Tracks how far the population of a repository has got, for the readiness endpoint. """
+
+    STAGES = ("books", "inventory", "users", "reviews")
+
+    def __init__(self):
+        self.__started = time.time()
+        self.__stage = None
+        self.__completed_stages = 0
+        self.__ready = False
+        self.__error = None
+
+    @property
+    def ready(self) -> bool:
+        return self.__ready
+
+    @property
+    def error(self) -> str:
+        return self.__error
+
+    def start_stage(self, stage: str):
+        self.__stage = stage
+
+    def finish_stage(self):
+        self.__completed_stages += 1
+
+    def finish(self):
+        self.__stage = None
+        self.__ready = True
+
+    def fail(self, error: Exception):
+        self.__error = f'{type(error).__name__}: {error}'
+
+    def run(self, load):
+        """ Runs the function loading the repository and records its outcome; used as a background thread target. """
+        try:
+            load()
+            self.finish()
+        except Exception as error:
+            self.fail(error)
+            print("POPULATION FAILED", self.__error)
+
+    def to_dict(self) -> dict:
+        return {
+            'ready': self.__ready,
+            'stage': self.__stage,
+            'progress': 1.0 if self.__ready else self.__completed_stages / len(self.STAGES),
+            'elapsed_seconds': round(time.time() - self.__started, 3),
+            'error': self.__error
+        }
+
+
+def populate(data_path: Path, repo, database_mode: bool, batch_size: int = BATCH_SIZE, workers: int = 1,
+             manifest_path=None, status: PopulationStatus = None):
+    if database_mode:
+        # Write the rows in batched transactions rather than through one session commit per object.
+        target = repo.bulk_populator(batch_size)
+        load_data(data_path, target, batch_size, workers, status)
+        target.flush()
+    else:
+        load_data(data_path, repo, batch_size, workers, status)
+
+    if manifest_path is not None:
+        ImportManifest.build(data_path, DATA_FILES).save(manifest_path)
+
+
+def populate_changes(data_path: Path, repo, manifest_path) -> bool:
+    """ Applies the changes made to the data files since the manifest at manifest_path was written.
+
+    Returns False, without changing the repository, if there is no manifest or a file changed that can only be
+    loaded by a full population.
+    """
+    manifest = ImportManifest.load(manifest_path)
+    if manifest is None:
+        return False
+
+    new_manifest = ImportManifest(dict(manifest.files))
+    changes = {}
+    for filename, key_field in DATA_FILES.items():
+        hash_value = file_hash(resolve_data_file(data_path, filename))
+        if hash_value == manifest.file_hash(filename):
+            continue
+        if key_field is None or manifest.record_hashes(filename) is None:
+            return False
+        previous = manifest.record_hashes(filename)
+        records, new_records = record_hashes(resolve_data_file(data_path, filename), key_field, previous)
+        changes[filename] = diff_records(previous, records, new_records)
+        new_manifest.record(filename, hash_value, records)
+
+    if not changes:
+        return True
+
+    print("loading changes", changes)
+    inserted_books = []
+    if BOOKS_FILENAME in changes:
+        load_book_changes(repo, data_path, AUTHORS_FILENAME, changes[BOOKS_FILENAME])
+        inserted_books = changes[BOOKS_FILENAME].inserted
+    if INVENTORY_FILENAME in changes or inserted_books:
+        inventory_changes = changes.get(INVENTORY_FILENAME, diff_records({}, {}))
+        load_inventory_changes(repo, data_path, INVENTORY_FILENAME, inventory_changes, inserted_books)
+
+    new_manifest.save(manifest_path)
+    return True
+
+
+def load_data(data_path: Path, repo, batch_size: int = BATCH_SIZE, workers: int = 1,
+              status: PopulationStatus = None):
+    if status is None:
+        status = PopulationStatus()
     print("loading authors")
-    load_authors_and_books(repo, data_path, "comic_books_excerpt.json", "book_authors_excerpt.json")
+    status.start_stage("books")
+    if workers > 1:
+        # Opt-in: parse the books file in a pool of worker processes.
+        load_authors_and_books_parallel(repo, data_path, BOOKS_FILENAME, AUTHORS_FILENAME, workers, batch_size)
+    else:
+        load_authors_and_books(repo, data_path, BOOKS_FILENAME, AUTHORS_FILENAME, batch_size)
+    status.finish_stage()
     print("loading inventory")
-    load_inventory(repo, data_path, "book_inventory.json")
+    status.start_stage("inventory")
+    load_inventory(repo, data_path, INVENTORY_FILENAME, batch_size)
+    status.finish_stage()
     print("loading users")
-    load_users(repo, data_path, "users.json")
+    status.start_stage("users")
+    load_users(repo, data_path, USERS_FILENAME, batch_size)
+    status.finish_stage()
     print("loading reviews")
-    load_reviews(repo, data_path, "book_reviews.csv")
+    status.start_stage("reviews")
+    load_reviews(repo, data_path, REVIEWS_FILENAME, batch_size)
+    status.finish_stage()
@@ -0,0 +1,71 @@
+import threading
+from collections import OrderedDict
+
+# Number of searches whose results are kept.
+SEARCH_CACHE_SIZE = 256
+
+
+def normalise_search(text: str) -> str:
+    # The same normalisation as the searches, so texts sharing a cache entry always find the same books.
+    return text.lower().strip()
+
+
+class SearchCache:
+    """ Least recently used cache of the ordered book ids found by searches, keyed by view and normalised text.
+
+    Every change to the repository bumps its generation. Results cached in an earlier generation are misses, so a
+    search never returns books from before a change.
+    """
+
+    def __init__(self, capacity: int = SEARCH_CACHE_SIZE):
+        self.__capacity = capacity
+        self.__lock = threading.Lock()
+        self.__entries = OrderedDict()
+        self.__generation = 0
+        self.__hits = 0
+        self.__misses = 0
+
+    @property
+    def generation(self) -> int:
+        return self.__generation
+
+    def bump(self):
+        with self.__lock:
+            self.__generation += 1
+            self.__entries.clear()
+
+    def get(self, view: str, text: str):
+        """ Returns the cached book ids of the search for text in view, or None if they are not cached. """
+        key = (view, normalise_search(text))
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None or entry[0] != self.__generation:
+                self.__misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.__hits += 1
+            return entry[1]
+
+    def put(self, view: str, text: str, book_ids, generation: int):
+        """ Caches the book ids found by the search for text in view, which started in generation. """
+        with self.__lock:
+            if generation != self.__generation:
+                # The repository changed while the search ran.
+                return
+            key = (view, normalise_search(text))
+            self.__entries[key] = (generation, tuple(book_ids))
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__capacity:
+                self.__entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {'hits': self.__hits, 'misses': self.__misses, 'size': len(self.__entries),
+                    'capacity': self.__capacity, 'generation': self.__generation}
+
+    def __getstate__(self):
+        # Locks cannot be pickled, and cached results are cheap to compute again.
+        return {'capacity': self.__capacity}
+
+    def __setstate__(self, state):
+        self.__init__(state['capacity'])
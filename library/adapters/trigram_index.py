@@ -0,0 +1,81 @@
+from array import array
+
+# Substrings this long are indexed; shorter search texts are matched by scanning the indexed terms.
+TRIGRAM_LENGTH = 3
+
+
+def trigrams(text: str) -> set:
+    """ Returns the distinct lowercase substrings of TRIGRAM_LENGTH characters of text. """
+    text = text.lower()
+    return {text[start:start + TRIGRAM_LENGTH] for start in range(len(text) - TRIGRAM_LENGTH + 1)}
+
+
+class TrigramIndex:
+    """ Inverted index from the trigrams of terms, such as titles or names, to the items the terms belong to.
+
+    A search only verifies the terms sharing the rarest trigram of the search text, instead of every term. Each
+    distinct term is indexed once however many items it belongs to, e.g. the name of a publisher of many books.
+    """
+
+    def __init__(self):
+        # Lowercase terms by term id; None marks a term whose items have all been removed.
+        self.__terms = []
+        self.__items = []
+        self.__term_ids = {}
+        # Term ids by trigram, in increasing order.
+        self.__postings = {}
+        # Entries of items under their terms, plus the removed terms left in the postings.
+        self.__size = 0
+
+    def add(self, term: str, item):
+        term = term.lower()
+        term_id = self.__term_ids.get(term)
+        if term_id is None:
+            term_id = len(self.__terms)
+            self.__term_ids[term] = term_id
+            self.__terms.append(term)
+            self.__items.append([])
+            postings = self.__postings
+            for trigram in trigrams(term):
+                try:
+                    postings[trigram].append(term_id)
+                except KeyError:
+                    postings[trigram] = array('I', (term_id,))
+        self.__items[term_id].append(item)
+        self.__size += 1
+
+    def remove(self, term: str, item):
+        term = term.lower()
+        term_id = self.__term_ids.get(term)
+        if term_id is None:
+            return
+        items = self.__items[term_id]
+        self.__items[term_id] = [other for other in items if other is not item]
+        self.__size -= len(items) - len(self.__items[term_id])
+        if not self.__items[term_id]:
+            # The term stays in the postings, where it is skipped, until the index is built again.
+            del self.__term_ids[term]
+            self.__terms[term_id] = None
+            self.__size += 1
+
+    def __len__(self):
+        return self.__size
+
+    def search(self, text: str) -> list:
+        """ Returns the distinct items with a term containing text, ignoring case, in no particular order. """
+        text = text.lower()
+        if len(text) < TRIGRAM_LENGTH:
+            term_ids = range(len(self.__terms))
+        else:
+            postings = [self.__postings.get(trigram) for trigram in trigrams(text)]
+            if any(term_ids is None for term_ids in postings):
+                return []
+            term_ids = min(postings, key=len)
+        terms = self.__terms
+        items = {}
+        for term_id in term_ids:
+            term = terms[term_id]
+            if term is not None and text in term:
+                for item in self.__items[term_id]:
+                    items[id(item)] = item
+        return list(items.values())
@@ -0,0 +1,155 @@
+import fcntl
+import json
+import os
+import threading
+
+# Lock files of the logs opened by this process, by the path of the log. A log is written by one process only: each
+# process numbers the changes it logs, and compaction rewrites the log. The lock is kept until the process exits, so
+# that the process may open a log again while an earlier WriteAheadLog of it is still around.
+_locks = {}
+
+
+def lock_for_process(path):
+    """ Takes the lock of the log at path for this process, raising RuntimeError if another process holds it. """
+    path = os.path.realpath(path)
+    if path in _locks:
+        return
+    lock_file = open(f'{path}.lock', 'ab')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        raise RuntimeError(f"the log {path} is in use by another process")
+    _locks[path] = lock_file
+
+
+def complete_lines(path):
+    """ Yields the lines of a file of changes with their changes, up to any change cut short while it was being
+    written. A missing file holds no changes.
+    """
+    try:
+        log_file = open(path, 'rb')
+    except FileNotFoundError:
+        return
+    with log_file:
+        for line in log_file:
+            if not line.endswith(b'\n'):
+                return
+            try:
+                change = json.loads(line)
+            except ValueError:
+                return
+            yield line, change
+
+
+def encode(change: dict) -> bytes:
+    return json.dumps(change, separators=(',', ':')).encode() + b'\n'
+
+
+class WriteAheadLog:
+    """ Append-only log of the changes made to a repository, one JSON object per line.
+
+    write adds a change to the file and sync waits until it is on disk. Rather than every writer calling fsync in
+    turn, the first writer to wait syncs every change written so far while writers arriving meanwhile wait for the
+    next sync, so that writers arriving together share one fsync.
+
+    compact moves the changes into a second file, path with '.compacted' appended, dropping the changes that later
+    ones make redundant, and empties the log. The changes of both files are kept for good, so that they can be
+    replayed over any population of the repository.
+
+    Only the process that opened the log may write to it, and no other process may open it meanwhile.
+    """
+
+    def __init__(self, path):
+        lock_for_process(path)
+        self.__path = path
+        self.__pid = os.getpid()
+        self.__compacted_path = f'{path}.compacted'
+        self.__file = open(path, 'ab')
+        # Drop a change cut short by a crash, so that the changes written from now on follow the last complete one.
+        self.__file.truncate(sum(len(line) for line, _ in complete_lines(path)))
+        # Guards the file and the counters below; writers wait on it for their change to be synced.
+        self.__condition = threading.Condition()
+        # Number of changes written since the log was opened, and how many of those are known to be on disk.
+        self.__written = 0
+        self.__synced = 0
+        self.__syncing = False
+
+    @property
+    def path(self):
+        return self.__path
+
+    @property
+    def compacted_path(self):
+        return self.__compacted_path
+
+    @property
+    def size(self) -> int:
+        """ The size of the log in bytes. """
+        with self.__condition:
+            return self.__file.tell()
+
+    def write(self, change: dict) -> int:
+        """ Appends change to the log and returns the ticket to pass to sync. """
+        if os.getpid() != self.__pid:
+            # A forked worker would number its changes like the other workers and the master.
+            raise RuntimeError(f"the log {self.__path} was opened by another process")
+        line = encode(change)
+        with self.__condition:
+            self.__file.write(line)
+            # Hand the line to the operating system, so that a sync by another thread covers it.
+            self.__file.flush()
+            self.__written += 1
+            return self.__written
+
+    def sync(self, ticket: int):
+        """ Returns once the change written with ticket is on disk. """
+        with self.__condition:
+            while self.__synced < ticket and self.__syncing:
+                self.__condition.wait()
+            if self.__synced >= ticket:
+                return
+            # Lead the next sync, which covers the changes of the writers waiting for it.
+            self.__syncing = True
+            target = self.__written
+        synced = False
+        try:
+            os.fsync(self.__file.fileno())
+            synced = True
+        finally:
+            with self.__condition:
+                self.__syncing = False
+                if synced:
+                    self.__synced = max(self.__synced, target)
+                self.__condition.notify_all()
+
+    def changes(self):
+        """ Yields the compacted changes and then the changes in the log, oldest first. """
+        for path in (self.__compacted_path, self.__path):
+            for _, change in complete_lines(path):
+                yield change
+
+    def compact(self, fold):
+        """ Replaces the compacted changes with fold(changes), given all the changes oldest first, and empties the
+        log. fold returns the changes to keep, in the same order.
+        """
+        with self.__condition:
+            # Flush the log, so that the changes still waiting for a sync are read back.
+            self.__file.flush()
+            kept = fold(list(self.changes()))
+            temporary_path = f'{self.__compacted_path}.tmp'
+            with open(temporary_path, 'wb') as compacted_file:
+                compacted_file.writelines(encode(change) for change in kept)
+                compacted_file.flush()
+                os.fsync(compacted_file.fileno())
+            # Replace the compacted changes in one step, and only then empty the log: a crash in between leaves the
+            # changes in both files, and the repository skips the changes it replayed already.
+            os.replace(temporary_path, self.__compacted_path)
+            self.__file.truncate(0)
+            os.fsync(self.__file.fileno())
+            # The changes written so far are in the compacted file, so no writer needs to sync the log for them.
+            self.__synced = self.__written
+
+    def close(self):
+        with self.__condition:
+            self.__file.close()
@@ -1,6 +1,6 @@
 from wtforms.fields.core import IntegerField
 from library.domain.model import Book, Review, User
-from flask import Blueprint, render_template, redirect, url_for, session, request
+from flask import Blueprint, render_template, redirect, url_for, session, request, jsonify
 from functools import wraps
 from library.authentication import services
 from library.authentication.authentication import RegistrationForm
@@ -12,63 +12,75 @@ from wtforms import TextAreaField, HiddenField, SubmitField
 from wtforms.validators import DataRequired, Length, NumberRange, ValidationError
 
 import library.adapters.jsondatareader as repo
+from library.adapters import repository_populate
+from library.adapters.preload import unique_memory
+from library.adapters.repository import encode_cursor, decode_cursor
 
 books_blueprint = Blueprint(
     'books_bp', __name__
 )
 
-def is_left_button_inactive(function):
-    if repo.book_dataset.indexes[function] == 0:
-        return "disabled"
-    return ""
+# Seconds a client is asked to wait before retrying while the repository is still being populated.
+RETRY_AFTER = 5
+
+@books_blueprint.before_request
+def require_populated_repository():
+    status = repository_populate.population_status
+    if status is None or status.ready or request.endpoint in ("books_bp.ready", "books_bp.logout"):
+        return None
+    return "The book catalogue is still loading, please try again shortly.", 503, {"Retry-After": str(RETRY_AFTER)}
+
+@books_blueprint.route('/ready')
+def ready():
+    status = repository_populate.population_status
+    body = {'ready': True} if status is None else status.to_dict()
+    if body['ready']:
+        body['search_cache'] = repo.book_dataset.search_cache.stats()
+        # Each worker of a pre-forking server answers with the memory it does not share with the others.
+        body['unique_memory'] = unique_memory()
+    return jsonify(body), 200 if body['ready'] else 503
 
-def is_right_button_inactive(function):
-    if repo.book_dataset.indexes[function] == repo.book_dataset.get_highest_index():
-        return "disabled"
-    return ""
-    
 class TextSearchForm(FlaskForm):
     text = TextAreaField("Text to find")
     submit = SubmitField("Find")
 
-@books_blueprint.route('/', methods=['GET', 'POST'])
-def home():
+def browse(function, title):
+    """ Renders a page of the books of a view, the page and any search being carried in the URL.
+
+    The query string holds the search text q and the cursor of the page: after or before the sort key of a book, or
+    last for the last page. Every request names its own page, so users browsing at the same time never interfere.
+    """
     form = TextSearchForm()
-    search_text = None
+    search_text = request.args.get('q')
+    after = decode_cursor(request.args.get('after'))
+    before = decode_cursor(request.args.get('before'))
+    last = request.args.get('last') is not None
 
     if form.validate_on_submit():
         search_text = form.text.data
+        after, before, last = None, None, False
+    if search_text is not None and search_text.strip() == "":
+        search_text = None
 
+    page = repo.book_dataset.get_page(function, search_text, after, before, last)
     return render_template(
         'home/home.html',
-        title = "title",
-        books = repo.book_dataset.get_page_by_index("home", search_text),
+        title = title,
+        books = page.books,
         inventory = repo.book_dataset.books_inventory,
-        function = "home",
+        function = function,
         form = form,
-        left_inactive = is_left_button_inactive("home"),
-        right_inactive = is_right_button_inactive("home")
+        search_text = search_text,
+        total = page.total,
+        previous_cursor = None if page.previous_cursor is None else encode_cursor(page.previous_cursor),
+        next_cursor = None if page.next_cursor is None else encode_cursor(page.next_cursor),
+        left_inactive = "disabled" if page.previous_cursor is None else "",
+        right_inactive = "disabled" if page.next_cursor is None else ""
     )
 
-@books_blueprint.route('/first/<function>')
-def first(function):
-    repo.book_dataset.first(function)
-    return redirect(url_for("books_bp." + function))
-
-@books_blueprint.route('/previous/<function>')
-def previous(function):
-    repo.book_dataset.previous(function)
-    return redirect(url_for("books_bp." + function))
-
-@books_blueprint.route('/next/<function>')
-def next(function):
-    repo.book_dataset.next(function)
-    return redirect(url_for("books_bp." + function))
-
-@books_blueprint.route('/last/<function>')
-def last(function):
-    repo.book_dataset.last(function)
-    return redirect(url_for("books_bp." + function))
+@books_blueprint.route('/', methods=['GET', 'POST'])
+def home():
+    return browse("home", "title")
 
 @books_blueprint.route('/book/<id>')
 def book(id):
@@ -179,7 +191,7 @@ def reading_list():
     if 'user_name' in session:
         user: User = repo.book_dataset.get_user(session["user_name"])
         if isinstance(user, User):
-            books = user.reading_list
+            books = list(user.reading_list)
 
     return render_template(
         'authentication/reading_list.html',
@@ -190,61 +202,16 @@ def reading_list():
 
 @books_blueprint.route('/books_by_date', methods=['GET', 'POST'])
 def books_by_date():
-    form = TextSearchForm()
-    search_text = None
-
-    if form.validate_on_submit():
-        search_text = form.text.data
-
-    return render_template(
-        'home/home.html',
-        title = "date",
-        books = repo.book_dataset.get_page_by_index("books_by_date", search_text),
-        inventory = repo.book_dataset.books_inventory,
-        function = "books_by_date",
-        form = form,
-        left_inactive = is_left_button_inactive("books_by_date"),
-        right_inactive = is_right_button_inactive("books_by_date")
-    )
+    return browse("books_by_date", "date")
 
 @books_blueprint.route('/authors', methods=['GET', 'POST'])
 def authors():
-    form = TextSearchForm()
-    search_text = None
-
-    if form.validate_on_submit():
-        search_text = form.text.data
-
-    return render_template(
-        'home/home.html',
-        title = "author",
-        books = repo.book_dataset.get_page_by_index("authors", search_text),
-        inventory = repo.book_dataset.books_inventory,
-        function = "authors",
-        form = form,
-        left_inactive = is_left_button_inactive("authors"),
-        right_inactive = is_right_button_inactive("authors")
-    )
+    return browse("authors", "author")
 
 
 @books_blueprint.route('/publishers', methods=['GET', 'POST'])
 def publishers():
-    form = TextSearchForm()
-    search_text = None
-
-    if form.validate_on_submit():
-        search_text = form.text.data
-
-    return render_template(
-        'home/home.html',
-        title = "publisher",
-        books = repo.book_dataset.get_page_by_index("publishers", search_text),
-        form = form,
-        inventory = repo.book_dataset.books_inventory,
-        function = "publishers",
-        left_inactive = is_left_button_inactive("publishers"),
-        right_inactive = is_right_button_inactive("publishers")
-    )
+    return browse("publishers", "publisher")
 
 
 @books_blueprint.route('/add_to_reading_list/<id>')
@@ -252,10 +219,8 @@ def publishers():
 def add_to_reading_list(id):
     book=repo.book_dataset.get_book_by_id(int(id))
     if 'user_name' in session:
-        user: User = repo.book_dataset.get_user(session["user_name"])
-        if isinstance(user, User):
-            user.add_to_reading_list(book)
-    
+        repo.book_dataset.add_to_reading_list(session["user_name"], book)
+
     return redirect(url_for('books_bp.book', id=id))
 
 @books_blueprint.route('/remove_from_reading_list/<id>')
@@ -263,10 +228,8 @@ def add_to_reading_list(id):
 def remove_from_reading_list(id):
     book=repo.book_dataset.get_book_by_id(int(id))
     if 'user_name' in session:
-        user: User = repo.book_dataset.get_user(session["user_name"])
-        if isinstance(user, User):
-            user.remove_from_reading_list(book)
-    
+        repo.book_dataset.remove_from_reading_list(session["user_name"], book)
+
     return redirect(url_for('books_bp.book', id=id))
 
 # ------------------------------ Review Query Section -----------------------------
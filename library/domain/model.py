@@ -1,8 +1,17 @@
 from datetime import datetime, time
 from typing import List
 
+# Price and stock of a Book that has no inventory record.
+DEFAULT_PRICE = 5
+DEFAULT_STOCK = 0
+
+# The domain classes keep their attributes in __slots__, which saves a dictionary per instance. The slots include
+# __dict__ and __weakref__ for the SQLAlchemy mappers in orm.py, which keep the state of the mapped attributes in
+# __dict__ and refer to instances weakly; unmapped instances, as in the memory repository, never create a __dict__.
+
 
 class Publisher:
+    __slots__ = ('__name', '__dict__', '__weakref__')
 
     def __init__(self, publisher_name: str):
         # This makes sure the setter is called here in the initializer/constructor as well.
@@ -37,6 +46,7 @@ class Publisher:
 
 
 class Author:
+    __slots__ = ('__unique_id', '__full_name', '__coauthors', '__dict__', '__weakref__')
 
     def __init__(self, author_id: int, author_full_name: str):
         if not isinstance(author_id, int):
@@ -50,9 +60,9 @@ class Author:
         # Uses the attribute setter method.
         self.full_name = author_full_name
 
-        # Initialize author colleagues data structure with empty set.
-        # We use a set so each unique author is only represented once.
-        self.__authors_this_one_has_worked_with = set()
+        # The set of coauthors, so each unique author is only represented once. Few authors have their coauthors
+        # recorded, so the set is only created for the first one.
+        self.__coauthors = None
 
     @property
     def unique_id(self) -> int:
@@ -76,10 +86,12 @@ class Author:
 
     def add_coauthor(self, coauthor):
         if isinstance(coauthor, self.__class__) and coauthor.unique_id != self.unique_id:
-            self.__authors_this_one_has_worked_with.add(coauthor)
+            if self.__coauthors is None:
+                self.__coauthors = set()
+            self.__coauthors.add(coauthor)
 
     def check_if_this_author_coauthored_with(self, author):
-        return author in self.__authors_this_one_has_worked_with
+        return self.__coauthors is not None and author in self.__coauthors
 
     def __repr__(self):
         return f'<Author {self.full_name}, author id = {self.unique_id}>'
@@ -97,6 +109,8 @@ class Author:
 
 
 class Review:
+    __slots__ = ('__book_title', '__review_text', '__rating', '__timestamp', '__user_name', '__id', '__dict__',
+                 '__weakref__')
 
     def __init__(self, book_title: str, review_text: str, rating: int, user_name: str, review_id: int = None,
                  timestamp=None):
@@ -140,6 +154,10 @@ class Review:
     def timestamp(self) -> datetime:
         return self.__timestamp
 
+    @property
+    def review_id(self) -> int:
+        return self.__id
+
     def __eq__(self, other):
         if not isinstance(other, self.__class__):
             return False
@@ -151,6 +169,9 @@ class Review:
 
 
 class Book:
+    __slots__ = ('__book_id', '__title', '__description', '__publisher', '__authors', '__first_author_name',
+                 '__release_year', '__ebook', '__num_pages', '__average_rating', '__ratings_count', '__url', '__reviews', '__stock', '__price',
+                 '__dict__', '__weakref__')
 
     def __init__(self, book_id: int, book_title: str):
         if not isinstance(book_id, int):
@@ -163,9 +184,10 @@ class Book:
 
         # use the attribute setter
         self.title = book_title
-        self.description = None
+        self.__description = None
         self.__publisher = None
         self.__authors = []
+        self.__first_author_name = ""
         self.__release_year = None
         self.__ebook = None
         self.__num_pages = None
@@ -173,8 +195,8 @@ class Book:
         self.__ratings_count = None
         self.__url = None
         self.__reviews = []
-        self.__stock = 0
-        self.__price = 5
+        self.__stock = DEFAULT_STOCK
+        self.__price = DEFAULT_PRICE
 
     @property
     def book_id(self) -> int:
@@ -241,7 +263,8 @@ class Book:
 
     @release_year.setter
     def release_year(self, release_year: int):
-        if isinstance(release_year, int) and release_year >= 0:
+        # None marks a book of an unknown year.
+        if release_year is None or isinstance(release_year, int) and release_year >= 0:
             self.__release_year = release_year
         else:
             raise ValueError
@@ -270,6 +293,11 @@ class Book:
     def authors(self) -> List[Author]:
         return self.__authors
 
+    @property
+    def first_author_name(self) -> str:
+        """ The name of the first author, or '' if the book has none; the authors view is sorted by it. """
+        return self.__first_author_name
+
     def add_author(self, author: Author):
         if not isinstance(author, Author):
             return
@@ -278,6 +306,7 @@ class Book:
             return
 
         self.__authors.append(author)
+        self.__first_author_name = self.__authors[0].full_name
 
     def remove_author(self, author: Author):
         if not isinstance(author, Author):
@@ -285,6 +314,7 @@ class Book:
 
         if author in self.__authors:
             self.__authors.remove(author)
+            self.__first_author_name = self.__authors[0].full_name if self.__authors else ""
 
     @property
     def reviews(self) -> List[Review]:
@@ -305,7 +335,7 @@ class Book:
 
     @ebook.setter
     def ebook(self, is_ebook: bool):
-        if isinstance(is_ebook, bool):
+        if is_ebook is None or isinstance(is_ebook, bool):
             self.__ebook = is_ebook
 
     @property
@@ -314,7 +344,7 @@ class Book:
 
     @num_pages.setter
     def num_pages(self, num_pages: int):
-        if isinstance(num_pages, int) and num_pages >= 0:
+        if num_pages is None or isinstance(num_pages, int) and num_pages >= 0:
             self.__num_pages = num_pages
 
     def __repr__(self):
@@ -333,6 +363,8 @@ class Book:
 
 
 class User:
+    __slots__ = ('__user_name', '__password', '__read_books', '__reviews', '__pages_read', '__reading_list',
+                 '__dict__', '__weakref__')
 
     def __init__(self, user_name: str, password: str, reading_list=None):
         if user_name == "" or not isinstance(user_name, str):
@@ -451,3 +483,30 @@ class BooksInventory:
             if self.__books[book_id].title == book_title:
                 return self.__books[book_id]
         return None
+
+
+class InternPool:
+    """ Hands out a single shared Publisher per publisher name and a single shared Author per author id, so that
+    the publishers and authors of a large catalog are not duplicated for every book referring to them.
+    """
+
+    def __init__(self):
+        self.__publishers = {}
+        self.__authors = {}
+
+    def publisher(self, publisher_name: str) -> Publisher:
+        publisher = self.__publishers.get(publisher_name)
+        if publisher is None:
+            publisher = Publisher(publisher_name)
+            # Names that only differ in surrounding whitespace share the publisher of their normalised name.
+            publisher = self.__publishers.setdefault(publisher.name, publisher)
+            if isinstance(publisher_name, str):
+                self.__publishers[publisher_name] = publisher
+        return publisher
+
+    def author(self, author_id: int, author_full_name: str) -> Author:
+        author = self.__authors.get(author_id)
+        if author is None:
+            author = Author(author_id, author_full_name)
+            self.__authors[author_id] = author
+        return author
@@ -0,0 +1,106 @@
+import json
+import os
+import time
+
+import pytest
+
+from library.adapters.jsondatareader import BooksJSONReader
+from library.domain.model import Author, Book, Publisher
+
+# Benchmarks run at a small scale by default so that the regular test run stays fast.
+# Set BENCHMARK_SCALE to a larger number (e.g. 100) to run them against bigger synthetic catalogs.
+BENCHMARK_SCALE = int(os.environ.get('BENCHMARK_SCALE', 1))
+
+# Benchmarks comparing wall clock times are flaky on shared machines and slow, so they are skipped unless
+# RUN_BENCHMARKS is set. Decorate them with @benchmark; checks of behaviour belong with the unit tests.
+RUN_BENCHMARKS = os.environ.get('RUN_BENCHMARKS', '').lower() in ('1', 'true')
+benchmark = pytest.mark.skipif(not RUN_BENCHMARKS, reason="wall clock benchmark, set RUN_BENCHMARKS=1 to run it")
+
+
+def write_synthetic_catalog(data_path, number_of_books, authors_per_book=2):
+    """ Writes synthetic books, authors, inventory, users and reviews files in the format of the excerpt files. """
+    number_of_authors = max(1, number_of_books // 2)
+    with open(data_path / "book_authors_excerpt.json", "w", encoding='UTF-8') as authors_file:
+        for author_id in range(number_of_authors):
+            authors_file.write(json.dumps({"author_id": str(author_id), "name": f"Author {author_id}"}) + "\n")
+
+    with open(data_path / "comic_books_excerpt.json", "w", encoding='UTF-8') as books_file:
+        for book_id in range(number_of_books):
+            authors = [{"author_id": str((book_id + i) % number_of_authors), "role": ""}
+                       for i in range(authors_per_book)]
+            books_file.write(json.dumps({
+                "book_id": str(book_id),
+                "title": f"Book {book_id:08d}",
+                "publisher": f"Publisher {book_id % 97}",
+                "publication_year": str(1950 + book_id % 70),
+                "is_ebook": "true" if book_id % 2 else "false",
+                "description": "A synthetic book used for benchmarking.",
+                "num_pages": str(100 + book_id % 300),
+                "ratings_count": str(book_id % 1000),
+                "average_rating": "3.50",
+                "url": f"https://www.goodreads.com/book/show/{book_id}",
+                "authors": authors,
+                # Fields the importer ignores, sized like those of the Goodreads excerpt so parsing costs the same.
+                "popular_shelves": [{"count": str(count), "name": f"shelf-{count}"} for count in range(40)],
+                "similar_books": [str(book_id + i) for i in range(15)],
+            }) + "\n")
+
+    with open(data_path / "book_inventory.json", "w", encoding='UTF-8') as inventory_file:
+        for book_id in range(number_of_books):
+            inventory_file.write(json.dumps({"book_id": str(book_id), "price": 10, "stock": book_id % 5}) + "\n")
+
+    with open(data_path / "users.json", "w", encoding='UTF-8') as users_file:
+        for user_id in range(10):
+            reading_list = [str(book_id) for book_id in range(user_id, number_of_books, max(1, number_of_books // 5))]
+            users_file.write(json.dumps({"user_name": f"user{user_id}", "password": "Password123",
+                                         "reading_list": reading_list}) + "\n")
+
+    with open(data_path / "book_reviews.csv", "w", encoding='utf-8') as reviews_file:
+        reviews_file.write("id,user-name,book-id,rating,review-text,timestamp\n")
+        for review_id in range(1, min(number_of_books, 1000) + 1):
+            reviews_file.write(f'{review_id},user{review_id % 10},{review_id - 1}, 4,"Synthetic review",'
+                               f'2020-02-28 14:31:26\n')
+    return data_path
+
+
+def synthetic_repository(number_of_books, repository=None, scattered=False, title=None, publishers=97, authors=1000,
+                         release_year=None, **attributes):
+    """ Adds synthetic books, with ids from 0 up to number_of_books, to repository, a new BooksJSONReader by default,
+    and returns it.
+
+    The title, publisher, author and release year of a book derive from a number: its book id or, if scattered, a
+    permutation of the book ids, so that the order of every view differs from the order the books are added in.
+    title and release_year map the number to a title, "Book <number>" by default, and to a year or None. publishers
+    and authors are lists of Publisher and Author objects, or how many synthetic ones to make, taken in turn. The
+    other attributes are set on every book, calling the values that are functions with the book id.
+    """
+    if repository is None:
+        repository = BooksJSONReader()
+    if isinstance(publishers, int):
+        publishers = [Publisher(f"Publisher {number}") for number in range(publishers)]
+    if isinstance(authors, int):
+        authors = [Author(number, f"Author {number}") for number in range(authors)]
+    for book_id in range(number_of_books):
+        number = (book_id * 7919) % number_of_books if scattered else book_id
+        book = Book(book_id, f"Book {number:08d}" if title is None else title(number))
+        if publishers:
+            book.publisher = publishers[number % len(publishers)]
+        if authors:
+            book.add_author(authors[number % len(authors)])
+        year = release_year(number) if release_year is not None else None
+        if year is not None:
+            book.release_year = year
+        for name, value in attributes.items():
+            setattr(book, name, value(book_id) if callable(value) else value)
+        repository.add_book(book)
+    return repository
+
+
+def best_time(function, repeat=3):
+    """ Returns the best wall clock time of several runs of function, which filters out scheduling noise. """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
@@ -0,0 +1,12 @@
+import pytest
+
+from benchmark_utils import write_synthetic_catalog
+
+
+@pytest.fixture
+def synthetic_catalog(tmp_path):
+    def make(number_of_books, **kwargs):
+        data_path = tmp_path / f"catalog_{number_of_books}"
+        data_path.mkdir(exist_ok=True)
+        return write_synthetic_catalog(data_path, number_of_books, **kwargs)
+    return make
@@ -0,0 +1,49 @@
+import random
+import time
+
+import pytest
+
+from library.adapters import jsondatareader
+from library.domain.model import Author, Publisher
+
+from benchmark_utils import BENCHMARK_SCALE, synthetic_repository, benchmark
+
+SMALL_CATALOG = 1000
+# At BENCHMARK_SCALE=10 this is the 1M book catalog of the original measurement.
+LARGE_CATALOG = 100000 * BENCHMARK_SCALE
+
+NUMBER_OF_REQUESTS = 200
+
+
+def median_latency(client, number_of_books):
+    book_ids = random.Random(number_of_books).sample(range(number_of_books), NUMBER_OF_REQUESTS)
+    timings = []
+    for book_id in book_ids:
+        start = time.perf_counter()
+        response = client.get(f'/book/{book_id}')
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200
+    return sorted(timings)[len(timings) // 2]
+
+
+@pytest.fixture
+def restore_book_dataset():
+    book_dataset = jsondatareader.book_dataset
+    yield
+    jsondatareader.book_dataset = book_dataset
+
+
+@benchmark
+def test_book_page_latency_is_independent_of_catalog_size(client, restore_book_dataset):
+    latencies = {}
+    for number_of_books in (SMALL_CATALOG, LARGE_CATALOG):
+        jsondatareader.book_dataset = synthetic_repository(
+            number_of_books, publishers=[Publisher("Synthetic Publisher")], authors=[Author(1, "Synthetic Author")],
+            average_rating=3.5)
+        # The first request pays for compiling the template.
+        client.get('/book/0')
+        latencies[number_of_books] = median_latency(client, number_of_books)
+
+    print({size: f"{latency * 1000:.2f} ms" for size, latency in latencies.items()})
+    # A scan of the catalog per lookup would make the large catalog a hundred times slower.
+    assert latencies[LARGE_CATALOG] < 2 * latencies[SMALL_CATALOG]
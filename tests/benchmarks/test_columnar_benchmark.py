@@ -0,0 +1,68 @@
+import gc
+import time
+import tracemalloc
+
+from library.adapters.columnar_repository import ColumnarRepository
+from library.adapters.jsondatareader import BooksJSONReader
+
+from benchmark_utils import BENCHMARK_SCALE, best_time, synthetic_repository, benchmark
+
+NUMBER_OF_BOOKS = 20000 * BENCHMARK_SCALE
+
+
+def fill(repo, number_of_books):
+    return synthetic_repository(number_of_books, repo, scattered=True, authors=number_of_books // 2,
+                                release_year=lambda number: 1900 + number % 120, average_rating=3.5,
+                                ratings_count=lambda book_id: book_id % 1000,
+                                url=lambda book_id: f"https://www.goodreads.com/book/show/{book_id}")
+
+
+def measure(make_repository):
+    """ Returns the repository, the bytes it holds, and the time its first read of each view took. """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        repo = fill(make_repository(), NUMBER_OF_BOOKS)
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    start = time.perf_counter()
+    for view in ("home", "publishers", "authors", "books_by_date"):
+        repo.get_page(view)
+    return repo, size, time.perf_counter() - start
+
+
+@benchmark
+def test_columnar_repository_is_smaller_and_sorts_faster():
+    memory_repo, memory_size, memory_sort_time = measure(BooksJSONReader)
+    columnar_repo, columnar_size, columnar_sort_time = measure(ColumnarRepository)
+    print(f"\n{NUMBER_OF_BOOKS} books: memory repository {memory_size / NUMBER_OF_BOOKS:.0f} bytes per book, "
+          f"{memory_sort_time * 1000:.1f} ms to sort the views; columnar repository "
+          f"{columnar_size / NUMBER_OF_BOOKS:.0f} bytes per book, {columnar_sort_time * 1000:.1f} ms")
+
+    for view in ("home", "publishers", "authors", "books_by_date"):
+        assert [book.book_id for book in columnar_repo.get_page(view, last=True).books] == \
+               [book.book_id for book in memory_repo.get_page(view, last=True).books]
+    assert columnar_size < memory_size / 2
+    assert columnar_sort_time < memory_sort_time
+
+
+@benchmark
+def test_year_search_is_as_fast_as_the_memory_repository():
+    memory_repo = fill(BooksJSONReader(), NUMBER_OF_BOOKS)
+    columnar_repo = fill(ColumnarRepository(), NUMBER_OF_BOOKS)
+    for text in ("1990-1999", "199"):
+        assert [book.book_id for book in columnar_repo.get_page("books_by_date", text).books] == \
+               [book.book_id for book in memory_repo.get_page("books_by_date", text).books]
+
+    # Every search is timed from an empty cache, as after a change to the repository.
+    def search(repo):
+        repo.search_cache.bump()
+        return repo.get_page("books_by_date", "1990-1999")
+
+    memory_time = best_time(lambda: search(memory_repo))
+    columnar_time = best_time(lambda: search(columnar_repo))
+    print(f"\n{NUMBER_OF_BOOKS} books: {memory_time * 1000:.2f} ms per year search in the memory repository, "
+          f"{columnar_time * 1000:.2f} ms in the columnar repository")
+    assert columnar_time < 2 * memory_time
@@ -0,0 +1,47 @@
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+
+import pytest
+
+from library.adapters.csv_data_importer import iter_json_file
+
+from benchmark_utils import BENCHMARK_SCALE, best_time, benchmark
+
+NUMBER_OF_BOOKS = 5000 * BENCHMARK_SCALE
+
+CODECS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+
+
+@pytest.fixture
+def books_files(synthetic_catalog):
+    books_path = synthetic_catalog(NUMBER_OF_BOOKS) / "comic_books_excerpt.json"
+    files = {'': books_path}
+    for suffix, open_compressed in CODECS.items():
+        compressed_path = books_path.with_name(books_path.name + suffix)
+        with open(books_path, 'rb') as books_file, open_compressed(compressed_path, 'wb') as compressed_file:
+            shutil.copyfileobj(books_file, compressed_file)
+        files[suffix] = compressed_path
+    return files
+
+
+def count_records(filename):
+    return sum(1 for _ in iter_json_file(filename))
+
+
+@benchmark
+def test_compressed_input_throughput(books_files):
+    megabytes = os.path.getsize(books_files['']) / 1e6
+    timings = {}
+    for suffix, path in books_files.items():
+        assert count_records(path) == NUMBER_OF_BOOKS
+        timings[suffix] = best_time(lambda: count_records(path))
+
+    for suffix, timing in timings.items():
+        print(f"{suffix or 'plain'}: {megabytes / timing:.1f} MB/s, "
+              f"{os.path.getsize(books_files[suffix]) / 1e6:.1f} MB on disk")
+
+    # Decompressing gzip streams is cheap next to parsing the JSON, so it must not slow the import down much.
+    assert timings['.gz'] < 2 * timings['']
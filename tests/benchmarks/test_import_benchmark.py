@@ -0,0 +1,90 @@
+import tracemalloc
+
+from library.adapters import jsondatareader
+from library.adapters.csv_data_importer import load_authors_and_books, read_json_batches, read_json_file, \
+    build_author_index, build_book, iter_json_file, parse_book_record
+from library.domain.model import InternPool
+
+from benchmark_utils import BENCHMARK_SCALE, best_time, benchmark
+
+
+def import_books(data_path):
+    repo = jsondatareader.BooksJSONReader()
+    load_authors_and_books(repo, data_path, "comic_books_excerpt.json", "book_authors_excerpt.json")
+    return repo
+
+
+def test_import_resolves_authors_from_index(synthetic_catalog):
+    repo = import_books(synthetic_catalog(50))
+    book = repo.dataset_of_books[7]
+    assert [author.full_name for author in book.authors] == ["Author 7", "Author 8"]
+
+
+@benchmark
+def test_import_time_grows_linearly_with_catalog_size(synthetic_catalog):
+    small = 2000 * BENCHMARK_SCALE
+    large = 4 * small
+    small_path, large_path = synthetic_catalog(small), synthetic_catalog(large)
+
+    small_time = best_time(lambda: import_books(small_path))
+    large_time = best_time(lambda: import_books(large_path))
+    print(f"\nimported {small} books in {small_time:.3f}s, {large} books in {large_time:.3f}s")
+
+    # Four times the books (and authors) must cost roughly four times as much, not sixteen times.
+    assert large_time < small_time * 8
+
+
+def test_read_json_batches_respects_batch_size(synthetic_catalog):
+    data_path = synthetic_catalog(25)
+    batches = list(read_json_batches(data_path / "comic_books_excerpt.json", batch_size=10))
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert batches[2][4]['book_id'] == "24"
+
+
+def test_streaming_import_memory_is_bounded_by_batch_size(synthetic_catalog):
+    data_path = synthetic_catalog(5000 * BENCHMARK_SCALE)
+    books_file = data_path / "comic_books_excerpt.json"
+
+    tracemalloc.start()
+    read_json_file(books_file)
+    _, whole_file_peak = tracemalloc.get_traced_memory()
+    # Restart the trace rather than resetting its peak, which needs Python 3.9.
+    tracemalloc.stop()
+    tracemalloc.start()
+    for _ in read_json_batches(books_file, batch_size=100):
+        pass
+    _, streaming_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"\npeak memory reading whole file {whole_file_peak} bytes, streaming {streaming_peak} bytes")
+
+    assert streaming_peak * 10 < whole_file_peak
+
+
+def bytes_per_book(records, pool):
+    tracemalloc.start()
+    books = [build_book(record, pool) for record in records]
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return allocated / len(books)
+
+
+def test_interning_reduces_memory_per_book(synthetic_catalog):
+    data_path = synthetic_catalog(5000 * BENCHMARK_SCALE)
+    author_index = build_author_index(iter_json_file(data_path / "book_authors_excerpt.json"))
+    records = [parse_book_record(book_json, author_index)
+               for book_json in iter_json_file(data_path / "comic_books_excerpt.json")]
+
+    # A fresh pool per book gives every book its own Publisher and Author objects, as before interning.
+    duplicated = sum(bytes_per_book([record], InternPool()) for record in records) / len(records)
+    interned = bytes_per_book(records, InternPool())
+    print(f"\nbytes per book without interning {duplicated:.0f}, with interning {interned:.0f}")
+
+    assert interned < duplicated * 0.8
+
+
+def test_interned_books_share_publishers_and_authors(synthetic_catalog):
+    repo = import_books(synthetic_catalog(200))
+    book, other_book = repo.get_book_by_id(1), repo.get_book_by_id(98)
+
+    assert book.publisher is other_book.publisher
+    assert book.authors[1] is repo.get_book_by_id(2).authors[0]
@@ -0,0 +1,70 @@
+import time
+
+from library.domain.model import Book
+
+from benchmark_utils import BENCHMARK_SCALE, best_time, synthetic_repository, benchmark
+
+SMALL_CATALOG = 1000
+LARGE_CATALOG = 100000 * BENCHMARK_SCALE
+
+VIEWS = ("home", "publishers", "authors", "books_by_date")
+
+
+def make_repository(number_of_books):
+    # Scatter the sort keys, so that the order of each view differs from the order the books are added in.
+    return synthetic_repository(number_of_books, scattered=True, release_year=lambda number: 1950 + number % 70)
+
+
+def serve_pages(repo):
+    for _ in range(20):
+        for view in VIEWS:
+            repo.get_page(view).books
+
+
+@benchmark
+def test_page_time_is_independent_of_catalog_size():
+    timings = {}
+    for number_of_books in (SMALL_CATALOG, LARGE_CATALOG):
+        repo = make_repository(number_of_books)
+        # The first read sorts the books added so far.
+        serve_pages(repo)
+        timings[number_of_books] = best_time(lambda: serve_pages(repo))
+
+    print({size: f"{timing / 80 * 1e6:.1f} us/page" for size, timing in timings.items()})
+    # Sorting the catalog for every page would make the large catalog hundreds of times slower.
+    assert timings[LARGE_CATALOG] < 5 * timings[SMALL_CATALOG]
+
+
+@benchmark
+def test_adding_a_book_does_not_sort_the_catalog_again():
+    repo = make_repository(LARGE_CATALOG)
+    serve_pages(repo)
+
+    start = time.perf_counter()
+    for book_id in range(LARGE_CATALOG, LARGE_CATALOG + 10):
+        repo.add_book(Book(book_id, f"Added Book {book_id}"))
+        repo.get_page("home").books
+    add_time = (time.perf_counter() - start) / 10
+
+    book_ids = [book.book_id for book in repo.get_page("home").books]
+    assert book_ids[:10] == list(range(LARGE_CATALOG, LARGE_CATALOG + 10))
+    print(f"{add_time * 1000:.2f} ms per added book")
+    # Each addition costs a copy of the order, far less than sorting the large catalog.
+    full_sort_time = best_time(lambda: sorted(repo.dataset_of_books, key=lambda book: (book.title, book.book_id)),
+                               repeat=1)
+    assert add_time < full_sort_time
+
+
+@benchmark
+def test_deep_pages_cost_the_same_as_the_second_page():
+    repo = make_repository(LARGE_CATALOG)
+    serve_pages(repo)
+
+    for view in VIEWS:
+        second_cursor = repo.get_page(view).next_cursor
+        deep_cursor = repo.get_page(view, last=True).previous_cursor
+        second_time = best_time(lambda: repo.get_page(view, after=second_cursor), repeat=10)
+        deep_time = best_time(lambda: repo.get_page(view, after=deep_cursor), repeat=10)
+        print(f"{view}: page 2 {second_time * 1e6:.1f} us, last page {deep_time * 1e6:.1f} us")
+        # The cursor is found by bisecting the keys of the order, whatever its depth.
+        assert deep_time < 3 * second_time
@@ -0,0 +1,49 @@
+import os
+import time
+
+import pytest
+
+from library.adapters import jsondatareader
+from library.adapters.csv_data_importer import load_authors_and_books, load_authors_and_books_parallel
+
+from benchmark_utils import BENCHMARK_SCALE, benchmark
+
+# At BENCHMARK_SCALE=100 this is the 500k book catalog of the original measurement.
+NUMBER_OF_BOOKS = 5000 * BENCHMARK_SCALE
+
+
+@pytest.fixture
+def catalog_path(synthetic_catalog):
+    return synthetic_catalog(NUMBER_OF_BOOKS)
+
+
+def import_books(data_path, workers):
+    repo = jsondatareader.BooksJSONReader()
+    if workers == 1:
+        load_authors_and_books(repo, data_path, "comic_books_excerpt.json", "book_authors_excerpt.json")
+    else:
+        load_authors_and_books_parallel(repo, data_path, "comic_books_excerpt.json", "book_authors_excerpt.json",
+                                        workers)
+    return repo
+
+
+def test_parallel_import_builds_the_same_repository(synthetic_catalog):
+    data_path = synthetic_catalog(2500)
+    serial = import_books(data_path, 1).dataset_of_books
+    parallel = import_books(data_path, 4).dataset_of_books
+
+    assert [book.book_id for book in parallel] == [book.book_id for book in serial]
+    assert [[author.full_name for author in book.authors] for book in parallel] == \
+           [[author.full_name for author in book.authors] for book in serial]
+    assert [book.publisher for book in parallel] == [book.publisher for book in serial]
+
+
+@benchmark
+@pytest.mark.parametrize('workers', sorted({1, 4, os.cpu_count() or 1}))
+def test_parallel_import_benchmark(catalog_path, workers):
+    start = time.perf_counter()
+    repo = import_books(catalog_path, workers)
+    elapsed = time.perf_counter() - start
+    print(f"\nimported {NUMBER_OF_BOOKS} books with {workers} worker(s) in {elapsed:.3f}s")
+
+    assert repo.get_number_of_books() == NUMBER_OF_BOOKS
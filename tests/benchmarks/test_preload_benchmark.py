@@ -0,0 +1,79 @@
+import gc
+import os
+import tracemalloc
+
+import pytest
+
+from library.adapters import repository_populate
+from library.adapters.jsondatareader import BooksJSONReader
+from library.adapters.preload import collect_in_workers_only, prepare_for_fork, unique_memory
+from library.adapters.repository import VIEWS
+
+from benchmark_utils import BENCHMARK_SCALE
+
+NUMBER_OF_BOOKS = 5000 * BENCHMARK_SCALE
+NUMBER_OF_WORKERS = 2
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork") or unique_memory() is None,
+                                reason="needs fork and /proc/<pid>/smaps_rollup")
+
+
+def serve(repository):
+    # What a worker does with the repository: serve pages of every view and a search, and collect garbage now and
+    # then. Reading a book still writes its reference count, so a search finding every book would copy them all.
+    for view in VIEWS:
+        page = repository.get_page(view)
+        for _ in range(5):
+            page = repository.get_page(view, after=page.next_cursor)
+    repository.get_page("home", "book 0000012")
+    gc.collect()
+
+
+def worker_unique_memory(repository) -> list:
+    """ Forks workers that serve from repository and returns the unique memory of each. """
+    results = []
+    for _ in range(NUMBER_OF_WORKERS):
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(read_end)
+                serve(repository)
+                os.write(write_end, str(unique_memory()).encode())
+            finally:
+                os._exit(0)
+        os.close(write_end)
+        with os.fdopen(read_end) as reader:
+            results.append(int(reader.read()))
+        os.waitpid(pid, 0)
+    return results
+
+
+def test_preloaded_workers_share_the_repository(synthetic_catalog):
+    data_path = synthetic_catalog(NUMBER_OF_BOOKS)
+    tracemalloc.start()
+    try:
+        # As the master process of a pre-forking server does.
+        collect_in_workers_only()
+        repository = BooksJSONReader()
+        repository_populate.populate(data_path, repository, False)
+        for view in VIEWS:
+            repository.get_page(view)
+        repository_size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    try:
+        unfrozen = worker_unique_memory(repository)
+        prepare_for_fork(repository)
+        frozen = worker_unique_memory(repository)
+    finally:
+        gc.enable()
+        gc.unfreeze()
+    print(f"\n{NUMBER_OF_BOOKS} books: repository {repository_size / 2 ** 20:.1f} MiB, unique memory per worker "
+          f"{max(unfrozen) / 2 ** 20:.1f} MiB without freezing and {max(frozen) / 2 ** 20:.1f} MiB with")
+
+    # A worker that built the repository itself would hold all of it. With no collection before the freeze, as the
+    # gc.freeze documentation advises, a worker still writes to about half as much.
+    assert max(frozen) < repository_size
+    assert max(frozen) < max(unfrozen) / 4
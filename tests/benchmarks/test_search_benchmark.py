@@ -0,0 +1,50 @@
+import random
+import string
+import time
+
+from library.domain.model import Author, Publisher
+
+from benchmark_utils import BENCHMARK_SCALE, synthetic_repository, benchmark
+
+# At BENCHMARK_SCALE=20 this is the 1M book catalog of the original measurement.
+NUMBER_OF_BOOKS = 50000 * BENCHMARK_SCALE
+
+NUMBER_OF_SEARCHES = 20
+
+
+def make_repository(number_of_books, words):
+    generator = random.Random(0)
+    publishers = [Publisher(" ".join(generator.choices(words, k=2))) for _ in range(500)]
+    authors = [Author(number, " ".join(generator.choices(words, k=2))) for number in range(5000)]
+    return synthetic_repository(number_of_books, publishers=publishers, authors=authors,
+                                title=lambda number: " ".join(generator.choices(words, k=4)).capitalize())
+
+
+def scan(repo, text):
+    # The search of the memory repository before it had an index.
+    return [book for book in repo.dataset_of_books if text in book.title.lower()]
+
+
+def time_searches(search, texts):
+    start = time.perf_counter()
+    for text in texts:
+        search(text)
+    return (time.perf_counter() - start) / len(texts)
+
+
+@benchmark
+def test_indexed_search_is_much_faster_than_a_scan():
+    generator = random.Random(1)
+    words = ["".join(generator.choices(string.ascii_lowercase, k=generator.randint(4, 9))) for _ in range(5000)]
+    repo = make_repository(NUMBER_OF_BOOKS, words)
+    texts = generator.sample(words, NUMBER_OF_SEARCHES)
+    repo.get_page("home", texts[0]).books
+
+    for text in texts:
+        assert sorted(book.book_id for book in repo.search_books("home", text)) == \
+               [book.book_id for book in scan(repo, text)]
+
+    page_time = time_searches(lambda text: repo.get_page("home", text).books, texts)
+    scan_time = time_searches(lambda text: scan(repo, text), texts)
+    print(f"{NUMBER_OF_BOOKS} books: {page_time * 1000:.2f} ms per search page, {scan_time * 1000:.2f} ms per scan")
+    assert page_time < scan_time / 5
@@ -0,0 +1,38 @@
+import time
+
+from library.domain.model import Book
+
+from benchmark_utils import BENCHMARK_SCALE, best_time, synthetic_repository, benchmark
+
+NUMBER_OF_BOOKS = 50000 * BENCHMARK_SCALE
+
+# Searches matching many books, which are the expensive ones to compute.
+SEARCHES = {"home": "book", "authors": "author 1", "publishers": "publisher", "books_by_date": "1990-1999"}
+
+
+def search_all_views(repo):
+    for view, text in SEARCHES.items():
+        repo.get_page(view, text).books
+
+
+@benchmark
+def test_repeated_searches_are_much_faster_than_the_first():
+    repo = synthetic_repository(NUMBER_OF_BOOKS, release_year=lambda number: 1950 + number % 70)
+    for view in SEARCHES:
+        repo.get_page(view).books
+
+    start = time.perf_counter()
+    search_all_views(repo)
+    miss_time = time.perf_counter() - start
+    hit_time = best_time(lambda: search_all_views(repo))
+
+    stats = repo.search_cache.stats()
+    print(f"{miss_time * 1000:.2f} ms uncached, {hit_time * 1000:.3f} ms cached, {stats}")
+    assert stats['misses'] == len(SEARCHES)
+    assert stats['hits'] == 3 * len(SEARCHES)
+    assert hit_time < miss_time / 10
+
+    # A change makes the next searches compute their results again.
+    repo.add_book(Book(NUMBER_OF_BOOKS, "Book added later"))
+    search_all_views(repo)
+    assert repo.search_cache.stats()['misses'] == 2 * len(SEARCHES)
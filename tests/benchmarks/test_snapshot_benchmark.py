@@ -0,0 +1,29 @@
+import os
+import time
+
+from library.adapters import jsondatareader, repository_populate
+
+from benchmark_utils import BENCHMARK_SCALE, benchmark
+
+
+@benchmark
+def test_cold_start_from_snapshot_is_faster_than_populating(synthetic_catalog, tmp_path):
+    number_of_books = 5000 * BENCHMARK_SCALE
+    data_path = synthetic_catalog(number_of_books)
+    snapshot_path = tmp_path / "repository.snapshot"
+
+    start = time.perf_counter()
+    repo = jsondatareader.BooksJSONReader()
+    repository_populate.populate(data_path, repo, False)
+    populate_time = time.perf_counter() - start
+    repo.dump_snapshot(snapshot_path, data_path)
+    os.utime(snapshot_path, (time.time() + 10, time.time() + 10))
+
+    start = time.perf_counter()
+    loaded = jsondatareader.BooksJSONReader.load_snapshot(snapshot_path, data_path, repository_populate.DATA_FILES)
+    load_time = time.perf_counter() - start
+    print(f"\n{number_of_books} books: populate {populate_time:.3f}s, load snapshot {load_time:.3f}s "
+          f"({os.path.getsize(snapshot_path)} bytes)")
+
+    assert loaded.get_number_of_books() == number_of_books
+    assert load_time * 3 < populate_time
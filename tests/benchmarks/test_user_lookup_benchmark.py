@@ -0,0 +1,56 @@
+import functools
+import time
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from library.adapters import jsondatareader
+from library.authentication import services
+from library.domain.model import User
+
+from benchmark_utils import BENCHMARK_SCALE, benchmark
+
+SMALL_USER_BASE = 1000
+LARGE_USER_BASE = 100000 * BENCHMARK_SCALE
+
+NUMBER_OF_NEW_USERS = 500
+
+
+@pytest.fixture
+def cheap_password_hashing(monkeypatch):
+    # Key stretching costs the same whatever the number of users, and would hide the cost of looking users up.
+    monkeypatch.setattr(services, 'generate_password_hash',
+                        functools.partial(generate_password_hash, method='pbkdf2:sha256:1'))
+
+
+def make_repository(number_of_users):
+    repo = jsondatareader.BooksJSONReader()
+    password_hash = generate_password_hash("Password123", method='pbkdf2:sha256:1')
+    for user_id in range(number_of_users):
+        repo.add_user(User(f"existing{user_id}", password_hash))
+    return repo
+
+
+def registrations_and_logins_per_second(repo):
+    start = time.perf_counter()
+    for user_id in range(NUMBER_OF_NEW_USERS):
+        services.add_user(f"new{user_id}", "Password123", repo)
+        services.authenticate_user(f"new{user_id}", "Password123", repo)
+    return NUMBER_OF_NEW_USERS / (time.perf_counter() - start)
+
+
+@benchmark
+def test_registration_and_login_throughput_is_independent_of_user_base(cheap_password_hashing):
+    throughput = {number_of_users: registrations_and_logins_per_second(make_repository(number_of_users))
+                  for number_of_users in (SMALL_USER_BASE, LARGE_USER_BASE)}
+
+    print({size: f"{rate:.0f}/s" for size, rate in throughput.items()})
+    # Scanning the users for every lookup would make registering against the large user base crawl.
+    assert throughput[LARGE_USER_BASE] > 0.5 * throughput[SMALL_USER_BASE]
+
+
+def test_registration_rejects_taken_user_names(cheap_password_hashing):
+    repo = make_repository(SMALL_USER_BASE)
+    with pytest.raises(services.NameNotUniqueException):
+        services.add_user("existing10", "Password123", repo)
+    assert len(repo.users) == SMALL_USER_BASE
@@ -0,0 +1,31 @@
+from library.adapters.repository import BOOKS_PER_PAGE
+
+from benchmark_utils import BENCHMARK_SCALE, best_time, synthetic_repository, benchmark
+
+NUMBER_OF_BOOKS = 100000 * BENCHMARK_SCALE
+
+
+def release_year(number):
+    # One book in a hundred has no known release year.
+    return 1900 + (number * 7919) % 120 if number % 100 else None
+
+
+def scan(repo, low, high):
+    return [book for book in repo.dataset_of_books if book.release_year is not None and low <= book.release_year <= high]
+
+
+@benchmark
+def test_year_range_lookup_is_much_faster_than_a_scan():
+    repo = synthetic_repository(NUMBER_OF_BOOKS, publishers=0, authors=0, release_year=release_year)
+    repo.get_page("books_by_date").books
+
+    for text, (low, high) in (("1990-1990", (1990, 1990)), (">=2015", (2015, 2019)), ("<1901", (1900, 1900))):
+        books = repo.get_page("books_by_date", text).books
+        expected = sorted(scan(repo, low, high), key=lambda book: (book.release_year, book.book_id))
+        assert len(books) == BOOKS_PER_PAGE
+        assert books == expected[:BOOKS_PER_PAGE]
+
+    lookup_time = best_time(lambda: repo.get_page("books_by_date", "1990-1990").books)
+    scan_time = best_time(lambda: scan(repo, 1990, 1990))
+    print(f"{NUMBER_OF_BOOKS} books: {lookup_time * 1000:.3f} ms per range lookup, {scan_time * 1000:.2f} ms per scan")
+    assert lookup_time < scan_time / 10
@@ -2,6 +2,7 @@ import pytest
 
 from library import create_app
 from library.adapters import jsondatareader, repository_populate
+from library.adapters.columnar_repository import ColumnarRepository
 
 from utils import get_project_root
 
@@ -18,6 +19,13 @@ def in_memory_repo():
     return repo
 
 
+@pytest.fixture
+def columnar_repo():
+    repo = ColumnarRepository()
+    repository_populate.populate(TEST_DATA_PATH, repo, False)
+    return repo
+
+
 @pytest.fixture
 def client():
     my_app = create_app({
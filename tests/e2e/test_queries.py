@@ -1,11 +1,19 @@
+import os
+import re
+
 import pytest
 
 from flask import session
+from library import create_app
 from library.domain.model import User
 import library.adapters.jsondatareader as repo
 from library.authentication import services
 from library.authentication.services import NameNotUniqueException, UnknownUserException, AuthenticationException
 
+from utils import get_project_root
+
+TEST_DATA_PATH = get_project_root() / "tests" / "data"
+
 
 @pytest.fixture()
 
@@ -22,6 +30,37 @@ def test_register(client):
     assert response.headers['Location'] == 'http://localhost/login'
 
 
+def test_registration_survives_a_restart_with_a_log(tmp_path):
+    config = {'TESTING': True, 'TEST_DATA_PATH': TEST_DATA_PATH, 'WTF_CSRF_ENABLED': False, 'REPOSITORY': 'memory',
+              'MEMORY_LOG': str(tmp_path / "changes.log")}
+    client = create_app(config).test_client()
+    client.post('/register', data={'user_name': 'Igill', 'password': 'NissanGTR123'})
+    client.post('/login', data={'user_name': 'Igill', 'password': 'NissanGTR123'})
+    client.get('/add_to_reading_list/707611')
+
+    client = create_app(config).test_client()
+    response = client.post('/login', data={'user_name': 'Igill', 'password': 'NissanGTR123'})
+    assert response.headers['Location'] == 'http://localhost/'
+    assert b'707611' in client.get('/reading_list').data
+
+
+def test_registration_survives_a_change_to_the_data_files(tmp_path):
+    snapshot_path = tmp_path / "repository.snapshot"
+    config = {'TESTING': True, 'TEST_DATA_PATH': TEST_DATA_PATH, 'WTF_CSRF_ENABLED': False, 'REPOSITORY': 'memory',
+              'MEMORY_SNAPSHOT': str(snapshot_path), 'MEMORY_LOG': str(tmp_path / "changes.log"),
+              'MEMORY_LOG_COMPACTION_SIZE': 1}
+    client = create_app(config).test_client()
+    client.post('/register', data={'user_name': 'Igill', 'password': 'NissanGTR123'})
+    # The registration is compacted into the snapshot as soon as it is logged; wait for the compaction to finish.
+    repo.book_dataset.compact()
+
+    # Data files newer than the snapshot make the restart populate the repository anew.
+    os.utime(snapshot_path, (0, 0))
+    client = create_app(config).test_client()
+    response = client.post('/login', data={'user_name': 'Igill', 'password': 'NissanGTR123'})
+    assert response.headers['Location'] == 'http://localhost/'
+
+
 @pytest.mark.parametrize(('user_name', 'password', 'message'), (
         ('', '', b'Your user name is required'),
         ('', 'ABCde12', b'Your user name is required'),
@@ -158,6 +197,35 @@ def test_home(client):
     assert b'146 pgs' in response.data
     assert b'This comes as an ebook' in response.data
 
+def next_page_url(response):
+    match = re.search(rb'href="(/\?after=[^"]+)"', response.data)
+    return match.group(1).decode('ascii').replace('&amp;', '&')
+
+def book_ids(response):
+    return re.findall(rb'href="/book/(\d+)"', response.data)
+
+def test_next_page_is_carried_in_the_url(client):
+    first_page = client.get('/')
+    second_page = client.get(next_page_url(first_page))
+    assert second_page.status_code == 200
+    assert b'Captain America' in first_page.data
+    assert b'Captain America' not in second_page.data
+
+    # Another user paging through the books does not move this user's page.
+    other_client = client.application.test_client()
+    other_client.get(next_page_url(first_page))
+    assert book_ids(client.get('/')) == book_ids(first_page)
+
+def test_pages_of_a_search_keep_the_search(client):
+    response = client.post('/', data={'text': 'the'})
+    assert b'?q=the' in response.data
+    assert book_ids(client.get('/?q=the')) == book_ids(response)
+
+def test_search_shows_the_number_of_books_found(client):
+    assert b'1 book found' in client.get('/?q=Sherlock').data
+    assert b'0 books found' in client.get('/?q=zzzz').data
+    assert b'found' not in client.get('/').data
+
 def test_books_by_date(client):
     response = client.get('/books_by_date')
     assert response.status_code == 200
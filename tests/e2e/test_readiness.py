@@ -0,0 +1,114 @@
+import gc
+import os
+import time
+
+import pytest
+
+from library import create_app
+from library.adapters import repository_populate
+
+from utils import get_project_root
+
+TEST_DATA_PATH = get_project_root() / "tests" / "data"
+
+
+@pytest.fixture
+def warming_up_status():
+    status = repository_populate.population_status
+    repository_populate.population_status = repository_populate.PopulationStatus()
+    yield repository_populate.population_status
+    repository_populate.population_status = status
+
+
+def test_ready_once_populated(client):
+    response = client.get('/ready')
+    assert response.status_code == 200
+    assert response.json['ready'] is True
+    assert response.json['progress'] == 1.0
+    assert set(response.json['search_cache']) >= {'hits', 'misses'}
+
+
+def test_pages_answer_503_while_populating(client, warming_up_status):
+    warming_up_status.start_stage("books")
+
+    response = client.get('/')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+    assert b'still loading' in response.data
+
+    response = client.get('/ready')
+    assert response.status_code == 503
+    assert response.json['ready'] is False
+    assert response.json['stage'] == "books"
+
+    warming_up_status.finish()
+    assert client.get('/').status_code == 200
+
+
+def test_failed_population_is_reported(client, warming_up_status):
+    warming_up_status.fail(FileNotFoundError("books.json"))
+
+    response = client.get('/ready')
+    assert response.status_code == 503
+    assert response.json['error'] == "FileNotFoundError: books.json"
+
+
+def test_lazy_population_becomes_ready():
+    app = create_app({
+        'TESTING': True,
+        'TEST_DATA_PATH': TEST_DATA_PATH,
+        'WTF_CSRF_ENABLED': False,
+        'REPOSITORY': 'memory',
+        'LAZY_POPULATE': True
+    })
+    client = app.test_client()
+
+    deadline = time.time() + 10
+    while client.get('/ready').status_code == 503 and time.time() < deadline:
+        time.sleep(0.01)
+
+    response = client.get('/ready')
+    assert response.status_code == 200
+    assert response.json['error'] is None
+    assert client.get('/').status_code == 200
+
+
+def test_preloaded_repository_is_frozen_for_forked_workers():
+    try:
+        app = create_app({
+            'TESTING': True,
+            'TEST_DATA_PATH': TEST_DATA_PATH,
+            'WTF_CSRF_ENABLED': False,
+            'REPOSITORY': 'memory',
+            'PRELOAD': True
+        })
+        assert gc.get_freeze_count() > 0
+        # The master does not collect garbage; the workers forked from it do.
+        assert not gc.isenabled()
+        if hasattr(os, "fork"):
+            pid = os.fork()
+            if pid == 0:
+                os._exit(0 if gc.isenabled() else 1)
+            assert os.waitpid(pid, 0)[1] == 0
+
+        # Serving requests from the master, as when no workers are forked, enables the collector again.
+        response = app.test_client().get('/ready')
+        assert gc.isenabled()
+    finally:
+        gc.enable()
+        gc.unfreeze()
+
+    assert response.status_code == 200
+    if os.path.exists("/proc/self/smaps_rollup"):
+        assert response.json['unique_memory'] > 0
+
+
+def test_preloaded_memory_repository_has_no_log(tmp_path):
+    with pytest.raises(ValueError):
+        create_app({'TESTING': True, 'TEST_DATA_PATH': TEST_DATA_PATH, 'REPOSITORY': 'memory', 'PRELOAD': True,
+                    'MEMORY_LOG': str(tmp_path / "changes.log")})
+
+
+def test_unknown_repository_is_refused():
+    with pytest.raises(ValueError):
+        create_app({'TESTING': True, 'TEST_DATA_PATH': TEST_DATA_PATH, 'REPOSITORY': 'memroy'})
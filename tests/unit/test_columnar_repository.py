@@ -0,0 +1,101 @@
+import gc
+
+import pytest
+
+from library import create_app
+from library.domain.model import Book, Publisher, Author, Review
+
+from utils import get_project_root
+
+TEST_DATA_PATH = get_project_root() / "tests" / "data"
+
+BOOK_ATTRIBUTES = ('book_id', 'title', 'description', 'publisher', 'authors', 'release_year', 'ebook', 'num_pages',
+                   'average_rating', 'ratings_count', 'url', 'reviews', 'price', 'stock')
+
+
+def walk(repo, view, text=None):
+    page = repo.get_page(view, text)
+    book_ids = [book.book_id for book in page.books]
+    while page.next_cursor is not None:
+        page = repo.get_page(view, text, after=page.next_cursor)
+        book_ids.extend(book.book_id for book in page.books)
+    return book_ids
+
+
+@pytest.mark.parametrize("view, text", [
+    ("home", None), ("home", "the"), ("home", "X"),
+    ("publishers", None), ("publishers", "a"), ("publishers", "dc"),
+    ("authors", None), ("authors", "a"), ("authors", "ed"),
+    ("books_by_date", None), ("books_by_date", "20"), ("books_by_date", "2010-2014"), ("books_by_date", ">2012"),
+    ("books_by_date", "<2000"),
+])
+def test_pages_match_the_memory_repository(in_memory_repo, columnar_repo, view, text):
+    assert walk(columnar_repo, view, text) == walk(in_memory_repo, view, text)
+    assert columnar_repo.get_page(view, text).total == in_memory_repo.get_page(view, text).total
+
+
+def test_books_match_the_memory_repository(in_memory_repo, columnar_repo):
+    assert columnar_repo.get_number_of_books() == in_memory_repo.get_number_of_books()
+    for book in in_memory_repo.dataset_of_books:
+        columnar_book = columnar_repo.get_book_by_id(book.book_id)
+        for attribute in BOOK_ATTRIBUTES:
+            assert getattr(columnar_book, attribute) == getattr(book, attribute), attribute
+    assert columnar_repo.books_inventory.find_price(11827783) == 5
+    assert columnar_repo.books_inventory.find_stock_count(1) is None
+
+
+def test_books_are_built_once_while_referred_to(columnar_repo):
+    reading_list_book = columnar_repo.get_user('Belle').reading_list[0]
+    assert columnar_repo.get_book_by_id(35452242) is reading_list_book
+
+    book = columnar_repo.get_book_by_id(11827783)
+    assert columnar_repo.get_page("home", "Sherlock").books[0] is book
+    del book
+    gc.collect()
+    # Books nothing refers to any more are built again from the columns.
+    assert columnar_repo.get_book_by_id(11827783).title == 'Sherlock Holmes: Year One'
+
+
+def test_changes_are_written_to_the_columns(columnar_repo):
+    book = Book(99, "Aardvark Adventures")
+    book.publisher = Publisher("Zebra Books")
+    book.add_author(Author(99, "Zoe Zed"))
+    book.release_year = 1850
+    columnar_repo.add_book(book)
+    columnar_repo.add_to_inventory(book, 12, 3)
+    columnar_repo.add_review('Belle', book, Review(book.title, "Fun", 4, 'Belle'))
+    del book
+    gc.collect()
+
+    book = columnar_repo.get_book_by_id(99)
+    assert (book.price, book.stock, len(book.reviews)) == (12, 3, 1)
+    assert columnar_repo.get_page("home", "aardvark").books[0] is book
+    assert columnar_repo.get_page("books_by_date").books[0] is book
+    assert columnar_repo.get_page("publishers").books[-1] is not book
+
+    book.title = "Zany Zoo"
+    book.remove_author(book.authors[0])
+    columnar_repo.update_book(book)
+    del book
+    gc.collect()
+    book = columnar_repo.get_book_by_id(99)
+    assert book.title == "Zany Zoo"
+    assert book.authors == []
+    assert columnar_repo.get_page("home", "aardvark").books == []
+    assert columnar_repo.get_page("authors", "zoe").books == []
+    assert columnar_repo.get_page("authors", last=True).books[-1] is book
+
+    number_of_books = columnar_repo.get_number_of_books()
+    columnar_repo.remove_book(book)
+    assert columnar_repo.get_book_by_id(99) is None
+    assert columnar_repo.books_inventory.find_book(99) is None
+    assert columnar_repo.get_number_of_books() == number_of_books - 1
+    assert all(review.book_title != "Zany Zoo" for review in columnar_repo.get_user('Belle').reviews)
+
+
+def test_app_serves_pages_from_the_columnar_repository():
+    client = create_app({'TESTING': True, 'TEST_DATA_PATH': TEST_DATA_PATH, 'WTF_CSRF_ENABLED': False,
+                         'REPOSITORY': 'columnar'}).test_client()
+    response = client.get('/')
+    assert response.data.index(b'Captain America') < response.data.index(b'Cruelle')
+    assert client.get('/book/11827783').status_code == 200
@@ -0,0 +1,143 @@
+import pickle
+import threading
+import time
+
+import pytest
+
+from library.adapters.read_write_lock import ReadWriteLock
+from library.domain.model import Book, Publisher, Author, Review, User
+
+
+def test_readers_share_the_lock():
+    lock = ReadWriteLock()
+    inside = threading.Barrier(3, timeout=5)
+
+    def read():
+        with lock.reading():
+            # Every reader has to be inside at once to get past the barrier.
+            inside.wait()
+
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    assert not inside.broken
+
+
+def test_writer_excludes_readers_and_goes_before_new_ones():
+    lock = ReadWriteLock()
+    events = []
+    writer_waiting = threading.Event()
+
+    def write():
+        writer_waiting.set()
+        with lock.writing():
+            events.append("write")
+
+    def read():
+        with lock.reading():
+            events.append("late read")
+
+    with lock.reading():
+        writer = threading.Thread(target=write)
+        writer.start()
+        writer_waiting.wait()
+        time.sleep(0.05)
+        # The writer waits for the first reader, and a reader arriving now waits for the writer.
+        late_reader = threading.Thread(target=read)
+        late_reader.start()
+        time.sleep(0.05)
+        assert events == []
+    writer.join()
+    late_reader.join()
+    assert events == ["write", "late read"]
+
+
+def test_lock_is_reentrant_but_cannot_be_upgraded():
+    lock = ReadWriteLock()
+    with lock.writing():
+        with lock.writing():
+            with lock.reading():
+                pass
+    with lock.reading():
+        with lock.reading():
+            pass
+        with pytest.raises(RuntimeError):
+            with lock.writing():
+                pass
+    # The lock is free again.
+    with lock.writing():
+        pass
+
+
+def test_unpickled_lock_is_free():
+    lock = ReadWriteLock()
+    with lock.writing():
+        copy = pickle.loads(pickle.dumps(lock))
+    with copy.writing():
+        pass
+
+
+@pytest.mark.parametrize("repository", ["in_memory_repo", "columnar_repo"])
+def test_concurrent_reads_and_writes(request, repository):
+    repo = request.getfixturevalue(repository)
+    user = User("Reader", "Password123")
+    repo.add_user(user)
+    reading_list_book = repo.dataset_of_books[0]
+    number_of_books = repo.get_number_of_books()
+    errors = []
+    stop = threading.Event()
+
+    def read():
+        try:
+            while not stop.is_set():
+                for view in ("home", "publishers", "authors", "books_by_date"):
+                    page = repo.get_page(view)
+                    assert len(page.books) == len({id(book) for book in page.books})
+                    while page.next_cursor is not None:
+                        page = repo.get_page(view, after=page.next_cursor)
+                titles = [book.title for book in repo.get_page("home", "book").books]
+                assert titles == sorted(titles)
+        except Exception as error:
+            errors.append(error)
+
+    def write(first_id):
+        try:
+            for book_id in range(first_id, first_id + 200):
+                book = Book(book_id, f"Stress Book {book_id}")
+                book.publisher = Publisher("Stress Press")
+                book.add_author(Author(book_id, f"Stress Author {book_id}"))
+                repo.add_book(book)
+                repo.add_to_inventory(book, 10, 1)
+                repo.add_to_reading_list("Reader", reading_list_book)
+                repo.add_review("Reader", book, Review(book.title, "Busy", 3, "Reader"))
+                repo.remove_from_reading_list("Reader", reading_list_book)
+                if book_id % 2:
+                    repo.remove_book(book)
+        except Exception as error:
+            errors.append(error)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    writers = [threading.Thread(target=write, args=(first_id,)) for first_id in (1, 1001)]
+    for thread in readers + writers:
+        thread.start()
+    for writer in writers:
+        writer.join()
+    stop.set()
+    for reader in readers:
+        reader.join()
+
+    assert errors == []
+    assert repo.get_number_of_books() == number_of_books + 200
+    home = []
+    page = repo.get_page("home")
+    home.extend(page.books)
+    while page.next_cursor is not None:
+        page = repo.get_page("home", after=page.next_cursor)
+        home.extend(page.books)
+    assert len(home) == number_of_books + 200
+    assert [book.title for book in home] == sorted(book.title for book in home)
+    assert user.reading_list == []
+    # The reviews of the removed books were removed with them.
+    assert len(user.reviews) == 200
@@ -51,6 +51,17 @@ class TestPublisher:
         set_of_publisher.add(publisher3)
         assert str(sorted(set_of_publisher)) == "[<Publisher Avatar Press>, <Publisher DC Comics>]"
 
+    def test_first_author_name(self):
+        book = Book(84765876, "Good Omens")
+        assert book.first_author_name == ""
+        book.add_author(Author(1, "Terry Pratchett"))
+        book.add_author(Author(2, "Neil Gaiman"))
+        assert book.first_author_name == "Terry Pratchett"
+        book.remove_author(Author(1, "Terry Pratchett"))
+        assert book.first_author_name == "Neil Gaiman"
+        book.remove_author(Author(2, "Neil Gaiman"))
+        assert book.first_author_name == ""
+
     def test_attribute_setters(self):
         publisher1 = Publisher("Avatar Press")
         assert str(publisher1) == "<Publisher Avatar Press>"
@@ -196,6 +207,16 @@ class TestBook:
         book.num_pages = 130
         assert book.num_pages == 130
 
+    def test_unknown_attributes(self):
+        book = Book(84765876, "Harry Potter")
+        book.release_year = 1930
+        book.ebook = True
+        book.num_pages = 130
+        book.release_year = None
+        book.ebook = None
+        book.num_pages = None
+        assert (book.release_year, book.ebook, book.num_pages) == (None, None, None)
+
     def test_attributes_fail(self):
         book = Book(84765876, "Harry Potter")
 
@@ -0,0 +1,325 @@
+import bz2
+import gzip
+import lzma
+import math
+import os
+import shutil
+
+import pytest
+
+from library.adapters.jsondatareader import BooksJSONReader, SEARCH_TERMS
+from library.adapters.repository import parse_year_range, encode_cursor, decode_cursor, BOOKS_PER_PAGE
+from library.adapters.search_cache import SearchCache
+from library.domain.model import Book
+from library.adapters.repository_populate import DATA_FILES, populate
+
+from utils import get_project_root
+
+TEST_DATA_PATH = get_project_root() / "tests" / "data"
+
+
+def test_snapshot_round_trip(in_memory_repo, tmp_path):
+    snapshot_path = tmp_path / "repository.snapshot"
+    in_memory_repo.dump_snapshot(snapshot_path, TEST_DATA_PATH)
+    # Make sure the snapshot is newer than the data files, whatever the resolution of the file system clock.
+    os.utime(snapshot_path, (os.path.getmtime(snapshot_path) + 10, os.path.getmtime(snapshot_path) + 10))
+
+    repo = BooksJSONReader.load_snapshot(snapshot_path, TEST_DATA_PATH, DATA_FILES)
+
+    assert repo.get_number_of_books() == in_memory_repo.get_number_of_books()
+    book = repo.get_book_by_id(11827783)
+    assert book.title == 'Sherlock Holmes: Year One'
+    assert [author.full_name for author in book.authors] == ['Scott Beatty', 'Daniel Indro']
+    assert len(book.reviews) == 5
+    assert repo.books_inventory.find_price(11827783) == 5
+    assert repo.get_user('Belle').reading_list[0] is repo.get_book_by_id(35452242)
+
+
+def test_snapshot_is_ignored_when_data_files_are_newer(in_memory_repo, tmp_path):
+    snapshot_path = tmp_path / "repository.snapshot"
+    in_memory_repo.dump_snapshot(snapshot_path, TEST_DATA_PATH)
+    os.utime(snapshot_path, (0, 0))
+
+    assert BooksJSONReader.load_snapshot(snapshot_path, TEST_DATA_PATH, DATA_FILES) is None
+
+
+def test_snapshot_of_another_data_path_or_version_is_ignored(in_memory_repo, tmp_path):
+    snapshot_path = tmp_path / "repository.snapshot"
+    in_memory_repo.dump_snapshot(snapshot_path, tmp_path)
+    assert BooksJSONReader.load_snapshot(snapshot_path, TEST_DATA_PATH, DATA_FILES) is None
+
+    snapshot_path.write_bytes(b'BOOKSNAP\x00\x00' + b'garbage')
+    os.utime(snapshot_path, (os.path.getmtime(snapshot_path) + 10, os.path.getmtime(snapshot_path) + 10))
+    assert BooksJSONReader.load_snapshot(snapshot_path, TEST_DATA_PATH, DATA_FILES) is None
+
+
+def test_missing_snapshot_is_ignored(tmp_path):
+    assert BooksJSONReader.load_snapshot(tmp_path / "missing.snapshot", TEST_DATA_PATH, DATA_FILES) is None
+
+
+def test_get_books_by_ids(in_memory_repo):
+    books = in_memory_repo.get_books_by_ids([707611, 11827783, 1])
+    assert sorted(book.book_id for book in books) == [707611, 11827783]
+
+
+def test_get_books_by_ids_with_no_ids(in_memory_repo):
+    assert in_memory_repo.get_books_by_ids([]) == []
+
+
+def test_book_index_follows_added_and_removed_books(in_memory_repo):
+    book = Book(1, "Added Book")
+    in_memory_repo.add_book(book)
+    assert in_memory_repo.get_book_by_id(1) is book
+
+    in_memory_repo.remove_book(book)
+    assert in_memory_repo.get_book_by_id(1) is None
+    assert in_memory_repo.get_books_by_ids([1]) == []
+
+
+def test_book_index_returns_the_first_book_added_with_an_id(in_memory_repo):
+    first = Book(1, "First Book")
+    second = Book(1, "Second Book")
+    in_memory_repo.add_book(first)
+    in_memory_repo.add_book(second)
+    assert in_memory_repo.get_book_by_id(1) is first
+
+    in_memory_repo.remove_book(first)
+    assert in_memory_repo.get_book_by_id(1) is second
+
+
+def test_populate_from_compressed_data_files(in_memory_repo, tmp_path):
+    # Each file is compressed with another codec; the reviews keep their name, so only the magic bytes tell.
+    codecs = [('.gz', gzip.open), ('.bz2', bz2.open), ('.xz', lzma.open), ('.gz', gzip.open), ('', gzip.open)]
+    for filename, (suffix, open_compressed) in zip(DATA_FILES, codecs):
+        with open(TEST_DATA_PATH / filename, 'rb') as data_file, \
+                open_compressed(tmp_path / (filename + suffix), 'wb') as compressed_file:
+            shutil.copyfileobj(data_file, compressed_file)
+
+    repo = BooksJSONReader()
+    populate(tmp_path, repo, False)
+
+    assert [book.book_id for book in repo.dataset_of_books] == \
+           [book.book_id for book in in_memory_repo.dataset_of_books]
+    book = repo.get_book_by_id(11827783)
+    assert [author.full_name for author in book.authors] == ['Scott Beatty', 'Daniel Indro']
+    assert len(book.reviews) == 5
+    assert repo.get_user('Belle').reading_list[0] is repo.get_book_by_id(35452242)
+
+
+def test_pages_follow_the_order_of_each_view(in_memory_repo):
+    titles = [book.title for book in in_memory_repo.get_page("home").books]
+    assert titles == sorted(titles)
+
+    years = [book.release_year for book in in_memory_repo.get_page("books_by_date").books]
+    known_years = [year for year in years if year is not None]
+    assert known_years == sorted(known_years)
+    assert years[:len(known_years)] == known_years
+
+
+def test_pages_are_walked_forwards_and_backwards_by_cursor(in_memory_repo):
+    for view in ("home", "publishers", "authors", "books_by_date"):
+        page = in_memory_repo.get_page(view)
+        assert page.previous_cursor is None
+        forwards = [page.books]
+        while page.next_cursor is not None:
+            page = in_memory_repo.get_page(view, after=page.next_cursor)
+            forwards.append(page.books)
+
+        page = in_memory_repo.get_page(view, last=True)
+        assert page.next_cursor is None
+        backwards = [page.books]
+        while page.previous_cursor is not None:
+            page = in_memory_repo.get_page(view, before=page.previous_cursor)
+            backwards.insert(0, page.books)
+
+        assert len(forwards) > 1
+        books = [book for books in forwards for book in books]
+        assert len({id(book) for book in books}) == len(books) == in_memory_repo.get_number_of_books()
+        assert [book for books in backwards for book in books] == books
+
+
+def test_pages_of_a_search_are_walked_by_cursor(in_memory_repo):
+    found = [book for book in in_memory_repo.dataset_of_books if "the" in book.title.lower()]
+    page = in_memory_repo.get_page("home", "the")
+    books = list(page.books)
+    while page.next_cursor is not None:
+        page = in_memory_repo.get_page("home", "the", after=page.next_cursor)
+        books.extend(page.books)
+    assert sorted(book.book_id for book in books) == sorted(book.book_id for book in found)
+    assert page.total == len(found)
+    assert in_memory_repo.get_page("home").total is None
+
+
+def test_cursor_of_a_removed_book_still_leads_to_the_next_page(in_memory_repo):
+    first_page = in_memory_repo.get_page("home")
+    second_page = in_memory_repo.get_page("home", after=first_page.next_cursor)
+    in_memory_repo.remove_book(first_page.books[-1])
+    assert in_memory_repo.get_page("home", after=first_page.next_cursor).books == second_page.books
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(("Title", 12))) == ("Title", 12)
+    assert decode_cursor(encode_cursor((0, "Scott Beatty", 11827783))) == (0, "Scott Beatty", 11827783)
+    assert decode_cursor(encode_cursor((math.inf, 3))) == (math.inf, 3)
+    assert decode_cursor(None) is None
+    assert decode_cursor("not a cursor") is None
+    assert decode_cursor(encode_cursor(({"a": 1},))) is None
+    assert decode_cursor(encode_cursor((True, 1))) is None
+    assert decode_cursor(encode_cursor((1, 2 ** 70))) is None
+
+
+def test_reading_a_page_leaves_the_dataset_alone(in_memory_repo):
+    book_ids = [book.book_id for book in in_memory_repo.dataset_of_books]
+    for page in ("home", "publishers", "authors", "books_by_date"):
+        in_memory_repo.get_page(page).books
+    assert [book.book_id for book in in_memory_repo.dataset_of_books] == book_ids
+
+
+def test_added_books_are_sorted_into_the_views(in_memory_repo):
+    in_memory_repo.get_page("home").books
+    book = Book(1, "000 Book Sorted First")
+    in_memory_repo.add_book(book)
+    assert in_memory_repo.get_page("home").books[0] is book
+
+    book.title = "Zzz Book Sorted Last"
+    in_memory_repo.update_book(book)
+    assert book not in in_memory_repo.get_page("home").books
+
+    in_memory_repo.remove_book(book)
+    assert book not in in_memory_repo.get_page("home", "Zzz").books
+
+
+def test_books_added_one_at_a_time_are_sorted_into_the_views(in_memory_repo):
+    in_memory_repo.get_page("home").books
+    books = [Book(book_id, f"000 Added Book {book_id:02d}") for book_id in range(1, 11)]
+    for book in books:
+        in_memory_repo.add_book(book)
+        in_memory_repo.get_page("home").books
+
+    assert in_memory_repo.get_page("home").books[:10] == books
+    assert in_memory_repo.get_page("home").books[10:] == \
+           sorted(in_memory_repo.dataset_of_books[:-10], key=lambda book: (book.title, book.book_id))[:2]
+
+
+def test_search_finds_titles_authors_and_publishers(in_memory_repo):
+    assert [book.book_id for book in in_memory_repo.get_page("home", "Sherlock").books] == [11827783]
+    assert 11827783 in [book.book_id for book in in_memory_repo.get_page("authors", "indro").books]
+    assert in_memory_repo.get_page("home", "zzzz").books == []
+    # Texts shorter than a trigram are matched without the index.
+    assert 11827783 in [book.book_id for book in in_memory_repo.get_page("home", "y").books]
+
+
+@pytest.mark.parametrize("text", ["the", "vol", "man", "e", "press", "dc comics", "scott", "zzz"])
+def test_search_finds_the_books_a_scan_finds(in_memory_repo, text):
+    for page, terms in SEARCH_TERMS.items():
+        scanned = [book.book_id for book in in_memory_repo.dataset_of_books
+                   if any(text in term.lower() for term in terms(book))]
+        assert sorted(book.book_id for book in in_memory_repo.search_books(page, text)) == sorted(scanned)
+
+
+def test_search_follows_added_updated_and_removed_books(in_memory_repo):
+    book = Book(1, "Inkheart")
+    in_memory_repo.add_book(book)
+    assert in_memory_repo.get_page("home", "inkhear").books == [book]
+
+    book.title = "Inkspell"
+    in_memory_repo.update_book(book)
+    assert in_memory_repo.get_page("home", "inkhear").books == []
+    assert in_memory_repo.get_page("home", "inkspe").books == [book]
+
+    in_memory_repo.remove_book(book)
+    assert in_memory_repo.get_page("home", "inkspe").books == []
+
+
+def test_parse_year_range():
+    assert parse_year_range("1990-1999") == (1990, 1999)
+    assert parse_year_range(" 1990 .. 1999 ") == (1990, 1999)
+    assert parse_year_range(">=2010") == (2010, None)
+    assert parse_year_range(">2010") == (2011, None)
+    assert parse_year_range("<= 1999") == (None, 1999)
+    assert parse_year_range("<2000") == (None, 1999)
+    assert parse_year_range("2010") is None
+    assert parse_year_range("twenty-ten") is None
+
+
+def test_search_books_by_a_range_of_years(in_memory_repo):
+    books = in_memory_repo.get_page("books_by_date", "2010-2012").books
+    years = [book.release_year for book in books]
+    assert years == sorted(years)
+    assert all(2010 <= year <= 2012 for year in years)
+    assert len(books) == len([book for book in in_memory_repo.dataset_of_books
+                              if book.release_year is not None and 2010 <= book.release_year <= 2012])
+
+    books = in_memory_repo.get_page("books_by_date", ">=2016").books
+    assert books and all(book.release_year >= 2016 for book in books)
+    assert in_memory_repo.get_page("books_by_date", "<1000").books == []
+
+
+@pytest.mark.parametrize("text, low, high", [("2010-2012", 2010, 2012), (">=2016", 2016, math.inf),
+                                             ("<2000", -math.inf, 1999), ("1990..1990", 1990, 1990)])
+def test_year_range_finds_the_books_a_scan_finds(in_memory_repo, text, low, high):
+    scanned = sorted((book for book in in_memory_repo.dataset_of_books
+                      if book.release_year is not None and low <= book.release_year <= high),
+                     key=lambda book: (book.release_year, book.book_id))
+    assert in_memory_repo.get_page("books_by_date", text).books == scanned[:BOOKS_PER_PAGE]
+
+
+def test_search_indexes_do_not_grow_with_updates(in_memory_repo):
+    sizes = {page: len(index) for page, index in in_memory_repo.search_indexes.items()}
+    book = in_memory_repo.dataset_of_books[0]
+    for number in range(100):
+        book.title = f"Renamed {number:03d}"
+        in_memory_repo.update_book(book)
+
+    assert all(len(index) <= 2 * sizes[page] for page, index in in_memory_repo.search_indexes.items())
+    assert in_memory_repo.search_books("home", "renamed") == [book]
+    assert in_memory_repo.get_page("home", "renamed 099").books == [book]
+
+
+def test_repeated_searches_are_served_from_the_cache(in_memory_repo):
+    first = in_memory_repo.get_page("home", "the").books
+    assert in_memory_repo.search_cache.stats()['misses'] == 1
+
+    assert in_memory_repo.get_page("home", "  THE ").books == first
+    assert in_memory_repo.search_cache.stats()['hits'] == 1
+
+
+def test_searches_differing_in_inner_spaces_are_cached_apart(in_memory_repo):
+    one_space = in_memory_repo.get_page("home", "the ult").books
+    assert len(one_space) == 1
+    assert in_memory_repo.get_page("home", "the  ult").books == []
+
+    in_memory_repo.search_cache.bump()
+    assert in_memory_repo.get_page("home", "the  ult").books == []
+    assert in_memory_repo.get_page("home", "the ult").books == one_space
+
+
+def test_changes_invalidate_cached_searches(in_memory_repo):
+    assert in_memory_repo.get_page("home", "inkhear").books == []
+    book = Book(1, "Inkheart")
+    in_memory_repo.add_book(book)
+    assert in_memory_repo.get_page("home", "inkhear").books == [book]
+
+    in_memory_repo.add_to_inventory(book, 10, 2)
+    in_memory_repo.get_page("home", "inkhear").books
+    assert in_memory_repo.search_cache.stats()['hits'] == 0
+
+
+def test_search_cache_evicts_the_least_recently_used_search():
+    cache = SearchCache(capacity=2)
+    cache.put("home", "a", [1], cache.generation)
+    cache.put("home", "b", [2], cache.generation)
+    assert cache.get("home", "a") == (1,)
+    cache.put("home", "c", [3], cache.generation)
+
+    assert cache.get("home", "b") is None
+    assert cache.get("home", "a") == (1,)
+    assert cache.get("home", "c") == (3,)
+
+
+def test_search_cache_ignores_results_of_searches_overtaken_by_a_change():
+    cache = SearchCache()
+    generation = cache.generation
+    cache.bump()
+    cache.put("home", "a", [1], generation)
+    assert cache.get("home", "a") is None
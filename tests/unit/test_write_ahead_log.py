@@ -0,0 +1,190 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from library.adapters import repository_populate, write_ahead_log
+from library.adapters.jsondatareader import BooksJSONReader, fold_changes
+from library.adapters.repository_populate import DATA_FILES
+from library.adapters.write_ahead_log import WriteAheadLog
+from library.domain.model import Review, User
+
+from utils import get_project_root
+
+TEST_DATA_PATH = get_project_root() / "tests" / "data"
+
+
+def populated_repository():
+    repo = BooksJSONReader()
+    repository_populate.populate(TEST_DATA_PATH, repo, False)
+    return repo
+
+
+def make_changes(repo):
+    repo.add_user(User("Logged", "Password123"))
+    book = repo.get_book_by_id(11827783)
+    repo.add_review("Logged", book, Review(book.title, "Worth keeping", 4, "Logged"))
+    repo.add_to_reading_list("Logged", book)
+    repo.add_to_reading_list("Logged", repo.get_book_by_id(707611))
+    repo.remove_from_reading_list("Logged", book)
+
+
+def assert_changes_kept(repo):
+    user = repo.get_user("Logged")
+    assert user.password == "Password123"
+    assert user.reading_list == [repo.get_book_by_id(707611)]
+    assert [review.review_text for review in user.reviews] == ["Worth keeping"]
+    assert repo.get_book_by_id(11827783).reviews[-1].review_text == "Worth keeping"
+
+
+def test_changes_are_replayed_over_a_new_population(tmp_path):
+    repo = populated_repository()
+    repo.attach_log(WriteAheadLog(tmp_path / "changes.log"))
+    make_changes(repo)
+
+    restarted = populated_repository()
+    restarted.attach_log(WriteAheadLog(tmp_path / "changes.log"))
+    assert_changes_kept(restarted)
+    assert len(restarted.get_book_by_id(11827783).reviews) == len(repo.get_book_by_id(11827783).reviews)
+
+
+def test_change_cut_short_is_dropped(tmp_path):
+    log = WriteAheadLog(tmp_path / "changes.log")
+    log.sync(log.write({'position': 1}))
+    log.close()
+    with open(tmp_path / "changes.log", 'ab') as log_file:
+        log_file.write(b'{"position": 2, "cha')
+
+    log = WriteAheadLog(tmp_path / "changes.log")
+    log.sync(log.write({'position': 3}))
+    assert list(log.changes()) == [{'position': 1}, {'position': 3}]
+
+
+def test_log_is_written_by_one_process(tmp_path):
+    log = WriteAheadLog(tmp_path / "changes.log")
+    # The process may open its log again, as a restarted app does.
+    WriteAheadLog(tmp_path / "changes.log").close()
+
+    opened_elsewhere = subprocess.run(
+        [sys.executable, "-c", "import sys; from library.adapters.write_ahead_log import WriteAheadLog; "
+                               "WriteAheadLog(sys.argv[1])", str(tmp_path / "changes.log")],
+        cwd=get_project_root(), capture_output=True, text=True)
+    assert opened_elsewhere.returncode != 0
+    assert "in use by another process" in opened_elsewhere.stderr
+
+    if hasattr(os, "fork"):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                log.write({'position': 1})
+            except RuntimeError:
+                os._exit(0)
+            os._exit(1)
+        assert os.waitpid(pid, 0)[1] == 0
+    assert list(log.changes()) == []
+
+
+def test_writers_share_syncs(tmp_path, monkeypatch):
+    syncs = []
+
+    def slow_fsync(descriptor):
+        syncs.append(descriptor)
+        time.sleep(0.005)
+
+    monkeypatch.setattr(write_ahead_log.os, "fsync", slow_fsync)
+    log = WriteAheadLog(tmp_path / "changes.log")
+
+    def write(writer):
+        for number in range(20):
+            log.sync(log.write({'writer': writer, 'number': number}))
+
+    writers = [threading.Thread(target=write, args=(writer,)) for writer in range(8)]
+    for thread in writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+
+    assert len(list(log.changes())) == 160
+    assert len(syncs) < 160 / 2
+
+
+def test_compaction_keeps_the_changes_for_a_restart_from_the_snapshot(tmp_path):
+    snapshot_path = tmp_path / "repository.snapshot"
+    log_path = tmp_path / "changes.log"
+    repo = populated_repository()
+    repo.dump_snapshot(snapshot_path, TEST_DATA_PATH)
+    repo.attach_log(WriteAheadLog(log_path), snapshot_path, TEST_DATA_PATH)
+    make_changes(repo)
+
+    repo.compact()
+    assert os.path.getsize(log_path) == 0
+    repo.add_user(User("Later", "Password123"))
+    # Make sure the snapshot is newer than the data files, whatever the resolution of the file system clock.
+    os.utime(snapshot_path, (os.path.getmtime(snapshot_path) + 10, os.path.getmtime(snapshot_path) + 10))
+
+    restarted = BooksJSONReader.load_snapshot(snapshot_path, TEST_DATA_PATH, DATA_FILES)
+    restarted.attach_log(WriteAheadLog(log_path), snapshot_path, TEST_DATA_PATH)
+    assert_changes_kept(restarted)
+    assert restarted.get_user("Later") is not None
+    assert len(restarted.get_book_by_id(11827783).reviews) == len(repo.get_book_by_id(11827783).reviews)
+
+
+def test_compacted_changes_outlive_a_snapshot_of_older_data_files(tmp_path):
+    snapshot_path = tmp_path / "repository.snapshot"
+    log_path = tmp_path / "changes.log"
+    repo = populated_repository()
+    repo.attach_log(WriteAheadLog(log_path), snapshot_path, TEST_DATA_PATH)
+    make_changes(repo)
+    repo.compact()
+
+    # The snapshot is ignored once the data files change, and the repository is populated anew.
+    restarted = populated_repository()
+    restarted.attach_log(WriteAheadLog(log_path), snapshot_path, TEST_DATA_PATH)
+    assert_changes_kept(restarted)
+
+
+def test_folding_drops_the_changes_that_later_ones_undo():
+    def reading_list(kind, book_id):
+        return {'change': kind, 'user_name': "Reader", 'book_id': book_id}
+
+    changes = [{'change': 'user', 'user_name': "Reader", 'password': "Password123"},
+               reading_list('add_to_reading_list', 1),
+               reading_list('add_to_reading_list', 2),
+               reading_list('remove_from_reading_list', 1),
+               {'change': 'user', 'user_name': "Reader", 'password': "Other123"},
+               reading_list('add_to_reading_list', 2),
+               reading_list('add_to_reading_list', 1),
+               {'change': 'review', 'user_name': "Reader", 'book_id': 1}]
+    assert fold_changes(changes) == [changes[0], changes[2], changes[3], changes[6], changes[7]]
+
+
+def test_changes_already_in_the_snapshot_are_not_replayed(tmp_path):
+    snapshot_path = tmp_path / "repository.snapshot"
+    log_path = tmp_path / "changes.log"
+    repo = populated_repository()
+    repo.attach_log(WriteAheadLog(log_path))
+    make_changes(repo)
+    # A crash between writing the snapshot and emptying the log leaves both holding the changes.
+    repo.dump_snapshot(snapshot_path, TEST_DATA_PATH)
+    os.utime(snapshot_path, (os.path.getmtime(snapshot_path) + 10, os.path.getmtime(snapshot_path) + 10))
+
+    restarted = BooksJSONReader.load_snapshot(snapshot_path, TEST_DATA_PATH, DATA_FILES)
+    restarted.attach_log(WriteAheadLog(log_path))
+    assert_changes_kept(restarted)
+    assert len(restarted.get_book_by_id(11827783).reviews) == len(repo.get_book_by_id(11827783).reviews)
+
+
+def test_log_is_compacted_once_it_grows(tmp_path):
+    snapshot_path = tmp_path / "repository.snapshot"
+    log_path = tmp_path / "changes.log"
+    repo = populated_repository()
+    repo.dump_snapshot(snapshot_path, TEST_DATA_PATH)
+    repo.attach_log(WriteAheadLog(log_path), snapshot_path, TEST_DATA_PATH, compaction_size=1000)
+    for number in range(20):
+        repo.add_user(User(f"User {number}", "Password123"))
+
+    deadline = time.time() + 10
+    while os.path.getsize(log_path) >= 1000 and time.time() < deadline:
+        time.sleep(0.01)
+    assert os.path.getsize(log_path) < 1000
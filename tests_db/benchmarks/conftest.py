@@ -0,0 +1,25 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, clear_mappers, configure_mappers
+
+from library.adapters import database_repository
+from library.adapters.orm import metadata, map_model_to_tables
+
+
+@pytest.fixture
+def make_repository(tmp_path):
+    engines = []
+
+    def make():
+        clear_mappers()
+        engine = create_engine(f"sqlite:///{tmp_path / f'populate-{len(engines)}.db'}")
+        engines.append(engine)
+        metadata.create_all(engine)
+        map_model_to_tables()
+        # Configure the mappers up front so that the one-off configuration cost is not timed.
+        configure_mappers()
+        return database_repository.SqlAlchemyRepository(sessionmaker(autocommit=False, autoflush=True, bind=engine))
+
+    yield make
+    for engine in engines:
+        engine.dispose()
@@ -0,0 +1,32 @@
+from library.adapters import repository_populate
+from library.adapters.repository import BOOKS_PER_PAGE
+
+from tests.benchmarks.benchmark_utils import BENCHMARK_SCALE, write_synthetic_catalog, best_time, benchmark
+
+NUMBER_OF_BOOKS = 20000 * BENCHMARK_SCALE
+
+
+@benchmark
+def test_deep_pages_cost_the_same_as_the_first_page(make_repository, tmp_path):
+    data_path = tmp_path / "catalog"
+    data_path.mkdir()
+    write_synthetic_catalog(data_path, NUMBER_OF_BOOKS)
+    repo = make_repository()
+    repository_populate.populate(data_path, repo, True)
+
+    # The views sorted by indexed columns.
+    for view in ("home", "authors", "books_by_date"):
+        # The page before the last one, as reached by paging through the whole catalog.
+        page = repo.get_page(view, last=True)
+        deep_page = repo.get_page(view, before=page.previous_cursor)
+        assert len(deep_page.books) == BOOKS_PER_PAGE
+        assert deep_page.next_cursor is not None
+
+        # The second page is fetched with the same queries as the deep one, following the cursor of the first.
+        first_page = repo.get_page(view)
+        second_time = best_time(lambda: repo.get_page(view, after=first_page.next_cursor), repeat=10)
+        deep_time = best_time(lambda: repo.get_page(view, after=deep_page.previous_cursor), repeat=10)
+        print(f"\n{view}: page 2 {second_time * 1000:.2f} ms, page {NUMBER_OF_BOOKS // BOOKS_PER_PAGE - 1} "
+              f"{deep_time * 1000:.2f} ms")
+        # Skipping the pages before a deep one with OFFSET would scan nearly the whole catalog.
+        assert deep_time < 2 * second_time
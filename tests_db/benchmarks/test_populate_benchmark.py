@@ -0,0 +1,71 @@
+import time
+
+from library.adapters import repository_populate
+
+from tests.benchmarks.benchmark_utils import BENCHMARK_SCALE, write_synthetic_catalog, benchmark
+from utils import get_project_root
+
+BUNDLED_DATA_PATH = get_project_root() / "library" / "adapters" / "data"
+
+
+def time_populate(repo, data_path, bulk):
+    start = time.perf_counter()
+    if bulk:
+        repository_populate.populate(data_path, repo, True)
+    else:
+        # The loaders given the repository itself store every object through its own session commit.
+        repository_populate.load_data(data_path, repo)
+    return time.perf_counter() - start
+
+
+@benchmark
+def test_bulk_populate_is_ten_times_faster_on_bundled_data(make_repository):
+    row_by_row_time = time_populate(make_repository(), BUNDLED_DATA_PATH, bulk=False)
+    bulk_repo = make_repository()
+    bulk_time = time_populate(bulk_repo, BUNDLED_DATA_PATH, bulk=True)
+    print(f"\nrow by row population {row_by_row_time:.3f}s, bulk population {bulk_time:.3f}s")
+
+    assert bulk_repo.get_number_of_books() == 20
+    assert bulk_time * 10 < row_by_row_time
+
+
+@benchmark
+def test_bulk_populate_benchmark(make_repository, tmp_path):
+    # At BENCHMARK_SCALE=100 this writes a million book, author link and inventory rows.
+    number_of_books = 10000 * BENCHMARK_SCALE
+    data_path = tmp_path / "catalog"
+    data_path.mkdir()
+    write_synthetic_catalog(data_path, number_of_books)
+
+    repo = make_repository()
+    elapsed = time_populate(repo, data_path, bulk=True)
+    print(f"\nbulk populated {number_of_books} books in {elapsed:.3f}s")
+
+    assert repo.get_number_of_books() == number_of_books
+
+
+@benchmark
+def test_restart_after_an_inventory_change_only_applies_the_change(make_repository, tmp_path):
+    number_of_books = 10000 * BENCHMARK_SCALE
+    data_path = tmp_path / "catalog"
+    data_path.mkdir()
+    write_synthetic_catalog(data_path, number_of_books)
+    manifest_path = tmp_path / "import-manifest.json"
+
+    repo = make_repository()
+    start = time.perf_counter()
+    repository_populate.populate(data_path, repo, True, manifest_path=manifest_path)
+    full_time = time.perf_counter() - start
+
+    inventory_path = data_path / repository_populate.INVENTORY_FILENAME
+    lines = inventory_path.read_text(encoding='UTF-8').splitlines()
+    lines[5] = '{"book_id": "5", "price": 42, "stock": 1}'
+    inventory_path.write_text("\n".join(lines), encoding='UTF-8')
+
+    start = time.perf_counter()
+    assert repository_populate.populate_changes(data_path, repo, manifest_path)
+    delta_time = time.perf_counter() - start
+    print(f"\nfull population {full_time:.3f}s, restart with one inventory change {delta_time:.3f}s")
+
+    assert repo.get_book_by_id(5).price == 42
+    assert delta_time * 10 < full_time
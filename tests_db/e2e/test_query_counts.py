@@ -0,0 +1,73 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from library import create_app
+from library.adapters import jsondatareader as repo
+from library.adapters.repository import encode_cursor
+
+from utils import get_project_root
+
+TEST_DATA_PATH = get_project_root() / "tests" / "data"
+
+# The queries each route runs with nothing loaded yet: a listing reads its books, then the authors of all of them;
+# the publishers are joined into the first query.
+QUERIES_PER_ROUTE = {
+    '/': 2,
+    '/?q=Sherlock': 2,
+    '/authors': 2,
+    '/publishers': 2,
+    '/books_by_date': 2,
+    '/books_by_date?q=2010-2020': 2,
+    # The book with its authors and reviews, then the user with their reviews, reading list and its authors.
+    '/book/11827783': 7,
+    '/reading_list': 4,
+    '/profile': 4,
+}
+
+
+@pytest.fixture
+def database_client(tmp_path):
+    client = create_app({
+        'TESTING': True,
+        'TEST_DATA_PATH': TEST_DATA_PATH,
+        'WTF_CSRF_ENABLED': False,
+        'REPOSITORY': 'database',
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'query-counts.db'}",
+        'IMPORT_MANIFEST': str(tmp_path / 'import-manifest.json'),
+    }).test_client()
+    client.post('/login', data={'user_name': 'Belle', 'password': 'Password123'})
+    return client
+
+
+def count_queries(client, url) -> int:
+    statements = []
+
+    def record(connection, cursor, statement, *args):
+        statements.append(statement)
+
+    # Start from an empty session, so that nothing a previous request loaded is reused.
+    repo.book_dataset.reset_session()
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        assert client.get(url).status_code == 200
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
+    return len(statements)
+
+
+@pytest.mark.parametrize("url", QUERIES_PER_ROUTE)
+def test_routes_run_a_fixed_number_of_queries(database_client, url):
+    assert count_queries(database_client, url) == QUERIES_PER_ROUTE[url]
+
+
+def test_queries_of_a_listing_do_not_grow_with_its_books(database_client):
+    # A full page of twelve books and a page of one.
+    assert count_queries(database_client, '/') == count_queries(database_client, '/?q=Sherlock')
+
+
+@pytest.mark.parametrize("key", [(True, 1), (1, 2 ** 70)])
+@pytest.mark.parametrize("view", ['/', '/authors', '/publishers', '/books_by_date'])
+def test_listings_ignore_cursors_the_database_cannot_hold(database_client, view, key):
+    response = database_client.get(view, query_string={'after': encode_cursor(key)})
+    assert response.status_code == 200
@@ -0,0 +1,105 @@
+import json
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, clear_mappers
+
+from library import create_app
+from library.adapters.database_migration import migrate_schema
+from library.adapters.database_repository import SqlAlchemyRepository
+from library.adapters.orm import map_model_to_tables
+
+from utils import get_project_root
+
+TEST_DATA_PATH = get_project_root() / "tests" / "data"
+
+# The tables as the first version of the schema created them: a publisher row per book, an author row per book they
+# wrote, and neither publisher_id nor first_author_name on the books.
+EARLIER_SCHEMA = (
+    "CREATE TABLE users (id INTEGER NOT NULL, user_name VARCHAR(255) NOT NULL, password VARCHAR(255), "
+    "PRIMARY KEY (id), UNIQUE (user_name))",
+    "CREATE TABLE authors (id INTEGER NOT NULL, unique_id INTEGER, full_name VARCHAR(255) NOT NULL, "
+    "PRIMARY KEY (id))",
+    "CREATE TABLE books (book_id INTEGER NOT NULL, title VARCHAR(255) NOT NULL, description VARCHAR(1024), "
+    "release_year INTEGER, ebook BOOLEAN, num_pages VARCHAR(63), average_rating FLOAT, ratings_count INTEGER, "
+    "price INTEGER, stock INTEGER, url VARCHAR(255), PRIMARY KEY (book_id))",
+    "CREATE TABLE authors_books (id INTEGER NOT NULL, book_id INTEGER, author_id INTEGER, PRIMARY KEY (id))",
+    "CREATE TABLE publishers (id INTEGER NOT NULL, name VARCHAR(255) NOT NULL, book_id INTEGER, PRIMARY KEY (id))",
+    "CREATE TABLE reviews (id INTEGER NOT NULL, book_title VARCHAR(255), user_name VARCHAR(255), user_id INTEGER, "
+    "book_id INTEGER, rating INTEGER, review_text VARCHAR(1024), timestamp DATETIME, PRIMARY KEY (id))",
+    "CREATE TABLE reading_list (id INTEGER NOT NULL, book_id INTEGER, user_id INTEGER, PRIMARY KEY (id))",
+)
+
+# The index of the authors view before it ordered the books without authors last.
+EARLIER_AUTHORS_INDEX = "CREATE INDEX ix_books_first_author ON books (first_author_name, book_id)"
+
+
+def create_earlier_database(engine):
+    for statement in EARLIER_SCHEMA:
+        engine.execute(statement)
+    engine.execute("INSERT INTO users (id, user_name, password) VALUES (1, 'Registered', 'hash')")
+    engine.execute("INSERT INTO books (book_id, title, release_year) VALUES (1, 'The Switchblade Mamma', 2012), "
+                   "(2, 'Cruelle', NULL), (3, 'Authorless', 2001)")
+    engine.execute("INSERT INTO publishers (id, name, book_id) VALUES (1, 'Dargaud', 1), (2, 'Dargaud', 2), "
+                   "(3, 'Avatar Press', 3)")
+    engine.execute("INSERT INTO authors (id, unique_id, full_name) VALUES (1, 10, 'Florence Dupre la Tour'), "
+                   "(2, 11, 'Lindsey Cibos'), (3, 11, 'Lindsey Cibos')")
+    engine.execute("INSERT INTO authors_books (id, book_id, author_id) VALUES (1, 1, 11), (2, 1, 10), (3, 2, 10)")
+    engine.execute("INSERT INTO reading_list (id, book_id, user_id) VALUES (1, 2, 1)")
+
+
+def test_earlier_schema_is_migrated_in_place():
+    engine = create_engine('sqlite://')
+    create_earlier_database(engine)
+
+    assert migrate_schema(engine)
+    assert not migrate_schema(engine)
+
+    assert engine.execute("SELECT user_name FROM users").fetchall() == [('Registered',)]
+    assert engine.execute("SELECT book_id, user_id FROM reading_list").fetchall() == [(2, 1)]
+    assert engine.execute("SELECT book_id, publisher_id, first_author_name FROM books ORDER BY book_id").fetchall() \
+        == [(1, 1, 'Lindsey Cibos'), (2, 1, 'Florence Dupre la Tour'), (3, 3, '')]
+    assert engine.execute("SELECT id FROM publishers ORDER BY id").fetchall() == [(1,), (3,)]
+    assert engine.execute("SELECT unique_id FROM authors ORDER BY unique_id").fetchall() == [(10,), (11,)]
+    indexes = {name for name, in engine.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'ix_books_author_order', 'ix_books_release_order', 'ix_search_trigrams'} <= indexes
+    assert 'ix_books_first_author' not in indexes
+
+    clear_mappers()
+    map_model_to_tables()
+    repo = SqlAlchemyRepository(sessionmaker(bind=engine))
+    assert [book.book_id for book in repo.get_page("authors").books] == [2, 1, 3]
+    assert [book.book_id for book in repo.get_page("publishers", "dargaud").books] == [1, 2]
+    assert [book.book_id for book in repo.get_page("authors", "cibos").books] == [1]
+    assert [book.book_id for book in repo.get_page("home", "mamma").books] == [1]
+
+
+def test_obsolete_index_is_dropped():
+    engine = create_engine('sqlite://')
+    create_earlier_database(engine)
+    migrate_schema(engine)
+    engine.execute(EARLIER_AUTHORS_INDEX)
+
+    assert migrate_schema(engine)
+    indexes = {name for name, in engine.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert 'ix_books_first_author' not in indexes
+    assert not migrate_schema(engine)
+
+
+def test_app_keeps_the_users_of_a_database_of_an_earlier_schema(tmp_path):
+    database_path = tmp_path / "earlier.db"
+    create_earlier_database(create_engine(f"sqlite:///{database_path}"))
+
+    # An app using an existing database maps the model without clearing the mappers of earlier tests first.
+    clear_mappers()
+    create_app({
+        'TESTING': False,
+        'TEST_DATA_PATH': TEST_DATA_PATH,
+        'REPOSITORY': 'database',
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{database_path}",
+        'IMPORT_MANIFEST': str(tmp_path / 'import-manifest.json'),
+    })
+
+    engine = create_engine(f"sqlite:///{database_path}")
+    assert engine.execute("SELECT user_name FROM users").fetchall() == [('Registered',)]
+    # The database is taken to hold the data files it was used with, so later changes to them are applied.
+    assert json.loads((tmp_path / 'import-manifest.json').read_text())
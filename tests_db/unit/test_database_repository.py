@@ -2,12 +2,23 @@ import math
 from datetime import date, datetime
 
 import pytest
+from sqlalchemy import event
 
 import library.adapters.repository as repo
 from library.adapters.database_repository import SqlAlchemyRepository
+from library.adapters.jsondatareader import BooksJSONReader
+from library.adapters.columnar_repository import ColumnarRepository
+from library.adapters import repository_populate
 # from library.domain.model import User, Article, Tag, Review, make_review
 from library.domain.model import BooksInventory, Publisher, Author, Book, Review, User
-from library.adapters.repository import RepositoryException
+from library.adapters.repository import RepositoryException, BOOKS_PER_PAGE, VIEWS
+from library.adapters.book_order import title_key, publisher_key, first_author_key, date_key
+
+from utils import get_project_root
+
+DATA_PATH = get_project_root() / "library" / "adapters" / "data"
+
+BOOK_ORDERS = {"home": title_key, "publishers": publisher_key, "authors": first_author_key, "books_by_date": date_key}
 
 def test_repository_can_add_a_user(session_factory):
     repo = SqlAlchemyRepository(session_factory)
@@ -270,3 +281,221 @@ def test_invalid_date_returns_inf(session_factory):
 #     assert review in book_fetched.reviews
 #     assert review in author_fetched.reviews
 
+
+def test_repository_can_get_several_books_by_ids(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    books = repo.get_books_by_ids([707611, 11827783, 1])
+
+    assert sorted(book.book_id for book in books) == [707611, 11827783]
+    assert repo.get_books_by_ids([]) == []
+
+def test_repository_get_books_by_ids_with_more_ids_than_a_query_binds(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    books = repo.get_books_by_ids([707611] + list(range(1, 2000)))
+
+    assert [book.book_id for book in books] == [707611]
+
+def test_repository_stores_a_shared_publisher_and_author_once(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    for book_id in (1, 2):
+        book = Book(book_id, "Inkheart")
+        book.publisher = Publisher("Brand New Publisher")
+        book.add_author(Author(99999991, "Cornelia Funke"))
+        repo.add_book(book)
+
+    session = session_factory()
+    assert session.execute("SELECT count(*) FROM publishers WHERE name = 'Brand New Publisher'").scalar() == 1
+    assert session.execute("SELECT count(*) FROM authors WHERE unique_id = 99999991").scalar() == 1
+    assert repo.get_book_by_id(2).publisher.name == "Brand New Publisher"
+    assert repo.get_book_by_id(2).authors[0].full_name == "Cornelia Funke"
+
+def test_repository_searches_titles_authors_and_publishers(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+
+    assert [book.book_id for book in repo.get_page("home", "Sherlock").books] == [11827783]
+    assert 11827783 in [book.book_id for book in repo.get_page("authors", "indro").books]
+    assert [book.book_id for book in repo.get_page("home", "zzzz").books] == []
+    # Texts shorter than a trigram are matched without the index.
+    assert 11827783 in [book.book_id for book in repo.get_page("home", "y").books]
+
+def test_repository_indexes_the_terms_of_added_books(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    book = Book(1, "Inkheart")
+    book.publisher = Publisher("Brand New Publisher")
+    book.add_author(Author(99999991, "Cornelia Funke"))
+    repo.add_book(book)
+
+    assert [book.book_id for book in repo.get_page("home", "inkhear").books] == [1]
+    assert [book.book_id for book in repo.get_page("publishers", "brand new").books] == [1]
+    assert [book.book_id for book in repo.get_page("authors", "cornelia").books] == [1]
+
+    repo.remove_book(repo.get_book_by_id(1))
+    session = session_factory()
+    assert session.execute("SELECT count(*) FROM search_trigrams WHERE kind = 'title' AND target_id = 1").scalar() == 0
+    assert repo.get_page("home", "inkhear").books == []
+
+def test_repository_searches_books_by_a_range_of_years(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+
+    books = repo.get_page("books_by_date", "2010-2012").books
+    years = [book.release_year for book in books]
+    assert years and years == sorted(years)
+    assert all(2010 <= year <= 2012 for year in years)
+
+    books = repo.get_page("books_by_date", ">=2016").books
+    assert books and all(book.release_year >= 2016 for book in books)
+    assert repo.get_page("books_by_date", "<1000").books == []
+
+def test_repository_caches_searches_until_a_change(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+
+    first = repo.get_page("home", "the").books
+    assert repo.get_page("home", "The").books == first
+    assert repo.search_cache.stats()['hits'] == 1
+
+    book = Book(1, "The Inkheart")
+    repo.add_book(book)
+    assert 1 in [book.book_id for book in repo.get_page("home", "the").books]
+    assert repo.search_cache.stats()['hits'] == 1
+
+def test_repository_caches_searches_differing_in_inner_spaces_apart(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+
+    one_space = repo.get_page("home", "the ult")
+    assert len(one_space.books) == 1 and one_space.total == 1
+    assert repo.get_page("home", "the  ult").total == 0
+
+    repo.search_cache.bump()
+    assert repo.get_page("home", "the  ult").total == 0
+    assert repo.get_page("home", "the ult").total == 1
+
+def test_repository_pages_are_walked_forwards_and_backwards_by_cursor(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+
+    for view in ("home", "publishers", "authors", "books_by_date"):
+        page = repo.get_page(view)
+        assert page.previous_cursor is None
+        forwards = list(page.books)
+        while page.next_cursor is not None:
+            page = repo.get_page(view, after=page.next_cursor)
+            forwards.extend(page.books)
+
+        page = repo.get_page(view, last=True)
+        assert page.next_cursor is None
+        backwards = list(page.books)
+        while page.previous_cursor is not None:
+            page = repo.get_page(view, before=page.previous_cursor)
+            backwards[:0] = page.books
+
+        assert len(forwards) > BOOKS_PER_PAGE
+        assert len({book.book_id for book in forwards}) == len(forwards)
+        assert [book.book_id for book in backwards] == [book.book_id for book in forwards]
+
+    titles = [(book.title, book.book_id) for book in repo.get_page("home").books]
+    assert titles == sorted(titles)
+
+def test_repository_reads_the_authors_view_in_the_order_of_an_index(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    session = session_factory()
+    stored = session.execute(
+        "SELECT books.book_id, books.first_author_name, authors.full_name FROM books "
+        "JOIN authors_books ON authors_books.book_id = books.book_id "
+        "JOIN authors ON authors.unique_id = authors_books.author_id "
+        "WHERE authors_books.id = (SELECT min(id) FROM authors_books WHERE book_id = books.book_id)").fetchall()
+    assert len(stored) > 0
+    assert all(first_author_name == full_name for _, first_author_name, full_name in stored)
+
+    statements = []
+
+    def record(connection, cursor, statement, parameters, *args):
+        statements.append((statement, parameters))
+
+    engine = session.get_bind()
+    page = repo.get_page("authors")
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        repo.get_page("authors", after=page.next_cursor)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    statement, parameters = next((statement, parameters) for statement, parameters in statements
+                                 if "ORDER BY" in statement)
+    plan = " ".join(str(row[-1]) for row in session.connection().exec_driver_sql(
+        f"EXPLAIN QUERY PLAN {statement}", parameters))
+    # The page is read from the index in order, without sorting the books or reading their authors.
+    assert "ix_books_author_order" in plan
+    assert "TEMP B-TREE" not in plan
+
+def test_repository_pages_of_a_search_are_walked_by_cursor(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+
+    page = repo.get_page("home", "the")
+    books = list(page.books)
+    while page.next_cursor is not None:
+        page = repo.get_page("home", "the", after=page.next_cursor)
+        books.extend(page.books)
+    found = [book for book in repo.dataset_of_books() if "the" in book.title.lower()]
+    assert sorted(book.book_id for book in books) == sorted(book.book_id for book in found)
+
+def test_repository_counts_the_books_a_search_finds(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+
+    for view, text in (("home", "e"), ("publishers", "a"), ("authors", "a"), ("books_by_date", "2000-2020")):
+        page = repo.get_page(view, text)
+        found = list(page.books)
+        while page.next_cursor is not None:
+            page = repo.get_page(view, text, after=page.next_cursor)
+            found.extend(page.books)
+        assert len(found) > BOOKS_PER_PAGE
+        assert page.total == len(found)
+        # The books are sorted by the database, the authors view by the first author of each book.
+        assert [book.book_id for book in found] == [book.book_id for book in sorted(found, key=BOOK_ORDERS[view])]
+
+    assert repo.get_page("home", "Sherlock").total == 1
+    assert repo.get_page("books_by_date", "not a year").total == 0
+    assert repo.get_page("home").total is None
+
+def book_ids_in_order(repo, view) -> list:
+    page = repo.get_page(view)
+    book_ids = [book.book_id for book in page.books]
+    while page.next_cursor is not None:
+        page = repo.get_page(view, after=page.next_cursor)
+        book_ids.extend(book.book_id for book in page.books)
+    return book_ids
+
+def test_repository_orders_the_views_like_the_memory_and_columnar_repositories(session_factory):
+    repos = [SqlAlchemyRepository(session_factory), BooksJSONReader(), ColumnarRepository()]
+    for other_repo in repos[1:]:
+        repository_populate.populate(DATA_PATH, other_repo, False)
+    for repo in repos:
+        # A book without authors or a release year, which each view orders after all others.
+        book = Book(1, "Authorless")
+        book.publisher = Publisher("Avatar Press")
+        repo.add_book(book)
+
+    for view in VIEWS:
+        database_order, memory_order, columnar_order = [book_ids_in_order(repo, view) for repo in repos]
+        assert database_order == memory_order == columnar_order
+    assert book_ids_in_order(repos[0], "authors")[-1] == 1
+
+def test_repository_counts_a_search_past_its_last_book(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    total = len([book for book in repo.dataset_of_books() if "e" in book.title.lower()])
+
+    # A stale or made-up cursor beyond the last book found reads an empty page.
+    page = repo.get_page("home", "e", after=("zzzzzz", 10 ** 12))
+    assert page.books == []
+    assert page.total == total
+    assert repo.get_page("home", "e").total == total
+    assert repo.get_page("home", "Sherlock", after=("zzzzzz", 10 ** 12)).total == 1
+
+def test_repository_can_change_a_reading_list(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    repo.add_user(User('Dave', '123456789'))
+    book = repo.get_book_by_id(11827783)
+
+    repo.add_to_reading_list('Dave', book)
+    session = session_factory()
+    assert session.execute("SELECT count(*) FROM reading_list WHERE book_id = 11827783").scalar() == 1
+
+    repo.remove_from_reading_list('Dave', book)
+    assert session.execute("SELECT count(*) FROM reading_list WHERE book_id = 11827783").scalar() == 0
@@ -220,6 +220,17 @@ def test_saving_of_book_url(empty_session):
     date = book_date.isoformat()
     assert rows[0][6] == book.url
 
+def test_saving_of_book_first_author_name(empty_session):
+    book = make_book()
+    book.add_author(Author(1, "Cornelia Funke"))
+    book.add_author(Author(2, "Anthea Bell"))
+    empty_session.add(book)
+    empty_session.commit()
+    assert empty_session.execute('SELECT first_author_name FROM books').scalar() == "Cornelia Funke"
+
+    book.remove_author(book.authors[0])
+    empty_session.commit()
+    assert empty_session.execute('SELECT first_author_name FROM books').scalar() == "Anthea Bell"
 
 # def test_save_reviewed_book(empty_session):
 #     # Create Book User objects.
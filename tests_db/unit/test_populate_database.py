@@ -1,10 +1,21 @@
-from sqlalchemy import select, inspect
+import json
+import shutil
 
-from library.adapters.orm import metadata
+import pytest
+from sqlalchemy import create_engine, select, inspect
+from sqlalchemy.orm import sessionmaker, clear_mappers
+
+from library.adapters import database_repository, repository_populate
+from library.adapters.manifest import ImportManifest, record_hashes
+from library.adapters.orm import metadata, map_model_to_tables
+
+from utils import get_project_root
+
+TEST_DATA_PATH = get_project_root() / "tests" / "data"
 
 def test_database_populate_inspect_table_names(database_engine):
     inspector = inspect(database_engine)
-    assert inspector.get_table_names() == ['authors', 'authors_books', 'books', 'publishers', 'reading_list', 'reviews', 'users']
+    assert inspector.get_table_names() == ['authors', 'authors_books', 'books', 'publishers', 'reading_list', 'reviews', 'search_trigrams', 'users']
 
 def test_database_populate_select_all_users(database_engine):
 
@@ -27,7 +38,7 @@ def test_database_populate_select_all_reviews(database_engine):
 
     # Get table information
     inspector = inspect(database_engine)
-    name_of_reviews_table = inspector.get_table_names()[-2]
+    name_of_reviews_table = inspector.get_table_names()[-3]
 
     with database_engine.connect() as connection:
         # query for records in table reviews
@@ -81,7 +92,9 @@ def test_database_populate_select_all_publishers(database_engine):
         assert 'Marvel' in all_publishers
         assert 'Dynamite Entertainment' in all_publishers
         assert 'Avatar Press' in all_publishers
-        assert len(all_publishers) == 20
+        # Books of the same publisher share its row.
+        assert len(all_publishers) == 12
+        assert len(set(all_publishers)) == 12
 
 def test_database_populate_select_all_authors(database_engine):
 
@@ -101,4 +114,119 @@ def test_database_populate_select_all_authors(database_engine):
         assert 'Jaymes Reed' in all_authors
         assert 'Garth Ennis' in all_authors
         assert 'Chris  Martin' in all_authors
-        assert len(all_authors) == 35
+        # Books of the same author share its row.
+        assert len(all_authors) == 31
+
+def describe_books(repo):
+    return [(book.book_id, book.title, None if book.publisher is None else book.publisher.name,
+             [author.full_name for author in book.authors], book.price, book.stock,
+             sorted((review.rating, review.review_text) for review in book.reviews))
+            for book in sorted(repo.dataset_of_books(), key=lambda book: book.book_id)]
+
+def test_bulk_population_stores_what_row_by_row_population_does():
+    clear_mappers()
+    map_model_to_tables()
+    descriptions = []
+    for bulk in (True, False):
+        engine = create_engine('sqlite://')
+        metadata.create_all(engine)
+        repo = database_repository.SqlAlchemyRepository(sessionmaker(autocommit=False, autoflush=True, bind=engine))
+        if bulk:
+            repository_populate.populate(TEST_DATA_PATH, repo, True)
+        else:
+            # The loaders given the repository itself store every object through its own session commit.
+            repository_populate.load_data(TEST_DATA_PATH, repo)
+        descriptions.append((describe_books(repo), [book.book_id for book in repo.get_user('Belle').reading_list]))
+
+    assert descriptions[0] == descriptions[1]
+    assert len(descriptions[0][0]) == 20
+
+@pytest.fixture
+def populated_with_manifest(tmp_path):
+    clear_mappers()
+    engine = create_engine('sqlite://')
+    metadata.create_all(engine)
+    map_model_to_tables()
+    repo = database_repository.SqlAlchemyRepository(sessionmaker(autocommit=False, autoflush=True, bind=engine))
+    data_path = tmp_path / "data"
+    shutil.copytree(TEST_DATA_PATH, data_path)
+    manifest_path = tmp_path / "import-manifest.json"
+    repository_populate.populate(data_path, repo, True, manifest_path=manifest_path)
+    yield repo, data_path, manifest_path
+    metadata.drop_all(engine)
+
+def rewrite_json_lines(filename, change):
+    with open(filename, encoding='UTF-8') as jsonfile:
+        items = [json.loads(line) for line in jsonfile if line.strip() != ""]
+    items = change(items)
+    with open(filename, 'w', encoding='UTF-8') as jsonfile:
+        jsonfile.write("\n".join(json.dumps(item) for item in items))
+
+def test_populate_changes_with_unchanged_files(populated_with_manifest):
+    repo, data_path, manifest_path = populated_with_manifest
+    assert repository_populate.populate_changes(data_path, repo, manifest_path)
+    assert repo.get_number_of_books() == 20
+
+def test_populate_changes_without_manifest_requires_full_population(populated_with_manifest, tmp_path):
+    repo, data_path, manifest_path = populated_with_manifest
+    assert not repository_populate.populate_changes(data_path, repo, tmp_path / "missing.json")
+
+def test_populate_changes_applies_an_inventory_change(populated_with_manifest):
+    repo, data_path, manifest_path = populated_with_manifest
+
+    def change_price(items):
+        for item in items:
+            if item["book_id"] == "707611":
+                item["price"] = 99
+        return items
+    rewrite_json_lines(data_path / repository_populate.INVENTORY_FILENAME, change_price)
+
+    assert repository_populate.populate_changes(data_path, repo, manifest_path)
+    assert repo.get_book_by_id(707611).price == 99
+    assert repo.get_book_by_id(25742454).price == 20
+    # The manifest now records the change, so it is not applied again.
+    assert ImportManifest.load(manifest_path).record_hashes(repository_populate.INVENTORY_FILENAME) == \
+           record_hashes(data_path / repository_populate.INVENTORY_FILENAME, 'book_id')[0]
+
+def test_populate_changes_applies_book_changes(populated_with_manifest):
+    repo, data_path, manifest_path = populated_with_manifest
+
+    def change_books(items):
+        items = [item for item in items if item["book_id"] != "707611"]
+        for item in items:
+            if item["book_id"] == "11827783":
+                item["title"] = "Sherlock Holmes: Year Two"
+        new_book = dict(items[0])
+        new_book["book_id"] = "1"
+        new_book["title"] = "A New Book"
+        return items + [new_book]
+    rewrite_json_lines(data_path / repository_populate.BOOKS_FILENAME, change_books)
+
+    assert repository_populate.populate_changes(data_path, repo, manifest_path)
+    assert repo.get_number_of_books() == 20
+    assert repo.get_book_by_id(707611) is None
+    assert repo.get_book_by_id(11827783).title == "Sherlock Holmes: Year Two"
+    assert repo.get_book_by_id(1).title == "A New Book"
+
+def test_populate_changes_clears_fields_removed_from_a_book(populated_with_manifest):
+    repo, data_path, manifest_path = populated_with_manifest
+    assert repo.get_book_by_id(11827783).release_year is not None
+
+    def clear_fields(items):
+        for item in items:
+            if item["book_id"] == "11827783":
+                item.update(publication_year="", num_pages="", is_ebook="")
+        return items
+    rewrite_json_lines(data_path / repository_populate.BOOKS_FILENAME, clear_fields)
+
+    assert repository_populate.populate_changes(data_path, repo, manifest_path)
+    book = repo.get_book_by_id(11827783)
+    # As a full population would have left them.
+    assert (book.release_year, book.num_pages, book.ebook) == (None, None, None)
+
+def test_populate_changes_to_users_require_full_population(populated_with_manifest):
+    repo, data_path, manifest_path = populated_with_manifest
+    with open(data_path / repository_populate.USERS_FILENAME, 'a', encoding='UTF-8') as users_file:
+        users_file.write('\n{"user_name": "Newcomer", "password": "Password123", "reading_list": []}')
+
+    assert not repository_populate.populate_changes(data_path, repo, manifest_path)
@@ -1,7 +1,11 @@
-"""App entry point."""
+"""App entry point.
+
+Under a pre-forking server, set PRELOAD and load the app in the master process, for example with
+gunicorn --preload --workers 4 wsgi:app, so that the workers share one copy of the books.
+"""
 from library import create_app
 
 app = create_app()
 
 if __name__ == "__main__":
-    app.run(host='localhost', port=5000, threaded=False)
\ No newline at end of file
+    app.run(host='localhost', port=5000, threaded=app.config['THREADED'])
\ No newline at end of file